@@ -0,0 +1,79 @@
+"""
+Сравнение скорости выбора обработчика сообщений: отдельный обработчик telebot
+с lambda-фильтром на каждое состояние (как было в боте, ~40 обработчиков)
+и один обработчик StateRouter с таблицей "состояние -> обработчик".
+Сообщения распределены по всем состояниям равномерно; обработчики пустые,
+поэтому замер показывает только стоимость диспетчеризации.
+
+Запуск (из корня проекта):
+    python benchmarks/bench_dispatch.py [количество_сообщений] [количество_состояний]
+"""
+import os
+import sys
+import time
+
+import telebot
+from telebot import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from state_router import StateRouter
+
+
+def make_message(chat_id, text='test'):
+    return types.Message.de_json({
+        'message_id': 1,
+        'date': 0,
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': {'id': chat_id, 'is_bot': False, 'first_name': 'test'},
+        'text': text,
+    })
+
+
+def build_predicate_bot(states, user_states, handled):
+    bot = telebot.TeleBot('123456:TEST', threaded=False)
+    for state in states:
+        def handler(message):
+            handled[0] += 1
+        bot.message_handler(func=lambda message, state=state: user_states.get(message.chat.id) == state)(handler)
+    return bot
+
+
+def build_router_bot(states, user_states, handled):
+    bot = telebot.TeleBot('123456:TEST', threaded=False)
+    router = StateRouter(user_states.get)
+    for state in states:
+        @router.route(state)
+        def handler(message):
+            handled[0] += 1
+    router.register(bot)
+    return bot
+
+
+def run(label, bot, messages, handled):
+    handled[0] = 0
+    started = time.perf_counter()
+    for message in messages:
+        bot.process_new_messages([message])
+    elapsed = time.perf_counter() - started
+    assert handled[0] == len(messages)
+    print(f"{label:<28} {elapsed:8.3f} с  {len(messages) / elapsed:10.0f} сообщений/с")
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    states_count = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+
+    states = [f'state_{i}' for i in range(states_count)]
+    user_states = {chat_id: states[chat_id % states_count] for chat_id in range(states_count)}
+    messages = [make_message(i % states_count) for i in range(count)]
+    handled = [0]
+
+    print(f"{count} сообщений, {states_count} состояний")
+    plain = run('lambda-фильтры telebot', build_predicate_bot(states, user_states, handled), messages, handled)
+    routed = run('StateRouter', build_router_bot(states, user_states, handled), messages, handled)
+    print(f"Ускорение: {plain / routed:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Сравнение отправки 1000 сообщений через requests.post без сессии
+и через GreenAPIClient с пулом keep-alive соединений.
+Заглушка работает по HTTP, поэтому замер показывает только экономию на TCP
+соединениях; с HTTPS к реальному Green API добавляется еще и TLS-рукопожатие.
+
+Запуск (из корня проекта):
+    python benchmarks/bench_http_pool.py [количество_запросов]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from api import GreenAPIClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Имитация Green API: отвечает на любой POST идентификатором сообщения."""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        body = json.dumps({'idMessage': 'BAE5F4886AFFA1B9'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(label, server, send, count):
+    server.connections = 0
+    started = time.perf_counter()
+    for i in range(count):
+        send(f"7900{i:07d}@c.us")
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:8.3f} с  {elapsed / count * 1000:7.3f} мс/запрос  "
+          f"соединений: {server.connections}")
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.lock = threading.Lock()
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_address[1]}"
+    url = f"{api_url}/waInstance1/sendMessage/token"
+
+    def send_without_session(chat_id):
+        requests.post(url, json={'chatId': chat_id, 'message': 'test'}).json()
+
+    client = GreenAPIClient(api_url, api_url, '1', 'token')
+
+    def send_with_client(chat_id):
+        client.send_message(chat_id, 'test')
+
+    print(f"Отправка {count} запросов на локальную заглушку {api_url}")
+    plain = run('requests.post (без сессии)', server, send_without_session, count)
+    pooled = run('GreenAPIClient (пул)', server, send_with_client, count)
+    print(f"Экономия на 1000 отправок: {(plain - pooled) / count * 1000:.3f} с")
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
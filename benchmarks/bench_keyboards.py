@@ -0,0 +1,71 @@
+"""
+Сравнение стоимости клавиатуры на одно сообщение: сборка ReplyKeyboardMarkup
+и сериализация в JSON при каждой отправке (как было в боте) и готовая
+FrozenMarkup из реестра клавиатур. Для каждого сообщения берется клавиатура
+из типичного набора (главное меню, выбор типа рассылки, подтверждение,
+отмена, страница из 8 шаблонов) и преобразуется так же, как это делает
+telebot перед запросом к API. Память замеряется через tracemalloc.
+
+Запуск (из корня проекта):
+    python benchmarks/bench_keyboards.py [количество_сообщений]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+from telebot.apihelper import _convert_markup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from keyboards.registry import build_static_keyboards
+from keyboards.main_menu_keyboard import get_main_menu_keyboard
+from keyboards.broadcast_keyboards import get_message_type_keyboard, get_confirm_keyboard, get_cancel_keyboard
+from keyboards.template_keyboards import get_template_pagination_keyboard
+
+
+def make_factories(templates):
+    cached = [
+        get_main_menu_keyboard,
+        get_message_type_keyboard,
+        get_confirm_keyboard,
+        get_cancel_keyboard,
+        lambda: get_template_pagination_keyboard(2, 5, templates),
+    ]
+    # __wrapped__ - исходная фабрика, которая строит клавиатуру заново при каждом вызове
+    fresh = [factory.__wrapped__ for factory in cached[:-1]]
+    fresh.append(lambda: get_template_pagination_keyboard.__wrapped__(2, 5, templates))
+    return fresh, cached
+
+
+def run(label, factories, count):
+    started = time.perf_counter()
+    for i in range(count):
+        _convert_markup(factories[i % len(factories)]())
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    for i in range(min(count, 10000)):
+        _convert_markup(factories[i % len(factories)]())
+    # Сообщения обрабатываются по одному, поэтому пик - это память одной отправки
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<26} {elapsed / count * 1e6:8.2f} мкс/сообщение  пик памяти {peak:8d} байт")
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    templates = [{'id': f'{i:08d}-0000-0000-0000-000000000000', 'name': f'Шаблон {i}'} for i in range(8)]
+
+    build_static_keyboards()
+    fresh, cached = make_factories(templates)
+
+    print(f"{count} сообщений")
+    plain = run('сборка при каждой отправке', fresh, count)
+    frozen = run('реестр клавиатур', cached, count)
+    print(f"Ускорение: {plain / frozen:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Стоимость подстановки значений в текст рассылки на одного получателя:
+разбор текста регулярным выражением для каждой строки (re.sub) и текст,
+скомпилированный один раз (template_renderer). Для сравнения выводится
+доля от времени одного запроса к Green API (порядка 100 мс).
+
+Запуск (из корня проекта):
+    python benchmarks/bench_template_renderer.py [количество_строк]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from template_renderer import compile_template, PLACEHOLDER_RE
+
+TEXT = ("Здравствуйте, {имя}! Для жителей города {город} действует скидка {скидка}% "
+        "до конца месяца. Ваш менеджер - {менеджер}, телефон {телефон_менеджера}.")
+# Типичное время одного запроса к Green API (секунды)
+NETWORK_TIME = 0.1
+
+
+def render_naive(text, values):
+    return PLACEHOLDER_RE.sub(lambda match: values.get(match.group(1).lower(), match.group(0)), text)
+
+
+def run(label, render, rows):
+    started = time.perf_counter()
+    for values in rows:
+        render(values)
+    elapsed = time.perf_counter() - started
+    per_row = elapsed / len(rows)
+    print(f"{label:<28} {elapsed * 1000:8.1f} мс всего  {per_row * 1e6:6.2f} мкс/строка  "
+          f"{per_row / NETWORK_TIME * 100:.4f}% от запроса к API")
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = [{'имя': f'Клиент {i}', 'город': 'Москва', 'скидка': str(i % 30),
+             'менеджер': 'Анна', 'телефон_менеджера': '79001234567'} for i in range(count)]
+
+    print(f"{count} строк")
+    naive = run('разбор текста для строки', lambda values: render_naive(TEXT, values), rows)
+    renderer = compile_template(TEXT, tuple(rows[0]))
+    compiled = run('скомпилированный текст', renderer.render, rows)
+    assert renderer.render(rows[0]) == render_naive(TEXT, rows[0])
+    print(f"Ускорение: {naive / compiled:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
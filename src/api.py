@@ -1,6 +1,745 @@
 import requests
+from requests.adapters import HTTPAdapter
+import aiohttp
+import asyncio
+import email.utils
 import os
 import mimetypes
+import random
+import threading
+import time
+
+# Параметры HTTP-клиента по умолчанию
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 60
+# Сколько секунд receiveNotification ждет появления уведомления
+DEFAULT_RECEIVE_TIMEOUT = 5
+
+# Повтор запросов: количество попыток и границы паузы между ними (секунды)
+DEFAULT_RETRY_ATTEMPTS = 4
+DEFAULT_RETRY_BASE_DELAY = 1.0
+DEFAULT_RETRY_MAX_DELAY = 30.0
+# Наибольшая пауза по заголовку Retry-After (секунды)
+MAX_RETRY_AFTER = 300
+
+# Коды ответа, при которых запрос стоит повторить позже
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+# Коды ответа sendFileByUrl, означающие, что ссылка на файл больше недоступна
+FILE_URL_ERROR_STATUSES = {404, 410}
+# Коды ответа, при которых инстанс вообще не может отправлять сообщения:
+# неверный ID инстанса или токен (401, 403), исчерпана квота тарифа (466)
+INSTANCE_FATAL_STATUSES = {401, 403, 466}
+
+# Состояния инстанса (stateInstance), в которых он может отправлять сообщения
+READY_INSTANCE_STATES = ('authorized', 'online')
+
+class GreenAPIError(Exception):
+    """
+    Ошибка запроса к Green API.
+    """
+
+    def __init__(self, message, status=None, retry_after=None):
+        """
+        Аргументы:
+            message (str): Описание ошибки.
+            status (int, optional): HTTP-код ответа, если ответ был получен.
+            retry_after (float, optional): Пауза перед повтором из заголовка Retry-After в секундах.
+        """
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class RetryableError(GreenAPIError):
+    """
+    Временная ошибка (перегрузка, сбой сервера, таймаут, обрыв соединения):
+    запрос можно повторить.
+    """
+
+class PermanentError(GreenAPIError):
+    """
+    Ошибка конкретного запроса (например, неверный номер получателя):
+    повтор не поможет, но другие запросы инстанса могут пройти.
+    """
+
+class InstanceFatalError(GreenAPIError):
+    """
+    Инстанс не может отправлять сообщения (неверный токен, исчерпана квота):
+    рассылку через него нужно прекратить.
+    """
+
+def parse_retry_after(value):
+    """
+    Разбирает заголовок Retry-After: число секунд или дату HTTP.
+
+    Возвращает:
+        float или None: Пауза в секундах или None, если заголовка нет или он некорректен.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+def response_error(status, headers, body=""):
+    """
+    Определяет класс ошибки по ответу Green API с кодом 4xx/5xx.
+
+    Аргументы:
+        status (int): HTTP-код ответа.
+        headers (Mapping): Заголовки ответа.
+        body (str, optional): Тело ответа (попадает в текст ошибки).
+
+    Возвращает:
+        GreenAPIError: RetryableError, PermanentError или InstanceFatalError.
+    """
+    message = f"HTTP {status}" + (f": {body[:200]}" if body else "")
+    if status in RETRYABLE_STATUSES:
+        return RetryableError(message, status, parse_retry_after(headers.get('Retry-After')))
+    if status in INSTANCE_FATAL_STATUSES:
+        return InstanceFatalError(message, status)
+    return PermanentError(message, status)
+
+def is_file_url_error(error):
+    """
+    Проверяет, относится ли ошибка sendFileByUrl к самой ссылке на файл
+    (устарела или недоступна), а не к получателю.
+
+    Аргументы:
+        error (GreenAPIError): Ошибка запроса.
+
+    Возвращает:
+        bool: True, если файл нужно загрузить заново.
+    """
+    if not isinstance(error, PermanentError):
+        return False
+    return error.status in FILE_URL_ERROR_STATUSES or 'urlfile' in str(error).lower()
+
+class RetryPolicy:
+    """
+    Политика повтора запросов к Green API.
+
+    Временные ошибки (RetryableError) повторяются до max_attempts попыток с
+    экспоненциально растущей паузой со случайным разбросом (full jitter:
+    случайная пауза от 0 до base_delay * 2^(попытка-1), но не больше max_delay),
+    чтобы параллельные запросы не повторялись одновременно. Если сервер указал
+    Retry-After, пауза берется из него. Ошибки запроса (PermanentError) не
+    повторяются, ошибки инстанса (InstanceFatalError) передаются вызывающему.
+    """
+
+    def __init__(self, max_attempts=DEFAULT_RETRY_ATTEMPTS, base_delay=DEFAULT_RETRY_BASE_DELAY,
+                 max_delay=DEFAULT_RETRY_MAX_DELAY, max_retry_after=MAX_RETRY_AFTER):
+        """
+        Аргументы:
+            max_attempts (int, optional): Максимальное количество попыток запроса.
+            base_delay (float, optional): Верхняя граница паузы перед первым повтором в секундах.
+            max_delay (float, optional): Наибольшая пауза между попытками в секундах.
+            max_retry_after (float, optional): Наибольшая пауза по заголовку Retry-After в секундах.
+        """
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    @classmethod
+    def from_profile(cls, profile_config):
+        """
+        Создает политику по необязательным ключам профиля "retryAttempts",
+        "retryBaseDelay" и "retryMaxDelay".
+        """
+        return cls(
+            max_attempts=int(profile_config.get('retryAttempts', DEFAULT_RETRY_ATTEMPTS)),
+            base_delay=float(profile_config.get('retryBaseDelay', DEFAULT_RETRY_BASE_DELAY)),
+            max_delay=float(profile_config.get('retryMaxDelay', DEFAULT_RETRY_MAX_DELAY))
+        )
+
+    def __eq__(self, other):
+        # Политики с одинаковыми параметрами взаимозаменяемы (см. get_client)
+        if not isinstance(other, RetryPolicy):
+            return NotImplemented
+        return vars(self) == vars(other)
+
+    __hash__ = None
+
+    def delay(self, attempt, error):
+        """
+        Возвращает паузу перед следующей попыткой в секундах.
+
+        Аргументы:
+            attempt (int): Номер неудачной попытки (с 1).
+            error (RetryableError): Ошибка этой попытки.
+        """
+        if error.retry_after is not None:
+            return min(error.retry_after, self.max_retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, send, error_text):
+        """
+        Выполняет запрос с повторами.
+
+        Аргументы:
+            send (callable): Функция без аргументов, выполняющая одну попытку запроса.
+            error_text (str): Текст для сообщения об ошибке.
+
+        Возвращает:
+            Результат send() или None, если запрос не удался.
+
+        Исключения:
+            InstanceFatalError: Инстанс не может отправлять сообщения.
+        """
+        attempt = 1
+        while True:
+            try:
+                return send()
+            except RetryableError as e:
+                if attempt >= self.max_attempts:
+                    print(f"{error_text}: {e} (попыток: {attempt})")
+                    return None
+                time.sleep(self.delay(attempt, e))
+                attempt += 1
+            except PermanentError as e:
+                print(f"{error_text}: {e}")
+                return None
+
+    async def call_async(self, send, error_text, raise_permanent=False):
+        """
+        Асинхронный вариант call(): send возвращает корутину одной попытки,
+        паузы между попытками не блокируют цикл событий.
+
+        Аргументы:
+            raise_permanent (bool, optional): Передавать PermanentError вызывающему
+                                              вместо возврата None.
+        """
+        attempt = 1
+        while True:
+            try:
+                return await send()
+            except RetryableError as e:
+                if attempt >= self.max_attempts:
+                    print(f"{error_text}: {e} (попыток: {attempt})")
+                    return None
+                await asyncio.sleep(self.delay(attempt, e))
+                attempt += 1
+            except PermanentError as e:
+                print(f"{error_text}: {e}")
+                if raise_permanent:
+                    raise
+                return None
+
+class GreenAPIClient:
+    """
+    Клиент Green API для одного инстанса.
+
+    Держит пул keep-alive соединений (requests.Session), поэтому при рассылке
+    TCP/TLS соединение устанавливается один раз, а не для каждого сообщения.
+    Временные ошибки повторяются по политике RetryPolicy; если инстанс не может
+    отправлять сообщения, методы выбрасывают InstanceFatalError.
+    """
+
+    def __init__(self, api_url, media_url, id_instance, api_token_instance,
+                 pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, retry_policy=None):
+        """
+        Аргументы:
+            api_url (str): Базовый URL API (например, "https://1103.api.green-api.com").
+            media_url (str): Базовый URL Media API (например, "https://1103.media.green-api.com").
+            id_instance (str): ID инстанса.
+            api_token_instance (str): API токен инстанса.
+            pool_size (int, optional): Размер пула соединений на хост.
+            connect_timeout (float, optional): Таймаут установки соединения в секундах.
+            read_timeout (float, optional): Таймаут чтения ответа в секундах.
+            retry_policy (RetryPolicy, optional): Политика повтора запросов.
+        """
+        self.api_url = api_url
+        self.media_url = media_url
+        self.id_instance = id_instance
+        self.api_token_instance = api_token_instance
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.retry_policy = retry_policy or RetryPolicy()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Connection': 'keep-alive'})
+
+    def _url(self, base_url, method):
+        return f"{base_url}/waInstance{self.id_instance}/{method}/{self.api_token_instance}"
+
+    def _send(self, method, url, **kwargs):
+        # Одна попытка запроса; ошибки переводятся в классы GreenAPIError
+        try:
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            raise RetryableError(str(e))
+        except requests.exceptions.RequestException as e:
+            raise PermanentError(str(e))
+        if response.status_code >= 400:
+            raise response_error(response.status_code, response.headers, response.text)
+        try:
+            return response.json()
+        except ValueError as e:
+            raise PermanentError(f"Некорректный ответ: {e}", response.status_code)
+
+    def _request(self, method, url, error_text, **kwargs):
+        return self.retry_policy.call(lambda: self._send(method, url, **kwargs), error_text)
+
+    def close(self):
+        """
+        Закрывает все соединения пула.
+        """
+        self.session.close()
+
+    def get_instance_state(self):
+        """
+        Проверяет состояние инстанса Green API.
+
+        Возвращает:
+            dict или None: JSON-ответ от API в случае успеха, None в противном случае.
+
+        Исключения:
+            InstanceFatalError: Неверный ID инстанса или токен.
+        """
+        return self._request('GET', self._url(self.api_url, 'getStateInstance'),
+                             "Ошибка проверки состояния инстанса")
+
+    def receive_notification(self, receive_timeout=DEFAULT_RECEIVE_TIMEOUT):
+        """
+        Получает самое старое уведомление из очереди инстанса. Запрос ждет
+        появления уведомления до receive_timeout секунд (long polling).
+        Полученное уведомление остается в очереди, пока не будет удалено
+        методом delete_notification.
+
+        Аргументы:
+            receive_timeout (int, optional): Время ожидания уведомления в секундах (5-60).
+
+        Возвращает:
+            dict или None: Уведомление ({"receiptId": ..., "body": {...}}) или None,
+                           если очередь пуста или запрос не удался.
+
+        Исключения:
+            InstanceFatalError: Неверный ID инстанса или токен.
+        """
+        return self._request('GET', self._url(self.api_url, 'receiveNotification'),
+                             "Ошибка получения уведомления", params={'receiveTimeout': receive_timeout})
+
+    def delete_notification(self, receipt_id):
+        """
+        Удаляет обработанное уведомление из очереди инстанса.
+
+        Аргументы:
+            receipt_id (int): receiptId уведомления.
+
+        Возвращает:
+            dict или None: JSON-ответ от API ({"result": true}) или None в случае ошибки.
+        """
+        return self._request('DELETE', f"{self._url(self.api_url, 'deleteNotification')}/{receipt_id}",
+                             "Ошибка удаления уведомления")
+
+    def send_message(self, chat_id, message):
+        """
+        Отправляет текстовое сообщение в указанный ID чата.
+
+        Аргументы:
+            chat_id (str): ID чата в формате "7xxxxxxxxxx@c.us".
+            message (str): Текстовое сообщение для отправки.
+
+        Возвращает:
+            dict или None: JSON-ответ от API в случае успеха, None в противном случае.
+        """
+        payload = {
+            "chatId": chat_id,
+            "message": message
+        }
+
+        return self._request('POST', self._url(self.api_url, 'sendMessage'),
+                             "Ошибка отправки сообщения", json=payload)
+
+    def send_file_by_upload(self, chat_id, file_path, caption="", file_name=None):
+        """
+        Отправляет файл путем его загрузки в Green API.
+
+        Аргументы:
+            chat_id (str): ID чата в формате "7xxxxxxxxxx@c.us".
+            file_path (str): Путь к файлу для отправки.
+            caption (str, optional): Подпись к файлу. По умолчанию "".
+            file_name (str, optional): Имя файла для получателя. По умолчанию - имя файла на диске.
+
+        Возвращает:
+            dict или None: JSON-ответ от API в случае успеха, None в противном случае.
+        """
+        payload = {
+            'chatId': chat_id,
+            'caption': caption
+        }
+
+        filename = file_name or os.path.basename(file_path)
+        mime_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream' # MIME-тип по умолчанию, если не определен
+
+        def send():
+            # Файл открывается заново для каждой попытки
+            with open(file_path, 'rb') as file_obj:
+                files = [
+                    ('file', (filename, file_obj, mime_type))
+                ]
+                return self._send('POST', self._url(self.media_url, 'sendFileByUpload'),
+                                  data=payload, files=files)
+
+        try:
+            return self.retry_policy.call(send, "Ошибка отправки файла")
+        except FileNotFoundError:
+            print(f"Ошибка: Файл не найден по пути: {file_path}")
+            return None
+
+    def upload_file(self, file_path, file_name=None):
+        """
+        Загружает файл в хранилище Green API один раз, чтобы затем отправлять его по ссылке.
+
+        Аргументы:
+            file_path (str): Путь к файлу для загрузки.
+            file_name (str, optional): Имя файла для получателя. По умолчанию - имя файла на диске.
+
+        Возвращает:
+            dict или None: JSON-ответ с ключом "urlFile" в случае успеха, None в противном случае.
+        """
+        filename = file_name or os.path.basename(file_path)
+        mime_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        headers = {
+            'Content-Type': mime_type,
+            'GA-Filename': filename
+        }
+
+        def send():
+            with open(file_path, 'rb') as file_obj:
+                return self._send('POST', self._url(self.media_url, 'uploadFile'),
+                                  data=file_obj, headers=headers)
+
+        try:
+            return self.retry_policy.call(send, "Ошибка загрузки файла")
+        except FileNotFoundError:
+            print(f"Ошибка: Файл не найден по пути: {file_path}")
+            return None
+
+    def send_file_by_url(self, chat_id, url_file, file_name, caption=""):
+        """
+        Отправляет ранее загруженный файл по ссылке. Запрос содержит только ссылку,
+        а не сам файл.
+
+        Аргументы:
+            chat_id (str): ID чата в формате "7xxxxxxxxxx@c.us".
+            url_file (str): Ссылка на файл (например, "urlFile" из ответа upload_file).
+            file_name (str): Имя файла с расширением.
+            caption (str, optional): Подпись к файлу. По умолчанию "".
+
+        Возвращает:
+            dict или None: JSON-ответ от API в случае успеха, None в противном случае.
+        """
+        payload = {
+            "chatId": chat_id,
+            "urlFile": url_file,
+            "fileName": file_name,
+            "caption": caption
+        }
+
+        return self._request('POST', self._url(self.api_url, 'sendFileByUrl'),
+                             "Ошибка отправки файла по ссылке", json=payload)
+
+class AsyncGreenAPIClient:
+    """
+    Асинхронный клиент Green API для одного инстанса на базе aiohttp.
+
+    Используется движком рассылки, чтобы держать несколько запросов
+    одновременно в работе. Должен создаваться и закрываться внутри
+    работающего цикла событий asyncio. Ошибки обрабатываются так же, как
+    в GreenAPIClient.
+    """
+
+    def __init__(self, api_url, media_url, id_instance, api_token_instance,
+                 pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, retry_policy=None):
+        """
+        Аргументы:
+            api_url (str): Базовый URL API.
+            media_url (str): Базовый URL Media API.
+            id_instance (str): ID инстанса.
+            api_token_instance (str): API токен инстанса.
+            pool_size (int, optional): Максимальное число одновременных соединений.
+            connect_timeout (float, optional): Таймаут установки соединения в секундах.
+            read_timeout (float, optional): Таймаут чтения ответа в секундах.
+            retry_policy (RetryPolicy, optional): Политика повтора запросов.
+        """
+        self.api_url = api_url
+        self.media_url = media_url
+        self.id_instance = id_instance
+        self.api_token_instance = api_token_instance
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=pool_size),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        )
+
+    @classmethod
+    def from_profile(cls, profile_config):
+        """
+        Создает клиент по данным профиля из config/profile.json.
+
+        Аргументы:
+            profile_config (dict): Данные профиля.
+
+        Возвращает:
+            AsyncGreenAPIClient: Новый клиент.
+        """
+        return cls(
+            profile_config.get('apiUrl'),
+            profile_config.get('mediaUrl'),
+            profile_config.get('idInstance'),
+            profile_config.get('apiTokenInstance'),
+            pool_size=int(profile_config.get('poolSize', DEFAULT_POOL_SIZE)),
+            connect_timeout=float(profile_config.get('connectTimeout', DEFAULT_CONNECT_TIMEOUT)),
+            read_timeout=float(profile_config.get('readTimeout', DEFAULT_READ_TIMEOUT)),
+            retry_policy=RetryPolicy.from_profile(profile_config)
+        )
+
+    def _url(self, base_url, method):
+        return f"{base_url}/waInstance{self.id_instance}/{method}/{self.api_token_instance}"
+
+    async def close(self):
+        """
+        Закрывает сессию и все соединения.
+        """
+        await self.session.close()
+
+    async def _send(self, method, url, **kwargs):
+        # Одна попытка запроса; ошибки переводятся в классы GreenAPIError
+        try:
+            async with self.session.request(method, url, **kwargs) as response:
+                if response.status >= 400:
+                    raise response_error(response.status, response.headers, await response.text())
+                try:
+                    return await response.json(content_type=None)
+                except ValueError as e:
+                    raise PermanentError(f"Некорректный ответ: {e}", response.status)
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+            raise RetryableError(str(e) or type(e).__name__)
+        except aiohttp.ClientError as e:
+            raise PermanentError(str(e))
+
+    async def _post(self, url, error_text, raise_permanent=False, **kwargs):
+        return await self.retry_policy.call_async(lambda: self._send('POST', url, **kwargs), error_text,
+                                                  raise_permanent=raise_permanent)
+
+    async def get_instance_state(self):
+        """
+        Проверяет состояние инстанса Green API.
+
+        Возвращает:
+            dict или None: JSON-ответ от API в случае успеха, None в противном случае.
+
+        Исключения:
+            InstanceFatalError: Неверный ID инстанса или токен.
+        """
+        return await self.retry_policy.call_async(
+            lambda: self._send('GET', self._url(self.api_url, 'getStateInstance')),
+            "Ошибка проверки состояния инстанса"
+        )
+
+    async def send_message(self, chat_id, message, raise_permanent=False):
+        """
+        Отправляет текстовое сообщение в указанный ID чата.
+
+        Аргументы:
+            chat_id (str): ID чата в формате "7xxxxxxxxxx@c.us".
+            message (str): Текстовое сообщение для отправки.
+            raise_permanent (bool, optional): Выбрасывать PermanentError вместо возврата None.
+
+        Возвращает:
+            dict или None: JSON-ответ от API в случае успеха, None в противном случае.
+
+        Исключения:
+            PermanentError: Ошибка запроса, если raise_permanent=True.
+        """
+        payload = {
+            "chatId": chat_id,
+            "message": message
+        }
+        return await self._post(self._url(self.api_url, 'sendMessage'),
+                                "Ошибка отправки сообщения", raise_permanent=raise_permanent, json=payload)
+
+    async def send_file_by_url(self, chat_id, url_file, file_name, caption="", raise_permanent=False):
+        """
+        Отправляет ранее загруженный файл по ссылке.
+
+        Аргументы:
+            chat_id (str): ID чата в формате "7xxxxxxxxxx@c.us".
+            url_file (str): Ссылка на файл.
+            file_name (str): Имя файла с расширением.
+            caption (str, optional): Подпись к файлу. По умолчанию "".
+            raise_permanent (bool, optional): Выбрасывать PermanentError, чтобы вызывающий
+                                              мог отличить устаревшую ссылку (is_file_url_error).
+
+        Возвращает:
+            dict или None: JSON-ответ от API в случае успеха, None в противном случае.
+
+        Исключения:
+            PermanentError: Ошибка запроса, если raise_permanent=True.
+        """
+        payload = {
+            "chatId": chat_id,
+            "urlFile": url_file,
+            "fileName": file_name,
+            "caption": caption
+        }
+        return await self._post(self._url(self.api_url, 'sendFileByUrl'),
+                                "Ошибка отправки файла по ссылке", raise_permanent=raise_permanent,
+                                json=payload)
+
+    async def send_file_by_upload(self, chat_id, file_path, caption="", file_name=None, raise_permanent=False):
+        """
+        Отправляет файл путем его загрузки в Green API.
+
+        Аргументы:
+            chat_id (str): ID чата в формате "7xxxxxxxxxx@c.us".
+            file_path (str): Путь к файлу для отправки.
+            caption (str, optional): Подпись к файлу. По умолчанию "".
+            file_name (str, optional): Имя файла для получателя. По умолчанию - имя файла на диске.
+            raise_permanent (bool, optional): Выбрасывать PermanentError вместо возврата None.
+
+        Возвращает:
+            dict или None: JSON-ответ от API в случае успеха, None в противном случае.
+
+        Исключения:
+            PermanentError: Ошибка запроса, если raise_permanent=True.
+        """
+        filename = file_name or os.path.basename(file_path)
+        mime_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+
+        async def send():
+            # Файл и форма создаются заново для каждой попытки
+            with open(file_path, 'rb') as file_obj:
+                form = aiohttp.FormData()
+                form.add_field('chatId', chat_id)
+                form.add_field('caption', caption)
+                form.add_field('file', file_obj, filename=filename, content_type=mime_type)
+                return await self._send('POST', self._url(self.media_url, 'sendFileByUpload'), data=form)
+
+        try:
+            return await self.retry_policy.call_async(send, "Ошибка отправки файла",
+                                                      raise_permanent=raise_permanent)
+        except FileNotFoundError:
+            print(f"Ошибка: Файл не найден по пути: {file_path}")
+            return None
+
+    async def upload_file(self, file_path, file_name=None):
+        """
+        Загружает файл в хранилище Green API один раз, чтобы затем отправлять его по ссылке.
+
+        Аргументы:
+            file_path (str): Путь к файлу для загрузки.
+            file_name (str, optional): Имя файла для получателя. По умолчанию - имя файла на диске.
+
+        Возвращает:
+            dict или None: JSON-ответ с ключом "urlFile" в случае успеха, None в противном случае.
+        """
+        filename = file_name or os.path.basename(file_path)
+        mime_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        headers = {
+            'Content-Type': mime_type,
+            'GA-Filename': filename
+        }
+
+        async def send():
+            with open(file_path, 'rb') as file_obj:
+                return await self._send('POST', self._url(self.media_url, 'uploadFile'),
+                                        data=file_obj, headers=headers)
+
+        try:
+            return await self.retry_policy.call_async(send, "Ошибка загрузки файла")
+        except FileNotFoundError:
+            print(f"Ошибка: Файл не найден по пути: {file_path}")
+            return None
+
+# Клиенты, переиспользуемые между обработчиками: ключ - адреса и ID инстанса,
+# значение - клиент и параметры, с которыми он создан (токен и options)
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(api_url, media_url, id_instance, api_token_instance, **options):
+    """
+    Возвращает общий клиент Green API для инстанса, создавая его при первом обращении.
+    Если токен или параметры клиента изменились (например, после правки профиля),
+    прежний клиент закрывается и заменяется новым.
+
+    Аргументы:
+        api_url (str): Базовый URL API.
+        media_url (str): Базовый URL Media API.
+        id_instance (str): ID инстанса.
+        api_token_instance (str): API токен инстанса.
+        **options: Параметры пула (pool_size, connect_timeout, read_timeout) и политика повтора (retry_policy).
+
+    Возвращает:
+        GreenAPIClient: Клиент с пулом соединений.
+    """
+    key = (api_url, media_url, id_instance)
+    settings = (api_token_instance, options)
+    stale = None
+    with _clients_lock:
+        entry = _clients.get(key)
+        if entry is not None and entry[1] == settings:
+            return entry[0]
+        if entry is not None:
+            stale = entry[0]
+        client = GreenAPIClient(api_url, media_url, id_instance, api_token_instance, **options)
+        _clients[key] = (client, settings)
+    if stale is not None:
+        print(f"Параметры инстанса {id_instance} изменились, клиент создан заново")
+        stale.close()
+    return client
+
+def close_client_for_profile(profile_config):
+    """
+    Закрывает общий клиент профиля и убирает его из кэша. Вызывается при
+    изменении профиля: если изменились адрес или ID инстанса, get_client
+    создаст клиент с другим ключом, и прежний остался бы открытым.
+
+    Аргументы:
+        profile_config (dict): Данные профиля до изменения.
+    """
+    key = (profile_config.get('apiUrl'), profile_config.get('mediaUrl'), profile_config.get('idInstance'))
+    with _clients_lock:
+        entry = _clients.pop(key, None)
+    if entry is not None:
+        entry[0].close()
+
+def get_client_for_profile(profile_config):
+    """
+    Возвращает общий клиент Green API для профиля из config/profile.json.
+    Необязательные ключи профиля "poolSize", "connectTimeout" и "readTimeout"
+    задают параметры пула соединений, "retryAttempts", "retryBaseDelay" и
+    "retryMaxDelay" - повтор запросов (см. RetryPolicy).
+
+    Аргументы:
+        profile_config (dict): Данные профиля.
+
+    Возвращает:
+        GreenAPIClient: Клиент с пулом соединений.
+    """
+    return get_client(
+        profile_config.get('apiUrl'),
+        profile_config.get('mediaUrl'),
+        profile_config.get('idInstance'),
+        profile_config.get('apiTokenInstance'),
+        pool_size=int(profile_config.get('poolSize', DEFAULT_POOL_SIZE)),
+        connect_timeout=float(profile_config.get('connectTimeout', DEFAULT_CONNECT_TIMEOUT)),
+        read_timeout=float(profile_config.get('readTimeout', DEFAULT_READ_TIMEOUT)),
+        retry_policy=RetryPolicy.from_profile(profile_config)
+    )
 
 def get_instance_state(api_url, id_instance, api_token_instance):
     """
@@ -14,17 +753,7 @@ def get_instance_state(api_url, id_instance, api_token_instance):
     Возвращает:
         dict или None: JSON-ответ от API в случае успеха, None в противном случае.
     """
-    url = f"{api_url}/waInstance{id_instance}/getStateInstance/{api_token_instance}"
-    payload = {}
-    headers = {}
-
-    try:
-        response = requests.request("GET", url, headers=headers, data=payload)
-        response.raise_for_status()  # Вызывает HTTPError для плохих ответов (4xx или 5xx)
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Ошибка проверки состояния инстанса: {e}")
-        return None
+    return get_client(api_url, None, id_instance, api_token_instance).get_instance_state()
 
 def send_message(api_url, id_instance, api_token_instance, chat_id, message):
     """
@@ -40,22 +769,7 @@ def send_message(api_url, id_instance, api_token_instance, chat_id, message):
     Возвращает:
         dict или None: JSON-ответ от API в случае успеха, None в противном случае.
     """
-    url = f"{api_url}/waInstance{id_instance}/sendMessage/{api_token_instance}"
-    payload = {
-        "chatId": chat_id,
-        "message": message
-    }
-    headers = {
-        'Content-Type': 'application/json'
-    }
-
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Ошибка отправки сообщения: {e}")
-        return None
+    return get_client(api_url, None, id_instance, api_token_instance).send_message(chat_id, message)
 
 def send_file_by_upload(media_url, id_instance, api_token_instance, chat_id, file_path, caption=""):
     """
@@ -72,27 +786,39 @@ def send_file_by_upload(media_url, id_instance, api_token_instance, chat_id, fil
     Возвращает:
         dict или None: JSON-ответ от API в случае успеха, None в противном случае.
     """
-    url = f"{media_url}/waInstance{id_instance}/sendFileByUpload/{api_token_instance}"
-    payload = {
-        'chatId': chat_id,
-        'caption': caption
-    }
+    client = get_client(None, media_url, id_instance, api_token_instance)
+    return client.send_file_by_upload(chat_id, file_path, caption=caption)
 
-    filename = os.path.basename(file_path)
-    mime_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream' # MIME-тип по умолчанию, если не определен
+def upload_file(media_url, id_instance, api_token_instance, file_path):
+    """
+    Загружает файл в хранилище Green API один раз, чтобы затем отправлять его по ссылке.
 
-    try:
-        with open(file_path, 'rb') as file_obj:
-            files = [
-                ('file', (filename, file_obj, mime_type))
-            ]
-            response = requests.post(url, data=payload, files=files)
-            response.raise_for_status()
-            return response.json()
-    except FileNotFoundError:
-        print(f"Ошибка: Файл не найден по пути: {file_path}")
-        return None
-    except requests.exceptions.RequestException as e:
-        print(f"Ошибка отправки файла: {e}")
-        return None
-    
+    Аргументы:
+        media_url (str): Базовый URL Media API.
+        id_instance (str): ID инстанса.
+        api_token_instance (str): API токен инстанса.
+        file_path (str): Путь к файлу для загрузки.
+
+    Возвращает:
+        dict или None: JSON-ответ с ключом "urlFile" в случае успеха, None в противном случае.
+    """
+    return get_client(None, media_url, id_instance, api_token_instance).upload_file(file_path)
+
+def send_file_by_url(api_url, id_instance, api_token_instance, chat_id, url_file, file_name, caption=""):
+    """
+    Отправляет ранее загруженный файл по ссылке.
+
+    Аргументы:
+        api_url (str): Базовый URL API.
+        id_instance (str): ID инстанса.
+        api_token_instance (str): API токен инстанса.
+        chat_id (str): ID чата в формате "7xxxxxxxxxx@c.us".
+        url_file (str): Ссылка на файл.
+        file_name (str): Имя файла с расширением.
+        caption (str, optional): Подпись к файлу. По умолчанию "".
+
+    Возвращает:
+        dict или None: JSON-ответ от API в случае успеха, None в противном случае.
+    """
+    client = get_client(api_url, None, id_instance, api_token_instance)
+    return client.send_file_by_url(chat_id, url_file, file_name, caption=caption)
@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from telebot.apihelper import ApiTelegramException
+
+# Количество потоков для тяжелых операций (загрузка файлов, разбор списков номеров)
+BACKGROUND_WORKERS = 4
+# Минимальный интервал между изменениями сообщения о ходе обработки (секунды)
+PROGRESS_MIN_INTERVAL = 1.0
+# Интервал обновления сообщения о ходе рассылки (секунды)
+PROGRESS_REPORT_INTERVAL = 5.0
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix='background')
+        return _executor
+
+def _run_logged(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        logging.exception(f"Ошибка в фоновой задаче {getattr(func, '__name__', func)}: {str(e)}")
+        raise
+
+def run_in_background(func, *args, **kwargs):
+    """
+    Выполняет функцию в фоновом пуле потоков, чтобы не занимать поток обработчика.
+    Исключения задачи записываются в лог.
+
+    Аргументы:
+        func (callable): Функция для выполнения.
+        *args, **kwargs: Аргументы функции.
+
+    Возвращает:
+        concurrent.futures.Future: Результат выполнения.
+    """
+    return _get_executor().submit(_run_logged, func, args, kwargs)
+
+class ProgressMessage:
+    """
+    Сообщение о ходе длительной операции. Отправляется один раз и затем
+    редактируется на месте; промежуточные изменения не чаще раза в
+    PROGRESS_MIN_INTERVAL секунд, чтобы не упираться в лимиты Telegram.
+    """
+
+    def __init__(self, bot, chat_id, text, min_interval=PROGRESS_MIN_INTERVAL):
+        """
+        Аргументы:
+            bot (telebot.TeleBot): Экземпляр бота Telegram.
+            chat_id (int): ID чата.
+            text (str): Начальный текст сообщения.
+            min_interval (float, optional): Минимальный интервал между изменениями в секундах.
+        """
+        self.bot = bot
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self._text = text
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.message_id = bot.send_message(chat_id, text).message_id
+
+    def update(self, text, force=False):
+        """
+        Меняет текст сообщения. Без force изменение пропускается, если с прошлого
+        прошло меньше min_interval секунд.
+
+        Аргументы:
+            text (str): Новый текст.
+            force (bool, optional): Изменить сообщение без учета интервала.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if text == self._text or (not force and now - self._updated < self.min_interval):
+                return
+            self._text = text
+            self._updated = now
+        try:
+            self.bot.edit_message_text(text, self.chat_id, self.message_id)
+        except ApiTelegramException as e:
+            logging.warning(f"Не удалось обновить сообщение о ходе обработки: {str(e)}")
+
+    def done(self, text):
+        """
+        Записывает итоговый текст сообщения.
+        """
+        self.update(text, force=True)
+
+class ProgressReporter(ProgressMessage):
+    """
+    Сообщение о ходе длительной операции, которое обновляется из отдельного
+    потока. report() только запоминает последний текст и сразу возвращается,
+    поэтому его можно вызывать на каждом шаге (например, после каждого
+    получателя рассылки), не задерживая саму операцию запросами к Telegram.
+    Поток раз в min_interval секунд записывает в сообщение последний текст;
+    промежуточные тексты за этот интервал отбрасываются.
+    """
+
+    def __init__(self, bot, chat_id, text, min_interval=PROGRESS_REPORT_INTERVAL):
+        """
+        Аргументы:
+            bot (telebot.TeleBot): Экземпляр бота Telegram.
+            chat_id (int): ID чата.
+            text (str): Начальный текст сообщения.
+            min_interval (float, optional): Интервал между изменениями в секундах.
+        """
+        super().__init__(bot, chat_id, text, min_interval=min_interval)
+        self._pending = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def report(self, text):
+        """
+        Запоминает новый текст сообщения; он будет записан при следующем обновлении.
+
+        Аргументы:
+            text (str): Новый текст.
+        """
+        with self._lock:
+            self._pending = text
+
+    def _run(self):
+        while not self._stopped.wait(self.min_interval):
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            text, self._pending = self._pending, None
+        if text is not None:
+            self.update(text, force=True)
+
+    def done(self, text=None):
+        """
+        Останавливает поток обновлений и записывает итоговый текст сообщения
+        (или последний переданный в report(), если text не указан).
+        """
+        self._stopped.set()
+        self._thread.join()
+        if text is None:
+            self._flush()
+        else:
+            self.update(text, force=True)
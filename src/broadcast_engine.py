@@ -0,0 +1,365 @@
+import asyncio
+import os
+
+from api import (
+    AsyncGreenAPIClient,
+    InstanceFatalError,
+    PermanentError,
+    READY_INSTANCE_STATES,
+    get_client_for_profile,
+    is_file_url_error
+)
+from circuit_breaker import get_breaker, OPEN, HALF_OPEN
+from rate_limiter import get_limiter
+from template_renderer import compile_template
+from utils import create_chat_id
+
+# Количество запросов, одновременно находящихся в работе на один инстанс
+DEFAULT_CONCURRENCY = 4
+# Сколько раз за рассылку инстанс может заново загрузить файл, если ссылка устарела
+MAX_RESTAGES = 3
+
+class BroadcastStats:
+    """
+    Счетчики рассылки: всего, успешно, с ошибками, а также количество
+    успешных отправок по каждому инстансу.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.success = 0
+        self.failed = 0
+        self.per_instance = {}
+        self.failed_instances = []
+
+    @property
+    def processed(self):
+        return self.success + self.failed
+
+class _Instance:
+    """
+    Инстанс Green API, участвующий в рассылке: клиент, бюджет скорости и состояние.
+    """
+
+    def __init__(self, profile_config, interval, burst):
+        self.id_instance = profile_config.get('idInstance')
+        self.name = profile_config.get('name') or self.id_instance
+        self.concurrency = max(1, int(profile_config.get('concurrency', DEFAULT_CONCURRENCY)))
+        self.limiter = get_limiter(self.id_instance, 1 / interval, burst)
+        self.client = AsyncGreenAPIClient.from_profile(profile_config)
+        self.breaker = get_breaker(self.id_instance)
+        self.url_file = None
+        self.healthy = True
+        self.restages = 0
+        self._staging_lock = asyncio.Lock()
+
+    @property
+    def available(self):
+        return self.healthy and self.breaker.state != OPEN
+
+    async def stage(self, media):
+        """
+        Загружает медиафайл в хранилище Green API (uploadFile), чтобы отправлять его по ссылке.
+
+        Возвращает:
+            str или None: Ссылка на файл или None, если загрузить не удалось.
+
+        Исключения:
+            InstanceFatalError: Инстанс не может отправлять сообщения.
+        """
+        staged = await self.client.upload_file(media['path'], file_name=media.get('name'))
+        self.url_file = staged.get('urlFile') if staged else None
+        return self.url_file
+
+    async def restage(self, media, failed_url):
+        """
+        Заново загружает файл, ссылка на который перестала работать. Запросы,
+        одновременно получившие ошибку по той же ссылке, ждут одну загрузку
+        и получают новую ссылку.
+
+        Аргументы:
+            media (dict): Медиафайл рассылки.
+            failed_url (str): Ссылка, по которой отправка не удалась.
+
+        Возвращает:
+            str или None: Новая ссылка или None, если файл придется загружать для каждого получателя.
+        """
+        async with self._staging_lock:
+            if self.url_file != failed_url:
+                # Файл уже загружен заново другим запросом
+                return self.url_file
+            self.url_file = None
+            if self.restages >= MAX_RESTAGES:
+                return None
+            self.restages += 1
+            if await self.stage(media):
+                print(f"Инстанс {self.name}: ссылка на файл устарела, файл загружен заново")
+            return self.url_file
+
+def _instance_problem(response):
+    """
+    Возвращает описание проблемы по ответу getStateInstance или None, если инстанс готов.
+    """
+    if not response:
+        return "нет ответа"
+    state = response.get('stateInstance')
+    if state not in READY_INSTANCE_STATES:
+        return f"статус {state or 'неизвестен'}"
+    return None
+
+def preflight_check(profiles):
+    """
+    Проверяет инстансы перед рассылкой запросом getStateInstance. Предохранитель
+    инстанса, не прошедшего проверку, размыкается, прошедшего - замыкается.
+
+    Аргументы:
+        profiles (list): Профили инстансов Green API.
+
+    Возвращает:
+        tuple: (профили готовых инстансов, список пар (имя инстанса, описание проблемы)).
+    """
+    ready = []
+    problems = []
+    for profile in profiles:
+        name = profile.get('name') or profile.get('idInstance')
+        try:
+            problem = _instance_problem(get_client_for_profile(profile).get_instance_state())
+        except InstanceFatalError as e:
+            problem = str(e)
+        breaker = get_breaker(profile.get('idInstance'))
+        if problem:
+            breaker.trip()
+            problems.append((name, problem))
+        else:
+            breaker.record_success()
+            ready.append(profile)
+    return ready, problems
+
+async def _send_one(instance, phone, message, media):
+    """
+    Отправляет сообщение одному получателю. Медиафайл отправляется по ссылке
+    на загруженный файл; если ссылка устарела, файл один раз загружается
+    заново (_Instance.restage). Для каждого получателя файл загружается,
+    только если загрузить его в хранилище не удалось.
+
+    Возвращает:
+        dict или None: Ответ API или None, если временные ошибки не прошли за все попытки.
+
+    Исключения:
+        PermanentError: Ошибка, относящаяся к получателю (например, неверный номер).
+        InstanceFatalError: Инстанс не может отправлять сообщения.
+    """
+    client = instance.client
+    whatsapp_chat_id = create_chat_id(phone)
+
+    if not (media and os.path.exists(media['path'])):
+        return await client.send_message(whatsapp_chat_id, message, raise_permanent=True)
+
+    url_file = instance.url_file
+    if url_file:
+        try:
+            return await client.send_file_by_url(whatsapp_chat_id, url_file, media['name'],
+                                                 caption=message, raise_permanent=True)
+        except PermanentError as e:
+            if not is_file_url_error(e):
+                # Ошибка получателя - новая загрузка файла не поможет
+                raise
+        url_file = await instance.restage(media, url_file)
+        if url_file:
+            return await client.send_file_by_url(whatsapp_chat_id, url_file, media['name'],
+                                                 caption=message, raise_permanent=True)
+    return await client.send_file_by_upload(whatsapp_chat_id, media['path'], caption=message,
+                                            file_name=media.get('name'), raise_permanent=True)
+
+async def broadcast_async(profiles, phone_numbers, message, media=None, interval=5,
+                          burst=1, total=None, on_progress=None, on_result=None):
+    """
+    Выполняет рассылку через один или несколько инстансов Green API.
+
+    Получатели распределяются между инстансами через общую очередь: каждый
+    инстанс забирает следующий номер, как только позволяет его собственный
+    бюджет скорости, поэтому общая скорость растет с числом инстансов. На каждом
+    инстансе одновременно в работе до N запросов (ключ профиля "concurrency").
+    Временные ошибки повторяет клиент (см. api.RetryPolicy). Инстанс, который
+    не может отправлять сообщения (InstanceFatalError), выводится из рассылки.
+    Временные ошибки, не прошедшие за все попытки, считает предохранитель
+    инстанса (circuit_breaker); ошибки конкретных получателей (PermanentError,
+    например неверный номер) в нем не учитываются. Когда цепь размыкается,
+    состояние инстанса сразу проверяется запросом getStateInstance (сбой мог
+    быть кратковременным), а затем, пока инстанс не готов, проверяется раз
+    в reset_timeout секунд. Номер, на котором цепь разомкнулась, возвращается
+    в очередь остальным инстансам. Если недоступны все инстансы,
+    рассылка сразу прекращается, а оставшиеся номера остаются без результата.
+    Текст сообщения компилируется один раз (template_renderer): подстановки
+    вида {name} заполняются значениями столбцов, переданных вместе с номером;
+    без значений полей текст отправляется как есть.
+
+    Аргументы:
+        profiles (list): Профили инстансов Green API (см. utils.get_instance_profiles).
+        phone_numbers (iterable): Номера телефонов получателей или пары
+                                  (номер, словарь значений полей для подстановки).
+        message (str): Текст сообщения (подпись к файлу при наличии медиа).
+        media (dict, optional): Медиафайл рассылки с ключами 'path' и 'name'.
+        interval (float, optional): Средний интервал между отправками в секундах
+                                    для каждого инстанса (его бюджет - 1/interval сообщений в секунду).
+        burst (int, optional): Сколько сообщений можно отправить подряд без ожидания.
+        total (int, optional): Общее количество получателей, если phone_numbers не поддерживает len().
+        on_progress (callable, optional): Вызывается с BroadcastStats после каждой отправки.
+        on_result (callable, optional): Вызывается для каждого получателя с аргументами
+                                        (телефон, доставлено, idMessage). Номера, оставшиеся
+                                        без результата (все инстансы выведены), не передаются.
+
+    Возвращает:
+        BroadcastStats: Итоговая статистика рассылки.
+    """
+    stats = BroadcastStats(total if total is not None else len(phone_numbers))
+    instances = [_Instance(profile, interval, burst) for profile in profiles]
+
+    def disable(instance, error):
+        # Инстанс не может отправлять сообщения - выводим его сразу, не дожидаясь
+        # ошибок по остальным номерам
+        if instance.healthy:
+            instance.healthy = False
+            stats.failed_instances.append(f"{instance.name} ({error})")
+            print(f"Инстанс {instance.name} выведен из рассылки: {error}")
+
+    async def probe(instance):
+        # Пробный запрос состояния инстанса при разомкнутой цепи
+        try:
+            problem = _instance_problem(await instance.client.get_instance_state())
+        except InstanceFatalError as e:
+            disable(instance, e)
+            return
+        if problem:
+            instance.breaker.trip()
+            print(f"Инстанс {instance.name} недоступен ({problem}), "
+                  f"повторная проверка через {instance.breaker.reset_timeout:.0f} с")
+        else:
+            instance.breaker.record_success()
+
+    try:
+        # Загружаем медиа в Green API один раз на всю рассылку (для каждого инстанса)
+        if media and os.path.exists(media['path']):
+            for instance in instances:
+                try:
+                    await instance.stage(media)
+                except InstanceFatalError as e:
+                    disable(instance, e)
+
+        workers_count = sum(instance.concurrency for instance in instances)
+        queue = asyncio.Queue(maxsize=workers_count * 2)
+        # Номера, возвращенные выведенными из рассылки инстансами
+        requeued = []
+        in_flight = {'count': 0}
+
+        async def producer():
+            for recipient in phone_numbers:
+                await queue.put(recipient)
+            for _ in range(workers_count):
+                await queue.put(None)
+
+        async def process(instance, recipient):
+            phone, fields = recipient if isinstance(recipient, tuple) else (recipient, None)
+            text = compile_template(message, tuple(fields)).render(fields) if fields else message
+            await instance.limiter.acquire_async()
+            recipient_error = False
+            try:
+                response = await _send_one(instance, phone, text, media)
+            except InstanceFatalError as e:
+                disable(instance, e)
+                requeued.append(recipient)
+                return
+            except PermanentError:
+                # Ошибка самого получателя (например, неверный номер) не говорит о
+                # неисправности инстанса и не учитывается предохранителем
+                response = None
+                recipient_error = True
+            except Exception as e:
+                response = None
+                print(f"Ошибка при отправке на номер {phone}: {str(e)}")
+            delivered = bool(response and 'idMessage' in response)
+
+            if delivered:
+                instance.breaker.record_success()
+                stats.success += 1
+                stats.per_instance[instance.name] = stats.per_instance.get(instance.name, 0) + 1
+            else:
+                if not recipient_error:
+                    opened = instance.breaker.record_failure()
+                    if instance.breaker.state == OPEN:
+                        # Цепь разомкнута - номер достанется другому инстансу или
+                        # этому же после успешной проверки
+                        requeued.append(recipient)
+                        if opened:
+                            print(f"Инстанс {instance.name}: ошибки подряд, проверяем состояние инстанса")
+                            await probe(instance)
+                        return
+                stats.failed += 1
+
+            if on_result:
+                on_result(phone, delivered, response.get('idMessage') if delivered else None)
+            if on_progress:
+                on_progress(stats)
+
+        async def worker(instance):
+            finished = False
+            while instance.healthy:
+                if not instance.breaker.allow_request():
+                    if not any(other.available for other in instances):
+                        # Недоступны все инстансы - прекращаем рассылку
+                        return
+                    await asyncio.sleep(min(instance.breaker.retry_in(), 1.0) or 0.05)
+                    continue
+                if instance.breaker.state == HALF_OPEN:
+                    await probe(instance)
+                    continue
+                if requeued:
+                    recipient = requeued.pop()
+                elif finished:
+                    # Другие инстансы еще могут вернуть номера - ждем их завершения
+                    if not in_flight['count']:
+                        return
+                    await asyncio.sleep(0.05)
+                    continue
+                else:
+                    recipient = await queue.get()
+                    if recipient is None:
+                        # Очередь закончилась, но нужно дообработать возвращенные номера
+                        finished = True
+                        continue
+                in_flight['count'] += 1
+                try:
+                    await process(instance, recipient)
+                finally:
+                    in_flight['count'] -= 1
+
+        producer_task = asyncio.create_task(producer())
+        await asyncio.gather(*(worker(instance)
+                               for instance in instances
+                               for _ in range(instance.concurrency)))
+        # Если все инстансы выведены, оставшиеся номера не читаем
+        producer_task.cancel()
+        for instance in instances:
+            if instance.healthy and instance.breaker.state == OPEN:
+                stats.failed_instances.append(f"{instance.name} (недоступен)")
+        try:
+            await producer_task
+        except asyncio.CancelledError:
+            pass
+    finally:
+        for instance in instances:
+            await instance.client.close()
+
+    return stats
+
+def run_broadcast(profiles, phone_numbers, message, media=None, interval=5,
+                  burst=1, total=None, on_progress=None, on_result=None):
+    """
+    Синхронная обертка над broadcast_async для запуска из потока рассылки.
+
+    Аргументы и возвращаемое значение - как у broadcast_async.
+    """
+    return asyncio.run(broadcast_async(
+        profiles, phone_numbers, message, media=media, interval=interval,
+        burst=burst, total=total, on_progress=on_progress, on_result=on_result
+    ))
@@ -0,0 +1,128 @@
+import threading
+import time
+
+# Количество ошибок подряд, после которого цепь размыкается
+DEFAULT_FAILURE_THRESHOLD = 5
+# Через сколько секунд после размыкания разрешается пробный запрос
+DEFAULT_RESET_TIMEOUT = 30.0
+
+# Состояния цепи
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """
+    Предохранитель для инстанса Green API.
+
+    В замкнутом состоянии (CLOSED) запросы разрешены и считаются ошибки подряд.
+    После failure_threshold ошибок цепь размыкается (OPEN): запросы не
+    выполняются, пока не пройдет reset_timeout секунд. Затем одному вызывающему
+    разрешается пробный запрос (HALF_OPEN): при успехе цепь замыкается, при
+    ошибке снова размыкается на reset_timeout. Потокобезопасен.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        """
+        Аргументы:
+            failure_threshold (int, optional): Количество ошибок подряд до размыкания.
+            reset_timeout (float, optional): Пауза до пробного запроса в секундах.
+        """
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def state(self):
+        """
+        Текущее состояние цепи: CLOSED, OPEN или HALF_OPEN.
+        """
+        with self._lock:
+            return self._state
+
+    def allow_request(self):
+        """
+        Проверяет, можно ли выполнить запрос. В разомкнутом состоянии после
+        reset_timeout возвращает True ровно одному вызывающему - он должен
+        выполнить пробный запрос и сообщить результат.
+
+        Возвращает:
+            bool: True, если запрос разрешен.
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                return True
+            return False
+
+    def retry_in(self):
+        """
+        Возвращает, через сколько секунд будет разрешен пробный запрос (0 в замкнутом состоянии).
+        """
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def record_success(self):
+        """
+        Отмечает успешный запрос: цепь замыкается, счетчик ошибок сбрасывается.
+        """
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        """
+        Отмечает ошибку запроса.
+
+        Возвращает:
+            bool: True, если цепь разомкнулась именно этой ошибкой.
+        """
+        with self._lock:
+            self._failures += 1
+            if self._state == OPEN:
+                return False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open()
+                return True
+            return False
+
+    def trip(self):
+        """
+        Размыкает цепь сразу, не дожидаясь failure_threshold ошибок
+        (например, если проверка инстанса перед рассылкой не прошла).
+        """
+        with self._lock:
+            self._open()
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+
+# Предохранители по инстансам (ключ - idInstance)
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(instance_id):
+    """
+    Возвращает общий предохранитель инстанса, создавая его при первом обращении.
+    Состояние сохраняется между рассылками.
+
+    Аргументы:
+        instance_id (str): ID инстанса.
+
+    Возвращает:
+        CircuitBreaker: Предохранитель инстанса.
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(instance_id)
+        if breaker is None:
+            breaker = CircuitBreaker()
+            _breakers[instance_id] = breaker
+        return breaker
@@ -0,0 +1,149 @@
+import logging
+import queue
+import threading
+import time
+
+# Количество потоков-обработчиков по умолчанию
+DEFAULT_WORKERS = 4
+
+def get_update_chat_id(update):
+    """
+    Определяет чат, к которому относится обновление Telegram.
+
+    Аргументы:
+        update (telebot.types.Update): Обновление.
+
+    Возвращает:
+        int: ID чата (или пользователя); для обновлений без чата - update_id.
+    """
+    message = update.message or update.edited_message
+    if message:
+        return message.chat.id
+    if update.callback_query:
+        if update.callback_query.message:
+            return update.callback_query.message.chat.id
+        return update.callback_query.from_user.id
+    return update.update_id
+
+class ChatDispatcher:
+    """
+    Пул потоков для обработки обновлений, распределенных по чатам.
+
+    Каждый чат всегда попадает в один и тот же поток (по chat_id), поэтому
+    обновления одного чата обрабатываются строго по порядку, а разные чаты -
+    параллельно. Медленный обработчик (например, загрузка файла) задерживает
+    только чаты своего потока, а не весь бот.
+    """
+
+    def __init__(self, handle_updates, workers=DEFAULT_WORKERS, queue_size=1000):
+        """
+        Аргументы:
+            handle_updates (callable): Функция обработки списка обновлений
+                                       (исходный bot.process_new_updates бота с threaded=False).
+            workers (int, optional): Количество потоков-обработчиков.
+            queue_size (int, optional): Максимальная длина очереди одного потока; при
+                                        заполнении submit ждет освобождения места.
+        """
+        self._handle_updates = handle_updates
+        # Бот, чей last_update_id продвигается при постановке обновлений в очередь
+        self._bot = None
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(max(1, int(workers)))]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._processed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    @classmethod
+    def attach(cls, bot, workers=DEFAULT_WORKERS, queue_size=1000):
+        """
+        Подключает пул к боту: bot.process_new_updates (его вызывают и polling,
+        и webhook-сервер) заменяется постановкой обновлений в очереди пула.
+        Номер последнего обновления (bot.last_update_id) продвигается сразу при
+        постановке в очередь, иначе polling запрашивал бы еще не обработанные
+        обновления повторно и они обрабатывались бы несколько раз.
+
+        Аргументы:
+            bot (telebot.TeleBot): Экземпляр бота, созданный с threaded=False.
+            workers (int, optional): Количество потоков-обработчиков.
+            queue_size (int, optional): Максимальная длина очереди одного потока.
+
+        Возвращает:
+            ChatDispatcher: Запущенный пул.
+        """
+        dispatcher = cls(bot.process_new_updates, workers=workers, queue_size=queue_size)
+        dispatcher._bot = bot
+        bot.process_new_updates = dispatcher.submit
+        dispatcher.start()
+        return dispatcher
+
+    def submit(self, updates):
+        """
+        Ставит обновления в очереди потоков по их чатам.
+
+        Аргументы:
+            updates (list): Список обновлений telebot.types.Update.
+        """
+        now = time.monotonic()
+        for update in updates:
+            if self._bot is not None and update.update_id > self._bot.last_update_id:
+                # Следующий запрос getUpdates не вернет уже принятые обновления
+                self._bot.last_update_id = update.update_id
+            shard = get_update_chat_id(update) % len(self._queues)
+            self._queues[shard].put((now, update))
+
+    def _worker(self, updates_queue):
+        while True:
+            item = updates_queue.get()
+            if item is None:
+                return
+            enqueued, update = item
+            wait = time.monotonic() - enqueued
+            with self._lock:
+                self._processed += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+            try:
+                self._handle_updates([update])
+            except Exception as e:
+                logging.error(f"Ошибка при обработке обновления {update.update_id}: {str(e)}")
+
+    def start(self):
+        """
+        Запускает потоки-обработчики.
+        """
+        self._threads = [threading.Thread(target=self._worker, args=(updates_queue,), daemon=True)
+                         for updates_queue in self._queues]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Останавливает потоки после обработки уже поставленных в очередь обновлений.
+        """
+        for updates_queue in self._queues:
+            updates_queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def metrics(self):
+        """
+        Возвращает метрики пула.
+
+        Возвращает:
+            dict: Количество потоков ('workers'), длины очередей потоков ('queue_depth'),
+                  количество обработанных обновлений ('processed'), среднее и максимальное
+                  время ожидания обновления в очереди в секундах ('avg_wait', 'max_wait').
+        """
+        with self._lock:
+            processed = self._processed
+            total_wait = self._total_wait
+            max_wait = self._max_wait
+        return {
+            'workers': len(self._queues),
+            'queue_depth': [updates_queue.qsize() for updates_queue in self._queues],
+            'processed': processed,
+            'avg_wait': total_wait / processed if processed else 0.0,
+            'max_wait': max_wait
+        }
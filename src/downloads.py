@@ -0,0 +1,145 @@
+import hashlib
+import os
+import threading
+import uuid
+
+import requests
+from telebot import apihelper
+from telebot.apihelper import ApiHTTPException
+
+# Максимальный размер загружаемого файла (байт)
+MAX_DOWNLOAD_SIZE = 50 * 1024 * 1024
+# Размер блока при потоковой загрузке (байт)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Общая сессия для скачивания файлов: keep-alive соединения с сервером файлов Telegram
+_session = None
+_session_lock = threading.Lock()
+
+class FileTooLargeError(Exception):
+    """
+    Файл превышает допустимый размер загрузки.
+    """
+
+    def __init__(self, size, max_size):
+        self.size = size
+        self.max_size = max_size
+        super().__init__(f"Файл больше допустимого размера {max_size // (1024 * 1024)} МБ")
+
+def get_message_file(message):
+    """
+    Извлекает из сообщения сведения о прикрепленном файле.
+
+    Аргументы:
+        message (telebot.types.Message): Сообщение с документом, фото, видео или аудио.
+
+    Возвращает:
+        tuple или None: (file_id, имя файла, тип файла) или None, если файла в сообщении нет.
+    """
+    if message.content_type == 'document':
+        file_id = message.document.file_id
+        file_name = message.document.file_name or f"document_{file_id}"
+    elif message.content_type == 'photo':
+        file_id = message.photo[-1].file_id  # Берем фото максимального размера
+        file_name = f"photo_{file_id}.jpg"
+    elif message.content_type == 'video':
+        file_id = message.video.file_id
+        file_name = message.video.file_name if message.video.file_name else f"video_{file_id}.mp4"
+    elif message.content_type == 'audio':
+        file_id = message.audio.file_id
+        file_name = message.audio.file_name if message.audio.file_name else f"audio_{file_id}.mp3"
+    else:
+        return None
+    # Имя задает отправитель, поэтому отбрасываем возможный путь
+    return file_id, os.path.basename(file_name), message.content_type
+
+def format_download_progress(size, total=None):
+    """
+    Формирует текст о ходе загрузки файла.
+
+    Аргументы:
+        size (int): Загружено байт.
+        total (int, optional): Размер файла в байтах, если известен.
+
+    Возвращает:
+        str: Текст вида "⏳ Загружаем файл... 1.5 / 10.0 МБ".
+    """
+    megabytes = 1024 * 1024
+    if total:
+        return f"⏳ Загружаем файл... {size / megabytes:.1f} / {total / megabytes:.1f} МБ"
+    return f"⏳ Загружаем файл... {size / megabytes:.1f} МБ"
+
+def get_download_session():
+    """
+    Возвращает общую сессию requests для скачивания файлов из Telegram.
+    Сессия создается при первом вызове.
+
+    Возвращает:
+        requests.Session: Сессия с пулом keep-alive соединений.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+        return _session
+
+def _file_url(token, file_path):
+    if apihelper.FILE_URL is None:
+        return f"https://api.telegram.org/file/bot{token}/{file_path}"
+    return apihelper.FILE_URL.format(token, file_path)
+
+def download_telegram_file(bot, file_id, file_path, max_size=MAX_DOWNLOAD_SIZE, on_progress=None):
+    """
+    Потоково скачивает файл из Telegram на диск блоками по DOWNLOAD_CHUNK_SIZE,
+    не держа его целиком в памяти. Размер проверяется по ходу загрузки,
+    контрольная сумма SHA-256 считается на лету. Файл пишется во временный
+    файл рядом с итоговым и переименовывается только после полной загрузки.
+
+    Аргументы:
+        bot (telebot.TeleBot): Экземпляр бота Telegram.
+        file_id (str): ID файла в Telegram.
+        file_path (str): Путь для сохранения.
+        max_size (int, optional): Максимальный размер файла в байтах.
+        on_progress (callable, optional): Вызывается после каждого блока с аргументами
+                                          (загружено байт, размер файла или None).
+
+    Возвращает:
+        dict: Путь ('path'), размер в байтах ('size') и SHA-256 в hex ('sha256').
+
+    Исключения:
+        FileTooLargeError: Файл больше max_size.
+        ApiHTTPException: Telegram вернул ошибку при загрузке.
+    """
+    file_info = bot.get_file(file_id)
+    total = file_info.file_size
+    if total and total > max_size:
+        raise FileTooLargeError(total, max_size)
+
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{file_path}.{uuid.uuid4().hex}.part"
+
+    checksum = hashlib.sha256()
+    size = 0
+    try:
+        with get_download_session().get(
+                _file_url(bot.token, file_info.file_path), stream=True, proxies=apihelper.proxy,
+                timeout=(apihelper.CONNECT_TIMEOUT, apihelper.READ_TIMEOUT)) as response:
+            if response.status_code != 200:
+                raise ApiHTTPException('Download file', response)
+            with open(temp_path, 'wb') as file:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_size:
+                        raise FileTooLargeError(size, max_size)
+                    checksum.update(chunk)
+                    file.write(chunk)
+                    if on_progress:
+                        on_progress(size, total)
+        os.replace(temp_path, file_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return {'path': file_path, 'size': size, 'sha256': checksum.hexdigest()}
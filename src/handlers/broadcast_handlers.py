@@ -1,9 +1,13 @@
 import os
+import re
+import itertools
 import json
-import time
+import logging
+import uuid
 import pandas as pd
 import telebot
 from telebot import types
+from telebot.apihelper import ApiTelegramException
 import threading
 
 # Импорт клавиатур
@@ -19,84 +23,215 @@ from keyboards.main_menu_keyboard import get_main_menu_keyboard
 
 # Импорт утилит и API
 from utils import (
-    load_config,
-    read_excel_numbers,
+    get_profile_config,
+    get_interval_settings,
+    get_bot_settings,
+    scan_phone_numbers,
+    iter_phone_numbers,
+    iter_recipient_fields,
+    read_columns,
     normalize_phone_number,
-    create_chat_id,
-    is_valid_interval
+    get_instance_profiles
 )
-from api import send_message, send_file_by_upload
+from broadcast_engine import run_broadcast, preflight_check
+from background import run_in_background, ProgressMessage, ProgressReporter
+from downloads import get_message_file, download_telegram_file, format_download_progress
+from media_store import get_media_store, save_telegram_media
+from template_repository import get_template_repository
+from job_store import get_job_store, JobCheckpoint, JOB_RUNNING, JOB_PAUSED, JOB_DONE, RECIPIENT_PENDING, RECIPIENT_SENT, RECIPIENT_FAILED
+from state_store import StateStore
+from suppression import get_suppression_index, campaign_key, GLOBAL_CAMPAIGN, REASON_SENT
+from notifications import start_delivery_tracking, format_delivery_report
+from template_renderer import compile_template, find_placeholders
 
-# Словарь для хранения данных рассылки каждого пользователя
-broadcast_data = {}
+# Данные рассылки каждого пользователя
+broadcast_data = StateStore('broadcast_data')
 
-def register_broadcast_handlers(bot):
+# ID заданий рассылки, выполняющихся сейчас (чтобы не запустить одно задание дважды)
+_running_jobs = set()
+_running_jobs_lock = threading.Lock()
+
+# Через сколько секунд приостановленная рассылка снова проверяет инстансы
+PAUSED_JOB_CHECK_INTERVAL = 60
+
+# Сколько последних рассылок показывает команда /stats
+STATS_JOBS_LIMIT = 5
+
+def register_broadcast_handlers(bot, router):
     """
     Регистрирует обработчики для создания и управления рассылками.
     
     Аргументы:
         bot (telebot.TeleBot): Экземпляр бота Telegram.
+        router (StateRouter): Маршрутизатор обработчиков по состояниям пользователя.
     """
     # Импортируем get_user_state и set_user_state из main_menu_handlers
     from handlers.main_menu_handlers import get_user_state, set_user_state
     
+    # Управление списками отказавшихся от рассылок:
+    # /optout 79001234567 89007654321 - исключить номера из всех рассылок, /optin ... - вернуть;
+    # /optout #12 79001234567 - исключить номера только из кампании рассылки #12
+    # (рассылок с тем же текстом и файлом), /optin #12 ... - вернуть в нее
+    @bot.message_handler(commands=['optout', 'optin'])
+    def handle_optout(message):
+        chat_id = message.chat.id
+        command = message.text.split()[0].lstrip('/').split('@')[0]
+        args = [value for value in re.split(r'[\s,;]+', message.text)[1:] if value]
+        
+        campaign = GLOBAL_CAMPAIGN
+        scope = "всех рассылок"
+        if args and args[0].startswith('#'):
+            job_id = args.pop(0).lstrip('#')
+            job = get_job_store().get_job(int(job_id)) if job_id.isdigit() else None
+            if not job or job['chat_id'] != chat_id:
+                bot.send_message(chat_id, f"❌ Рассылка #{job_id} не найдена.")
+                return
+            campaign = campaign_key(job['message'], job['media'])
+            scope = f"рассылки #{job['id']} (и рассылок с тем же текстом и файлом)"
+        
+        phone_numbers = {normalize_phone_number(value) for value in args}
+        phone_numbers.discard(None)
+        
+        index = get_suppression_index()
+        if not phone_numbers:
+            bot.send_message(
+                chat_id,
+                f"Укажите номера через пробел, например: /{command} 79001234567\n"
+                f"Чтобы изменить список только одной рассылки, укажите ее номер: /{command} #12 79001234567\n"
+                f"Номеров в списке отказавшихся от всех рассылок: {index.count()}"
+            )
+            return
+        
+        if command == 'optout':
+            changed = index.add(phone_numbers, campaign)
+            bot.send_message(chat_id, f"🚫 Исключено из {scope}: {changed}")
+        else:
+            changed = index.remove(phone_numbers, campaign)
+            bot.send_message(chat_id, f"✅ Возвращено в список получателей {scope}: {changed}")
+    
+    # Статистика доставки: /stats - последние рассылки пользователя, /stats <номер> - одна рассылка
+    @bot.message_handler(commands=['stats'])
+    def handle_stats(message):
+        chat_id = message.chat.id
+        store = get_job_store()
+        args = message.text.split()[1:]
+        
+        if args:
+            job = store.get_job(int(args[0].lstrip('#'))) if args[0].lstrip('#').isdigit() else None
+            jobs = [job] if job and job['chat_id'] == chat_id else []
+            if not jobs:
+                bot.send_message(chat_id, f"❌ Рассылка {args[0]} не найдена.")
+                return
+        else:
+            jobs = store.recent_jobs(chat_id, STATS_JOBS_LIMIT)
+            if not jobs:
+                bot.send_message(chat_id, "Вы еще не запускали рассылок.")
+                return
+        
+        report = "\n\n".join(
+            format_delivery_report(job, store.job_stats(job['id']), store.delivery_stats(job['id']))
+            for job in jobs
+        )
+        if not get_bot_settings()['deliveryTracking']:
+            report += ("\n\nℹ️ Статусы доставки не отслеживаются. Чтобы включить, задайте "
+                       "\"deliveryTracking\": true в config/bot.json. Внимание: бот будет забирать и удалять "
+                       "все уведомления инстанса Green API, включая входящие сообщения.")
+        bot.send_message(chat_id, report)
+    
     # Обработка файла с номерами телефонов
-    @bot.message_handler(content_types=['document'], 
-                         func=lambda message: get_user_state(message.chat.id) == 'broadcast')
+    @router.route('broadcast', content_types=['document'])
     def handle_document(message):
         chat_id = message.chat.id
-        file_info = bot.get_file(message.document.file_id)
         
         # Проверяем тип файла
         file_name = message.document.file_name
-        if not file_name.endswith(('.xls', '.xlsx')):
-            bot.send_message(chat_id, "❌ Пожалуйста, загрузите файл в формате Excel (.xls или .xlsx)")
+        if not file_name.lower().endswith(('.xls', '.xlsx', '.csv')):
+            bot.send_message(chat_id, "❌ Пожалуйста, загрузите файл в формате Excel (.xls или .xlsx) или CSV")
             return
         
-        # Загружаем файл
-        downloaded_file = bot.download_file(file_info.file_path)
-        file_path = f"temp_{chat_id}.xlsx"
+        # Загрузка и проверка файла выполняются в фоне, чтобы не задерживать других пользователей
+        set_user_state(chat_id, 'broadcast_processing')
+        progress = ProgressMessage(bot, chat_id, "⏳ Загружаем файл...")
+        run_in_background(process_phone_file, message.document.file_id, file_name, progress)
+    
+    def process_phone_file(file_id, file_name, progress):
+        chat_id = progress.chat_id
         
-        with open(file_path, 'wb') as new_file:
-            new_file.write(downloaded_file)
+        # Загружаем файл. Имя уникально для каждой загрузки, чтобы новая рассылка
+        # не перезаписала файл, который еще читает запущенная
+        extension = os.path.splitext(file_name)[1].lower()
+        file_path = f"temp_{chat_id}_{uuid.uuid4().hex}{extension}"
         
         try:
-            # Считываем номера из файла
-            phone_numbers = read_excel_numbers(file_path)
+            download_telegram_file(
+                bot, file_id, file_path,
+                on_progress=lambda size, total: progress.update(format_download_progress(size, total))
+            )
             
-            # Если файл пустой или нет номеров
-            if not phone_numbers:
-                bot.send_message(chat_id, "❌ В файле не найдены номера телефонов.")
+            # Проверяем и нормализуем номера потоковым чтением - сам список в памяти
+            # не хранится, при рассылке номера снова читаются из файла
+            progress.update("⏳ Проверяем номера...", force=True)
+            phone_stats = scan_phone_numbers(
+                file_path,
+                on_progress=lambda stats: progress.update(f"⏳ Проверяем номера... найдено корректных: {stats['valid']}")
+            )
+            phone_count = phone_stats['valid'] if phone_stats else 0
+            
+            # Пока файл обрабатывался, пользователь мог выйти из создания рассылки
+            if get_user_state(chat_id) != 'broadcast_processing':
+                progress.done("Обработка файла отменена.")
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                return
+            
+            # Если файл пустой или нет корректных номеров
+            if not phone_count:
+                progress.done("❌ В файле не найдены корректные номера телефонов.")
+                set_user_state(chat_id, 'broadcast')
                 # Удаляем временный файл
                 if os.path.exists(file_path):
                     os.remove(file_path)
                 return
             
+            # Столбцы из строки заголовков можно подставлять в текст рассылки
+            columns = read_columns(file_path)
+            
             # Сохраняем данные о рассылке
             broadcast_data[chat_id] = {
-                'phone_numbers': phone_numbers,
-                'file_path': file_path
+                'phone_count': phone_count,
+                'file_path': file_path,
+                'columns': columns
             }
             
             # Информируем пользователя
-            bot.send_message(
-                chat_id, 
-                f"✅ Файл успешно получен.\nОбнаружено {len(phone_numbers)} номеров.\n\nВыберите тип сообщения:",
-                reply_markup=get_message_type_keyboard()
+            progress.done(
+                f"✅ Файл успешно получен.\n"
+                f"Обнаружено {phone_stats['valid'] + phone_stats['invalid'] + phone_stats['duplicates']} номеров.\n\n"
+                f"✅ Корректных: {phone_stats['valid']}\n"
+                f"⚠️ Некорректных (пропущены): {phone_stats['invalid']}\n"
+                f"🔁 Дубликатов (пропущены): {phone_stats['duplicates']}"
+                f"{format_fields_hint(columns)}"
             )
+            bot.send_message(chat_id, "Выберите тип сообщения:", reply_markup=get_message_type_keyboard())
             
             # Устанавливаем следующее состояние
             set_user_state(chat_id, 'broadcast_select_type')
             
         except Exception as e:
-            bot.send_message(chat_id, f"❌ Ошибка при чтении файла: {str(e)}")
+            progress.done(f"❌ Ошибка при чтении файла: {str(e)}")
+            if get_user_state(chat_id) == 'broadcast_processing':
+                set_user_state(chat_id, 'broadcast')
             # Удаляем временный файл в случае ошибки
             if os.path.exists(file_path):
                 os.remove(file_path)
     
+    # Обработчик сообщений, пока файл обрабатывается
+    @router.route('broadcast_processing', content_types=['text', 'document', 'photo', 'video', 'audio'])
+    def handle_processing(message):
+        bot.send_message(message.chat.id, "⏳ Файл еще обрабатывается, подождите. Для выхода в главное меню отправьте /menu.")
+    
     # Обработчик отмены при ожидании файла
-    @bot.message_handler(func=lambda message: message.text == '🔙 Назад' and 
-                         get_user_state(message.chat.id) == 'broadcast')
+    @router.route('broadcast', text='🔙 Назад')
     def cancel_broadcast_file_upload(message):
         chat_id = message.chat.id
         set_user_state(chat_id, 'main_menu')
@@ -104,7 +239,7 @@ def register_broadcast_handlers(bot):
                          reply_markup=get_main_menu_keyboard())
     
     # Обработчик выбора типа сообщения
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'broadcast_select_type')
+    @router.route('broadcast_select_type')
     def handle_message_type_selection(message):
         chat_id = message.chat.id
         
@@ -113,7 +248,7 @@ def register_broadcast_handlers(bot):
             broadcast_data[chat_id]['message_type'] = 'text'
             bot.send_message(
                 chat_id, 
-                "Введите текстовое сообщение для рассылки:",
+                "Введите текстовое сообщение для рассылки:" + format_fields_hint(broadcast_data[chat_id].get('columns')),
                 reply_markup=get_cancel_keyboard()
             )
             
@@ -122,25 +257,22 @@ def register_broadcast_handlers(bot):
             broadcast_data[chat_id]['message_type'] = 'text_with_file'
             bot.send_message(
                 chat_id, 
-                "Введите текстовое сообщение для рассылки:",
+                "Введите текстовое сообщение для рассылки:" + format_fields_hint(broadcast_data[chat_id].get('columns')),
                 reply_markup=get_cancel_keyboard()
             )
             
         elif message.text == '🧾 Использовать шаблон':
             # Загружаем шаблоны
-            templates_path = os.path.join('config', 'templates.json')
-            templates_config = load_config(templates_path)
-            
-            if templates_config and 'templates' in templates_config and templates_config['templates']:
+            if get_template_repository().count():
                 set_user_state(chat_id, 'broadcast_select_template')
                 broadcast_data[chat_id]['message_type'] = 'template'
-                broadcast_data[chat_id]['templates'] = templates_config['templates']
                 
                 bot.send_message(
                     chat_id, 
                     "Выберите шаблон сообщения:",
-                    reply_markup=get_template_selection_keyboard(templates_config['templates'])
+                    reply_markup=get_template_selection_keyboard()
                 )
+                send_template_selection_page(bot, chat_id)
             else:
                 bot.send_message(
                     chat_id, 
@@ -171,7 +303,7 @@ def register_broadcast_handlers(bot):
             )
     
     # Обработчик ввода текстового сообщения
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'broadcast_text_message')
+    @router.route('broadcast_text_message')
     def handle_text_message(message):
         chat_id = message.chat.id
         
@@ -191,7 +323,7 @@ def register_broadcast_handlers(bot):
         show_broadcast_info(bot, chat_id)
     
     # Обработчик ввода текстового сообщения с файлом (первый шаг - текст)
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'broadcast_text_message_with_file')
+    @router.route('broadcast_text_message_with_file')
     def handle_text_message_with_file_step1(message):
         chat_id = message.chat.id
         
@@ -215,55 +347,59 @@ def register_broadcast_handlers(bot):
             reply_markup=get_cancel_keyboard()
         )
     
+    def receive_media_in_background(chat_id, file_id, file_name, on_saved, return_state):
+        # Скачивание файла выполняется в фоне, пока пользователь в состоянии 'broadcast_processing'
+        set_user_state(chat_id, 'broadcast_processing')
+        progress = ProgressMessage(bot, chat_id, "⏳ Загружаем файл...")
+        run_in_background(download_broadcast_media, file_id, file_name, progress, on_saved, return_state)
+    
+    def download_broadcast_media(file_id, file_name, progress, on_saved, return_state):
+        chat_id = progress.chat_id
+        try:
+            # Файл сохраняется в хранилище по хэшу содержимого: одинаковые файлы хранятся один раз
+            saved = save_telegram_media(
+                bot, file_id, file_name,
+                on_progress=lambda size, total: progress.update(format_download_progress(size, total))
+            )
+        except Exception as e:
+            progress.done(f"❌ Ошибка при загрузке файла: {str(e)}")
+            if get_user_state(chat_id) == 'broadcast_processing':
+                set_user_state(chat_id, return_state)
+            return
+        
+        # Пока файл загружался, пользователь мог выйти из раздела
+        if get_user_state(chat_id) != 'broadcast_processing':
+            progress.done("Загрузка файла отменена.")
+            return
+        
+        progress.done(f"✅ Файл загружен: {file_name}")
+        on_saved(saved['path'], saved['sha256'])
+    
     # Обработчик загрузки файла для рассылки
-    @bot.message_handler(content_types=['document', 'photo', 'video', 'audio'],
-                        func=lambda message: get_user_state(message.chat.id) == 'broadcast_upload_file')
+    @router.route('broadcast_upload_file', content_types=['document', 'photo', 'video', 'audio'])
     def handle_file_upload(message):
         chat_id = message.chat.id
         
         # Определяем тип медиа и получаем file_id
-        if message.content_type == 'document':
-            file_id = message.document.file_id
-            file_name = message.document.file_name
-            file_type = 'document'
-        elif message.content_type == 'photo':
-            file_id = message.photo[-1].file_id  # Берем фото максимального размера
-            file_name = f"photo_{file_id}.jpg"
-            file_type = 'photo'
-        elif message.content_type == 'video':
-            file_id = message.video.file_id
-            file_name = message.video.file_name if message.video.file_name else f"video_{file_id}.mp4"
-            file_type = 'video'
-        elif message.content_type == 'audio':
-            file_id = message.audio.file_id
-            file_name = message.audio.file_name if message.audio.file_name else f"audio_{file_id}.mp3"
-            file_type = 'audio'
-        
-        # Скачиваем файл
-        file_info = bot.get_file(file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
-        
-        # Создаем папку files, если её нет
-        os.makedirs('files', exist_ok=True)
-        
-        # Сохраняем файл
-        media_path = os.path.join('files', file_name)
-        with open(media_path, 'wb') as media_file:
-            media_file.write(downloaded_file)
-        
-        # Сохраняем информацию о файле
-        broadcast_data[chat_id]['media'] = {
-            'path': media_path,
-            'type': file_type,
-            'name': file_name
-        }
+        file_id, file_name, file_type = get_message_file(message)
         
-        # Показываем информацию о рассылке
-        show_broadcast_info(bot, chat_id)
+        # Файл загружается в фоне; остальное выполняется после загрузки
+        def on_saved(file_path, file_hash):
+            # Сохраняем информацию о файле
+            broadcast_data[chat_id]['media'] = {
+                'path': file_path,
+                'type': file_type,
+                'name': file_name,
+                'hash': file_hash
+            }
+        
+            # Показываем информацию о рассылке
+            show_broadcast_info(bot, chat_id)
+        
+        receive_media_in_background(chat_id, file_id, file_name, on_saved, 'broadcast_upload_file')
     
     # Обработчик текстовых сообщений во время загрузки файла
-    @bot.message_handler(func=lambda message: message.text == '❌ Отменить' and
-                         get_user_state(message.chat.id) == 'broadcast_upload_file')
+    @router.route('broadcast_upload_file', text='❌ Отменить')
     def cancel_file_upload(message):
         chat_id = message.chat.id
         set_user_state(chat_id, 'broadcast_text_message_with_file')
@@ -274,7 +410,7 @@ def register_broadcast_handlers(bot):
         )
     
     # Обработчик выбора шаблона
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'broadcast_select_template')
+    @router.route('broadcast_select_template')
     def handle_template_selection(message):
         chat_id = message.chat.id
         
@@ -287,21 +423,44 @@ def register_broadcast_handlers(bot):
             )
             return
         
-        # Поиск выбранного шаблона
-        selected_template = None
-        for template in broadcast_data[chat_id].get('templates', []):
-            if template['name'] == message.text:
-                selected_template = template
-                break
+        # Поиск шаблона по названию, если его ввели вручную
+        selected_template = get_template_repository().find_by_name(message.text)
         
         if not selected_template:
             bot.send_message(
                 chat_id, 
                 "❌ Шаблон не найден. Пожалуйста, выберите шаблон из списка.",
-                reply_markup=get_template_selection_keyboard(broadcast_data[chat_id].get('templates', []))
+                reply_markup=get_template_selection_keyboard()
             )
+            send_template_selection_page(bot, chat_id)
             return
         
+        apply_template(chat_id, selected_template)
+    
+    # Обработчик inline-кнопок постраничного списка шаблонов
+    @bot.callback_query_handler(func=lambda call: call.message is not None
+                                and get_user_state(call.message.chat.id) == 'broadcast_select_template')
+    def handle_template_selection_callback(call):
+        chat_id = call.message.chat.id
+        
+        if call.data.startswith('template_page_'):
+            # Переход на другую страницу: сообщение со списком редактируется на месте
+            page = call.data[len('template_page_'):]
+            bot.answer_callback_query(call.id)
+            send_template_selection_page(bot, chat_id, int(page) if page.isdigit() else 1, call.message.message_id)
+            
+        elif call.data.startswith('template_select_'):
+            selected_template = get_template_repository().get(call.data[len('template_select_'):])
+            if selected_template:
+                bot.answer_callback_query(call.id)
+                apply_template(chat_id, selected_template)
+            else:
+                bot.answer_callback_query(call.id, "❌ Шаблон не найден")
+                
+        else:
+            bot.answer_callback_query(call.id)
+    
+    def apply_template(chat_id, selected_template):
         # Сохраняем информацию о выбранном шаблоне
         broadcast_data[chat_id]['template'] = selected_template
         broadcast_data[chat_id]['message'] = selected_template['text']
@@ -310,8 +469,10 @@ def register_broadcast_handlers(bot):
         if selected_template.get('hasFile') and selected_template.get('filePath'):
             file_path = selected_template['filePath']
             if os.path.exists(file_path):
-                # Получаем информацию о файле
-                file_name = os.path.basename(file_path)
+                # Получаем информацию о файле; файл в хранилище назван по хэшу,
+                # поэтому исходное имя берется из индекса хранилища
+                media_entry = get_media_store().get(selected_template['fileHash']) if selected_template.get('fileHash') else None
+                file_name = media_entry['name'] if media_entry else os.path.basename(file_path)
                 file_extension = os.path.splitext(file_name)[1].lower()
                 
                 # Определяем тип файла
@@ -328,7 +489,8 @@ def register_broadcast_handlers(bot):
                 broadcast_data[chat_id]['media'] = {
                     'path': file_path,
                     'type': file_type,
-                    'name': file_name
+                    'name': file_name,
+                    'hash': selected_template.get('fileHash')
                 }
             else:
                 bot.send_message(
@@ -340,13 +502,13 @@ def register_broadcast_handlers(bot):
         show_broadcast_info(bot, chat_id)
     
     # Обработчик подтверждения рассылки
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'broadcast_confirm')
+    @router.route('broadcast_confirm')
     def handle_broadcast_confirmation(message):
         chat_id = message.chat.id
         
         if message.text == '✅ Подтвердить':
             # Проверяем наличие необходимых данных
-            if not broadcast_data.get(chat_id, {}).get('phone_numbers'):
+            if not broadcast_data.get(chat_id, {}).get('phone_count'):
                 bot.send_message(
                     chat_id, 
                     "❌ Ошибка: список номеров телефонов не найден. Начните создание рассылки заново.",
@@ -399,6 +561,33 @@ def register_broadcast_handlers(bot):
                 reply_markup=get_confirm_keyboard()
             )
     
+def send_template_selection_page(bot, chat_id, page=1, message_id=None):
+    """
+    Показывает страницу шаблонов для рассылки с inline-кнопками выбора и пагинации.
+    
+    Аргументы:
+        bot (telebot.TeleBot): Экземпляр бота Telegram.
+        chat_id (int): ID чата пользователя.
+        page (int, optional): Номер страницы.
+        message_id (int, optional): ID сообщения со списком; если указан, сообщение
+                                    редактируется на месте вместо отправки нового.
+    """
+    templates = get_template_repository()
+    page_templates, page, total_pages = templates.page(page)
+    text = f"🧾 Шаблоны ({templates.count()}), страница {page}/{total_pages}:"
+    keyboard = get_pagination_keyboard(page, total_pages, page_templates)
+    
+    if message_id is None:
+        bot.send_message(chat_id, text, reply_markup=keyboard)
+        return
+    
+    try:
+        bot.edit_message_text(text, chat_id, message_id, reply_markup=keyboard)
+    except ApiTelegramException as e:
+        # Повторное нажатие на ту же страницу не меняет сообщение
+        if 'message is not modified' not in str(e):
+            raise
+
 def show_broadcast_info(bot, chat_id):
     """
     Отображает информацию о настроенной рассылке и запрашивает подтверждение.
@@ -420,9 +609,23 @@ def show_broadcast_info(bot, chat_id):
     
     # Формируем сообщение с информацией о рассылке
     info_text = "📬 *Информация о рассылке:*\n\n"
-    info_text += f"📱 Количество номеров: *{len(broadcast_data[chat_id]['phone_numbers'])}*\n\n"
+    info_text += f"📱 Количество номеров: *{broadcast_data[chat_id]['phone_count']}*\n\n"
     info_text += f"📝 Текст рассылки:\n```\n{broadcast_data[chat_id]['message']}\n```\n"
     
+    # Для текста с подстановками показываем, как он выглядит у первого получателя
+    placeholders = find_placeholders(broadcast_data[chat_id]['message'])
+    if placeholders:
+        columns = broadcast_data[chat_id].get('columns') or {}
+        missing = [name for name in placeholders if name not in columns]
+        if missing:
+            info_text += ("⚠️ В файле нет столбцов " + ", ".join(f"`{{{name}}}`" for name in missing) +
+                          ", эти фрагменты будут отправлены как есть.\n")
+        fields = {name: columns[name] for name in placeholders if name in columns}
+        first = next(iter_recipient_fields(broadcast_data[chat_id]['file_path'], fields), None) if fields else None
+        if first:
+            renderer = compile_template(broadcast_data[chat_id]['message'], tuple(first[1]))
+            info_text += f"👁️ Пример для {first[0]}:\n```\n{renderer.render(first[1])}\n```\n"
+    
     # Информация о прикрепленном файле
     if 'media' in broadcast_data[chat_id]:
         file_name = broadcast_data[chat_id]['media']['name']
@@ -441,113 +644,278 @@ def show_broadcast_info(bot, chat_id):
     # Устанавливаем состояние ожидания подтверждения
     set_user_state(chat_id, 'broadcast_confirm')
 
+def format_fields_hint(columns):
+    """
+    Возвращает подсказку о подстановках, доступных по столбцам файла с номерами.
+    
+    Аргументы:
+        columns (dict или None): Названия столбцов и их индексы (см. read_columns).
+    
+    Возвращает:
+        str: Текст подсказки или пустая строка, если столбцов нет.
+    """
+    if not columns:
+        return ""
+    return ("\n\n🧩 В тексте можно использовать подстановки из столбцов файла: " +
+            ", ".join(f"{{{name}}}" for name in columns))
+
+def job_media_ref(job_id):
+    """
+    Возвращает ссылку задания рассылки на медиафайл в хранилище.
+    """
+    return f"job:{job_id}"
+
 def start_broadcast(bot, chat_id, broadcast_info):
     """
-    Запускает процесс рассылки сообщений.
+    Запускает процесс рассылки сообщений: сохраняет рассылку как задание
+    в базе и выполняет его.
     
     Аргументы:
         bot (telebot.TeleBot): Экземпляр бота Telegram.
         chat_id (int): ID чата пользователя.
         broadcast_info (dict): Информация о рассылке.
     """
-    # Загружаем конфигурации
-    profile_config = load_config(os.path.join('config', 'profile.json'))
-    interval_config = load_config(os.path.join('config', 'interval.json'))
+    # Сохраняем задание и получателей в базе, чтобы рассылку можно было продолжить после перезапуска.
+    # Номера, отказавшиеся от рассылок или уже получившие эту же рассылку, отбрасываются
+    # до записи, поэтому запросы к Green API для них не выполняются
+    store = get_job_store()
+    message = broadcast_info.get('message', '')
+    media = broadcast_info.get('media')
     
-    if not profile_config:
-        bot.send_message(chat_id, "❌ Ошибка: профиль не настроен.")
-        clear_broadcast_data(chat_id)
-        return
+    # Для текста с подстановками вместе с номером сохраняются значения нужных столбцов;
+    # подстановки, для которых в файле нет столбца, остаются в тексте как есть
+    columns = broadcast_info.get('columns') or {}
+    fields = {name: columns[name] for name in find_placeholders(message) if name in columns}
+    if fields:
+        recipients = iter_recipient_fields(broadcast_info['file_path'], fields)
+    else:
+        recipients = iter_phone_numbers(broadcast_info['file_path'])
     
-    # Получаем API-параметры
-    api_url = profile_config.get('apiUrl')
-    media_url = profile_config.get('mediaUrl')
-    id_instance = profile_config.get('idInstance')
-    api_token = profile_config.get('apiTokenInstance')
+    suppression_stats = {}
+    job_id = store.create_job(
+        chat_id,
+        message,
+        media,
+        get_suppression_index().filter(recipients, campaign_key(message, media), stats=suppression_stats)
+    )
     
-    if not all([api_url, id_instance, api_token]):
-        bot.send_message(chat_id, "❌ Ошибка: неполные данные профиля.")
-        clear_broadcast_data(chat_id)
-        return
+    # Задание держит ссылку на медиафайл, пока не завершится: файл не удалится,
+    # даже если удалить шаблон, из которого он взят
+    if media and media.get('hash'):
+        get_media_store().add_ref(media['hash'], job_media_ref(job_id))
     
-    # Получаем интервал между сообщениями
-    interval = interval_config.get('interval', 5) if interval_config else 5
+    # Номера сохранены в базе - данные рассылки и временный файл больше не нужны,
+    # если пользователь еще не начал новую рассылку
+    if broadcast_data.get(chat_id) is broadcast_info:
+        clear_broadcast_data(chat_id)
+    elif os.path.exists(broadcast_info['file_path']):
+        os.remove(broadcast_info['file_path'])
     
-    # Получаем список номеров и сообщение
-    phone_numbers = broadcast_info.get('phone_numbers', [])
-    message = broadcast_info.get('message', '')
+    if suppression_stats['suppressed']:
+        bot.send_message(
+            chat_id,
+            f"🚫 Исключено из рассылки: {suppression_stats['suppressed']} "
+            f"(отказались от рассылок или уже получили это сообщение)"
+        )
     
-    # Счетчики для статистики
-    total = len(phone_numbers)
-    success = 0
-    failed = 0
+    run_job(bot, job_id)
+
+def run_job(bot, job_id, resumed=False):
+    """
+    Выполняет (или продолжает) задание рассылки. Отправка идет только
+    получателям, которым сообщение еще не отправлялось; результаты фиксируются
+    в базе порциями.
     
-    # Отчет о начале рассылки
-    bot.send_message(chat_id, f"🚀 Начинаем рассылку для {total} получателей...")
+    Аргументы:
+        bot (telebot.TeleBot): Экземпляр бота Telegram.
+        job_id (int): ID задания.
+        resumed (bool, optional): Задание возобновлено после перезапуска.
+    """
+    with _running_jobs_lock:
+        if job_id in _running_jobs:
+            return
+        _running_jobs.add(job_id)
     
-    # Логика рассылки
-    for idx, phone in enumerate(phone_numbers):
-        try:
-            # Создаем chat_id для WhatsApp
-            whatsapp_chat_id = create_chat_id(phone)
-            
-            # Если есть медиа, отправляем сообщение с медиа
-            if 'media' in broadcast_info:
-                media_path = broadcast_info['media']['path']
-                if os.path.exists(media_path):
-                    response = send_file_by_upload(
-                        media_url, id_instance, api_token, 
-                        whatsapp_chat_id, media_path, 
-                        caption=message
-                    )
-                    if response and 'idMessage' in response:
-                        success += 1
-                    else:
-                        failed += 1
-                else:
-                    # Если медиа файл не найден, отправляем только текст
-                    response = send_message(api_url, id_instance, api_token, whatsapp_chat_id, message)
-                    if response and 'idMessage' in response:
-                        success += 1
-                    else:
-                        failed += 1
-            else:
-                # Отправляем только текстовое сообщение
-                response = send_message(api_url, id_instance, api_token, whatsapp_chat_id, message)
-                if response and 'idMessage' in response:
-                    success += 1
-                else:
-                    failed += 1
-            
-            # Периодически отправляем статус (каждые 10 сообщений)
-            if (idx + 1) % 10 == 0:
-                progress = round((idx + 1) / total * 100)
+    try:
+        store = get_job_store()
+        job = store.get_job(job_id)
+        if job is None or job['status'] == JOB_DONE:
+            return
+        chat_id = job['chat_id']
+        
+        # Загружаем конфигурации
+        profile_config = get_profile_config()
+        
+        if not profile_config:
+            bot.send_message(chat_id, "❌ Ошибка: профиль не настроен.")
+            return
+        
+        # Получаем API-параметры
+        api_url = profile_config.get('apiUrl')
+        id_instance = profile_config.get('idInstance')
+        api_token = profile_config.get('apiTokenInstance')
+        
+        if not all([api_url, id_instance, api_token]):
+            bot.send_message(chat_id, "❌ Ошибка: неполные данные профиля.")
+            return
+        
+        # Основной профиль и дополнительные инстансы из пула
+        profiles = get_instance_profiles(profile_config)
+        
+        # Перед рассылкой проверяем состояние инстансов: неавторизованный инстанс
+        # не получит ни одного номера
+        profiles, problems = preflight_check(profiles)
+        problems_text = "\n".join(f"• {name}: {problem}" for name, problem in problems)
+        if not profiles:
+            # Сообщаем только при первой неудачной проверке, повторные проверки идут молча
+            if job['status'] != JOB_PAUSED:
+                store.set_status(job_id, JOB_PAUSED)
                 bot.send_message(
-                    chat_id, 
-                    f"📊 Прогресс: {idx + 1}/{total} ({progress}%)\n"
-                    f"✅ Успешно: {success}\n"
-                    f"❌ Ошибки: {failed}"
+                    chat_id,
+                    f"⏸️ Рассылка #{job_id} приостановлена: ни один инстанс Green API не готов к отправке.\n\n"
+                    f"{problems_text}\n\n"
+                    f"Инстансы проверяются каждые {PAUSED_JOB_CHECK_INTERVAL} с, "
+                    f"рассылка продолжится автоматически."
                 )
-            
-            # Делаем паузу между отправками
-            time.sleep(interval)
-            
-        except Exception as e:
-            failed += 1
-            print(f"Ошибка при отправке на номер {phone}: {str(e)}")
+            schedule_job_check(bot, job_id)
+            return
+        if problems:
+            bot.send_message(chat_id, f"⚠️ Инстансы не готовы и не участвуют в рассылке:\n{problems_text}")
+        
+        # Статусы доставки отправленных сообщений приходят уведомлениями Green API
+        start_delivery_tracking(profiles)
+        
+        # Получаем скорость рассылки: интервал (может быть дробным) и размер пачки
+        interval, burst = get_interval_settings()
+        
+        remaining = store.job_stats(job_id)[RECIPIENT_PENDING]
+        
+        # Отчет о начале рассылки; это же сообщение затем показывает прогресс
+        if resumed:
+            start_text = (f"🔄 Возобновляем прерванную рассылку #{job_id}: "
+                          f"осталось {remaining} из {job['total']} получателей...")
+        else:
+            start_text = f"🚀 Начинаем рассылку для {remaining} получателей..."
+        progress = ProgressReporter(bot, chat_id, start_text)
+        
+        def report_progress(stats):
+            # Текст только запоминается: сообщение обновляет поток ProgressReporter
+            # не чаще раза в PROGRESS_REPORT_INTERVAL секунд
+            percent = round(stats.processed / stats.total * 100) if stats.total else 100
+            progress.report(
+                f"{start_text}\n\n"
+                f"📊 Прогресс: {stats.processed}/{stats.total} ({percent}%)\n"
+                f"✅ Успешно: {stats.success}\n"
+                f"❌ Ошибки: {stats.failed}"
+            )
+        
+        store.set_status(job_id, JOB_RUNNING)
+        checkpoint = JobCheckpoint(store, job_id)
+        
+        try:
+            # Рассылка выполняется асинхронным движком с несколькими запросами в работе
+            stats = run_broadcast(
+                profiles,
+                store.iter_pending(job_id, with_fields=bool(find_placeholders(job['message']))),
+                job['message'],
+                media=job['media'],
+                interval=interval,
+                burst=burst,
+                total=remaining,
+                on_progress=report_progress,
+                on_result=checkpoint.add
+            )
+        finally:
+            try:
+                # Фиксируем последнюю порцию результатов даже при сбое
+                checkpoint.flush()
+            finally:
+                progress.done()
+                # Получившие сообщение номера не получат эту же рассылку повторно,
+                # в том числе те, чьи результаты не удалось записать в базу
+                get_suppression_index().add(
+                    itertools.chain(
+                        store.iter_recipients(job_id, RECIPIENT_SENT),
+                        (phone for phone, status, _ in checkpoint.unsaved if status == RECIPIENT_SENT)
+                    ),
+                    campaign_key(job['message'], job['media']),
+                    REASON_SENT
+                )
+        
+        job_stats = store.job_stats(job_id)
+        
+        # Распределение отправок по инстансам
+        instances_text = ""
+        if len(profiles) > 1:
+            instances_text = "\n\n📡 По инстансам:\n" + "\n".join(
+                f"• {name}: {count}" for name, count in stats.per_instance.items()
+            )
+        if stats.failed_instances:
+            instances_text += "\n⚠️ Выведены из рассылки: " + ", ".join(stats.failed_instances)
+        
+        if job_stats[RECIPIENT_PENDING]:
+            # Все инстансы выведены из рассылки - оставшимся получателям отправим позже
+            store.set_status(job_id, JOB_PAUSED)
+            bot.send_message(
+                chat_id,
+                f"⏸️ Рассылка #{job_id} приостановлена: все инстансы Green API выведены из рассылки.\n\n"
+                f"✅ Успешно отправлено: {job_stats[RECIPIENT_SENT]}\n"
+                f"❌ Ошибок: {job_stats[RECIPIENT_FAILED]}\n"
+                f"⏳ Осталось: {job_stats[RECIPIENT_PENDING]}\n\n"
+                f"Инстансы проверяются каждые {PAUSED_JOB_CHECK_INTERVAL} с, "
+                f"рассылка продолжится автоматически."
+                f"{instances_text}"
+            )
+            schedule_job_check(bot, job_id)
+            return
+        
+        store.set_status(job_id, JOB_DONE)
+        if job['media'] and job['media'].get('hash'):
+            get_media_store().release(job['media']['hash'], job_media_ref(job_id))
+        
+        # Отчет о завершении рассылки
+        bot.send_message(
+            chat_id, 
+            f"✅ Рассылка завершена!\n\n"
+            f"📊 Итоговая статистика:\n"
+            f"📱 Всего номеров: {job['total']}\n"
+            f"✅ Успешно отправлено: {job_stats[RECIPIENT_SENT]}\n"
+            f"❌ Ошибок: {job_stats[RECIPIENT_FAILED]}"
+            f"{instances_text}"
+        )
+    finally:
+        with _running_jobs_lock:
+            _running_jobs.discard(job_id)
+
+def schedule_job_check(bot, job_id):
+    """
+    Планирует повторный запуск приостановленной рассылки через
+    PAUSED_JOB_CHECK_INTERVAL секунд. Запуск начинается с проверки инстансов:
+    если они все еще не готовы, рассылка снова откладывается.
     
-    # Отчет о завершении рассылки
-    bot.send_message(
-        chat_id, 
-        f"✅ Рассылка завершена!\n\n"
-        f"📊 Итоговая статистика:\n"
-        f"📱 Всего номеров: {total}\n"
-        f"✅ Успешно отправлено: {success}\n"
-        f"❌ Ошибок: {failed}"
-    )
+    Аргументы:
+        bot (telebot.TeleBot): Экземпляр бота Telegram.
+        job_id (int): ID задания.
+    """
+    timer = threading.Timer(PAUSED_JOB_CHECK_INTERVAL, run_job, args=(bot, job_id, True))
+    timer.daemon = True
+    timer.start()
+
+def resume_unfinished_jobs(bot):
+    """
+    Продолжает рассылки, прерванные перезапуском или сбоем бота.
+    Каждое задание выполняется в отдельном потоке. Задания, получатели
+    которых не успели записаться полностью, удаляются.
     
-    # Очищаем данные рассылки
-    clear_broadcast_data(chat_id)
+    Аргументы:
+        bot (telebot.TeleBot): Экземпляр бота Telegram.
+    """
+    store = get_job_store()
+    removed = store.delete_incomplete_jobs()
+    if removed:
+        logging.warning(f"Удалены рассылки с неполным списком получателей: {removed}")
+    for job_id in store.unfinished_jobs():
+        threading.Thread(target=run_job, args=(bot, job_id, True), daemon=True).start()
 
 def clear_broadcast_data(chat_id):
     """
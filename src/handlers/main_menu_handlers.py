@@ -7,16 +7,18 @@ from telebot import types
 from keyboards.main_menu_keyboard import get_main_menu_keyboard, get_settings_menu_keyboard
 from keyboards.broadcast_keyboards import get_message_type_keyboard
 from keyboards.template_keyboards import get_template_management_keyboard
+from state_store import StateStore
 
-# Словарь для хранения состояний пользователей
-user_states = {}
+# Состояния пользователей
+user_states = StateStore('user_states')
 
-def register_main_menu_handlers(bot):
+def register_main_menu_handlers(bot, router):
     """
     Регистрирует все обработчики команд главного меню.
     
     Аргументы:
         bot (telebot.TeleBot): Экземпляр бота Telegram.
+        router (StateRouter): Маршрутизатор обработчиков по состояниям пользователя.
     """
     # Обработчик команды /start
     @bot.message_handler(commands=['start'])
@@ -34,10 +36,7 @@ def register_main_menu_handlers(bot):
         bot.send_message(chat_id, welcome_text, reply_markup=get_main_menu_keyboard())
     
     # Обработчик для возврата в главное меню
-    @bot.message_handler(func=lambda message: message.text == '🔙 Назад' and 
-                         (user_states.get(message.chat.id) == 'settings' or 
-                          user_states.get(message.chat.id) == 'broadcast' or 
-                          user_states.get(message.chat.id) == 'templates'))
+    @router.route('settings', 'broadcast', 'templates', text='🔙 Назад')
     def back_to_main_menu(message):
         chat_id = message.chat.id
         user_states[chat_id] = 'main_menu'
@@ -46,7 +45,7 @@ def register_main_menu_handlers(bot):
                          reply_markup=get_main_menu_keyboard())
     
     # Обработчик выбора в главном меню
-    @bot.message_handler(func=lambda message: user_states.get(message.chat.id) == 'main_menu')
+    @router.route('main_menu')
     def main_menu_handler(message):
         chat_id = message.chat.id
         
@@ -80,7 +79,11 @@ def register_main_menu_handlers(bot):
         help_text = "📌 *Справка по использованию бота*\n\n" \
                    "*Основные команды:*\n" \
                    "/start - запуск бота и переход в главное меню\n" \
-                   "/help - показать эту справку\n\n" \
+                   "/help - показать эту справку\n" \
+                   "/optout <номера> - исключить номера из всех рассылок\n" \
+                   "/optout #<рассылка> <номера> - исключить номера из одной рассылки\n" \
+                   "/optin [#<рассылка>] <номера> - вернуть номера в рассылки\n" \
+                   "/stats [номер рассылки] - статистика доставки рассылок\n\n" \
                    "*Разделы бота:*\n" \
                    "• 📢 *Создать рассылку* - отправка сообщений по списку номеров\n" \
                    "• 📄 *Управление шаблонами* - создание и редактирование шаблонов сообщений\n" \
@@ -9,6 +9,7 @@ from keyboards.settings_keyboards import (
     get_profile_menu_keyboard,
     get_profile_edit_keyboard,
     get_interval_keyboard,
+    get_burst_keyboard,
     get_confirmation_keyboard,
     get_back_keyboard,
     get_cancel_keyboard,
@@ -17,24 +18,35 @@ from keyboards.settings_keyboards import (
 from keyboards.main_menu_keyboard import get_main_menu_keyboard
 
 # Импорт утилит и API
-from utils import load_config, save_config, is_valid_interval
-from api import get_instance_state
+from utils import (
+    update_config,
+    get_profile_config,
+    get_interval_settings,
+    get_instance_profiles,
+    parse_interval,
+    is_valid_burst,
+    PROFILE_CONFIG_PATH,
+    INTERVAL_CONFIG_PATH
+)
+from api import get_client_for_profile, close_client_for_profile, READY_INSTANCE_STATES
+from state_store import StateStore
 
-# Словарь для хранения временных данных настроек каждого пользователя
-settings_data = {}
+# Временные данные настроек каждого пользователя
+settings_data = StateStore('settings_data')
 
-def register_settings_handlers(bot):
+def register_settings_handlers(bot, router):
     """
     Регистрирует обработчики для раздела настроек.
     
     Аргументы:
         bot (telebot.TeleBot): Экземпляр бота Telegram.
+        router (StateRouter): Маршрутизатор обработчиков по состояниям пользователя.
     """
     # Импортируем get_user_state и set_user_state из main_menu_handlers
     from handlers.main_menu_handlers import get_user_state, set_user_state
     
     # Обработчик входа в меню настроек
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'settings')
+    @router.route('settings')
     def settings_menu_handler(message):
         chat_id = message.chat.id
         
@@ -50,14 +62,14 @@ def register_settings_handlers(bot):
             set_user_state(chat_id, 'settings_interval')
             
             # Загружаем текущее значение интервала
-            interval_config = load_config(os.path.join('config', 'interval.json'))
-            current_interval = interval_config.get('interval', 5) if interval_config else 5
+            current_interval, current_burst = get_interval_settings()
             
             bot.send_message(
                 chat_id, 
                 f"Настройка интервала между сообщениями при рассылке.\n\n"
-                f"Текущее значение: *{current_interval} секунд*\n\n"
-                f"Выберите новое значение или введите число от 1 до 60:",
+                f"Текущее значение: *{current_interval:g} секунд*, размер пачки: *{current_burst}*\n\n"
+                f"Выберите новое значение, введите число секунд (можно дробное, например 0.5) "
+                f"или лимит в формате `сообщений/секунд` (например, `30/60`):",
                 reply_markup=get_interval_keyboard(),
                 parse_mode='Markdown'
             )
@@ -80,7 +92,7 @@ def register_settings_handlers(bot):
     # === ОБРАБОТЧИКИ ДЛЯ РАЗДЕЛА ПРОФИЛЯ ===
     
     # Обработчик меню профиля
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'settings_profile')
+    @router.route('settings_profile')
     def profile_menu_handler(message):
         chat_id = message.chat.id
         
@@ -94,7 +106,7 @@ def register_settings_handlers(bot):
             
         elif message.text == '🔄 Проверить соединение':
             # Загружаем профиль
-            profile_config = load_config(os.path.join('config', 'profile.json'))
+            profile_config = get_profile_config()
             
             if not profile_config:
                 bot.send_message(
@@ -121,9 +133,9 @@ def register_settings_handlers(bot):
             bot.send_message(chat_id, "⏳ Проверка соединения с API...", reply_markup=types.ReplyKeyboardRemove())
             
             try:
-                response = get_instance_state(api_url, id_instance, api_token)
+                response = get_client_for_profile(profile_config).get_instance_state()
                 
-                if response and response.get('stateInstance') in ['authorized', 'online']:
+                if response and response.get('stateInstance') in READY_INSTANCE_STATES:
                     # Соединение успешно
                     success = True
                     bot.send_message(
@@ -175,7 +187,7 @@ def register_settings_handlers(bot):
             )
     
     # Обработчик результата проверки соединения
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'settings_connection_test_result')
+    @router.route('settings_connection_test_result')
     def connection_test_result_handler(message):
         chat_id = message.chat.id
         
@@ -194,7 +206,7 @@ def register_settings_handlers(bot):
             )
     
     # Обработчик меню редактирования профиля
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'settings_profile_edit')
+    @router.route('settings_profile_edit')
     def profile_edit_handler(message):
         chat_id = message.chat.id
         
@@ -211,7 +223,7 @@ def register_settings_handlers(bot):
             param_key = profile_params[message.text]
             
             # Загружаем текущий профиль
-            profile_config = load_config(os.path.join('config', 'profile.json'))
+            profile_config = get_profile_config()
             current_value = profile_config.get(param_key, '') if profile_config else ''
             
             # Сохраняем параметр для редактирования
@@ -246,7 +258,7 @@ def register_settings_handlers(bot):
             )
     
     # Обработчик ввода значения параметра профиля
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'settings_profile_edit_param')
+    @router.route('settings_profile_edit_param')
     def profile_param_input_handler(message):
         chat_id = message.chat.id
         
@@ -285,7 +297,7 @@ def register_settings_handlers(bot):
         set_user_state(chat_id, 'settings_profile_confirm')
     
     # Обработчик подтверждения изменения параметра профиля
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'settings_profile_confirm')
+    @router.route('settings_profile_confirm')
     def profile_confirm_handler(message):
         chat_id = message.chat.id
         
@@ -303,20 +315,19 @@ def register_settings_handlers(bot):
             param_name = settings_data[chat_id]['edit_parameter']
             new_value = settings_data[chat_id]['new_value']
             
-            # Загружаем текущий профиль
-            profile_path = os.path.join('config', 'profile.json')
-            profile_config = load_config(profile_path)
-            
-            if not profile_config:
-                profile_config = {}
-            
-            # Обновляем параметр
-            profile_config[param_name] = new_value
+            # Клиенты прежних параметров закрываются после сохранения
+            old_profiles = get_instance_profiles(get_profile_config() or {})
             
-            # Сохраняем обновленный профиль
-            success = save_config(profile_path, profile_config)
+            # Обновляем параметр в профиле, не затрагивая остальные
+            success = update_config(
+                PROFILE_CONFIG_PATH,
+                lambda profile_config: profile_config.update({param_name: new_value}),
+                default={}
+            )
             
             if success:
+                for profile in old_profiles:
+                    close_client_for_profile(profile)
                 bot.send_message(
                     chat_id, 
                     f"✅ Параметр *{param_name}* успешно обновлен.",
@@ -360,7 +371,7 @@ def register_settings_handlers(bot):
     # === ОБРАБОТЧИКИ ДЛЯ ИНТЕРВАЛА ===
     
     # Обработчик настройки интервала
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'settings_interval')
+    @router.route('settings_interval')
     def interval_handler(message):
         chat_id = message.chat.id
         
@@ -373,42 +384,97 @@ def register_settings_handlers(bot):
             )
             return
         
-        # Проверяем, является ли текст числом
-        if message.text.isdigit() or message.text in ['2', '5', '10', '15', '30', '60']:
-            interval = int(message.text)
+        if message.text == '📦 Размер пачки':
+            _, current_burst = get_interval_settings()
             
-            # Проверяем валидность интервала
-            if not is_valid_interval(interval):
-                bot.send_message(
-                    chat_id, 
-                    "❌ Недопустимый интервал. Пожалуйста, введите число от 1 до 60 секунд.",
-                    reply_markup=get_interval_keyboard()
-                )
-                return
-            
-            # Сохраняем новый интервал
-            interval_path = os.path.join('config', 'interval.json')
-            interval_config = {'interval': interval}
-            
-            success = save_config(interval_path, interval_config)
-            
-            if success:
-                bot.send_message(
-                    chat_id, 
-                    f"✅ Интервал между сообщениями успешно установлен на *{interval} секунд*.",
-                    parse_mode='Markdown',
-                    reply_markup=get_settings_menu_keyboard()
-                )
-                set_user_state(chat_id, 'settings')
-            else:
-                bot.send_message(
-                    chat_id, 
-                    "❌ Ошибка при сохранении интервала. Пожалуйста, попробуйте еще раз.",
-                    reply_markup=get_interval_keyboard()
-                )
+            set_user_state(chat_id, 'settings_burst')
+            bot.send_message(
+                chat_id, 
+                f"Размер пачки - сколько сообщений можно отправить подряд без паузы, "
+                f"после чего рассылка идет с заданной скоростью.\n\n"
+                f"Текущее значение: *{current_burst}*\n\n"
+                f"Выберите новое значение или введите число от 1 до 100:",
+                reply_markup=get_burst_keyboard(),
+                parse_mode='Markdown'
+            )
+            return
+        
+        # Разбираем интервал (дробные секунды или лимит "сообщений/секунд")
+        interval = parse_interval(message.text)
+        
+        if interval is None:
+            bot.send_message(
+                chat_id, 
+                "❌ Недопустимый интервал. Введите число секунд больше нуля (например, 0.5 или 5) "
+                "или лимит в формате сообщений/секунд (например, 30/60).",
+                reply_markup=get_interval_keyboard()
+            )
+            return
+        
+        # Сохраняем новый интервал, не затрагивая размер пачки
+        success = update_config(
+            INTERVAL_CONFIG_PATH,
+            lambda interval_config: interval_config.update(interval=interval),
+            default={}
+        )
+        
+        if success:
+            bot.send_message(
+                chat_id, 
+                f"✅ Интервал между сообщениями успешно установлен на *{interval:g} секунд*.",
+                parse_mode='Markdown',
+                reply_markup=get_settings_menu_keyboard()
+            )
+            set_user_state(chat_id, 'settings')
         else:
             bot.send_message(
                 chat_id, 
-                "❌ Пожалуйста, введите число от 1 до 60 или выберите один из предустановленных вариантов.",
+                "❌ Ошибка при сохранении интервала. Пожалуйста, попробуйте еще раз.",
+                reply_markup=get_interval_keyboard()
+            )
+    
+    # Обработчик настройки размера пачки
+    @router.route('settings_burst')
+    def burst_handler(message):
+        chat_id = message.chat.id
+        
+        if message.text == '🔙 Назад':
+            set_user_state(chat_id, 'settings_interval')
+            bot.send_message(
+                chat_id, 
+                "Выберите новое значение интервала:",
                 reply_markup=get_interval_keyboard()
-            )
\ No newline at end of file
+            )
+            return
+        
+        if not is_valid_burst(message.text):
+            bot.send_message(
+                chat_id, 
+                "❌ Пожалуйста, введите целое число от 1 до 100.",
+                reply_markup=get_burst_keyboard()
+            )
+            return
+        
+        burst = int(message.text)
+        
+        # Сохраняем размер пачки, не затрагивая интервал
+        success = update_config(
+            INTERVAL_CONFIG_PATH,
+            lambda interval_config: interval_config.update(burst=burst),
+            default={}
+        )
+        
+        if success:
+            bot.send_message(
+                chat_id, 
+                f"✅ Размер пачки успешно установлен на *{burst}*.",
+                parse_mode='Markdown',
+                reply_markup=get_settings_menu_keyboard()
+            )
+            set_user_state(chat_id, 'settings')
+        else:
+            bot.send_message(
+                chat_id, 
+                "❌ Ошибка при сохранении размера пачки. Пожалуйста, попробуйте еще раз.",
+                reply_markup=get_burst_keyboard()
+            )
@@ -1,13 +1,12 @@
 import json
-import uuid
 import telebot
 from telebot import types
+from telebot.apihelper import ApiTelegramException
 import os
 
 # Импорт клавиатур
 from keyboards.template_keyboards import (
     get_template_management_keyboard,
-    get_template_list_keyboard,
     get_template_actions_keyboard,
     get_template_edit_keyboard,
     get_file_management_keyboard,
@@ -19,42 +18,45 @@ from keyboards.template_keyboards import (
 from keyboards.main_menu_keyboard import get_main_menu_keyboard
 
 # Импорт утилит
-from utils import load_config, save_config, validate_file_path, get_file_extension
+from utils import validate_file_path, get_file_extension
+from template_repository import get_template_repository
+from background import run_in_background, ProgressMessage
+from downloads import get_message_file, format_download_progress
+from media_store import get_media_store, save_telegram_media
+from state_store import StateStore
 
-# Словарь для хранения временных данных шаблонов каждого пользователя
-template_data = {}
+# Временные данные шаблонов каждого пользователя
+template_data = StateStore('template_data')
 
-def register_template_handlers(bot):
+def register_template_handlers(bot, router):
     """
     Регистрирует обработчики для раздела управления шаблонами.
     
     Аргументы:
         bot (telebot.TeleBot): Экземпляр бота Telegram.
+        router (StateRouter): Маршрутизатор обработчиков по состояниям пользователя.
     """
     # Импортируем get_user_state и set_user_state из main_menu_handlers
     from handlers.main_menu_handlers import get_user_state, set_user_state
     
     # Обработчик главного меню управления шаблонами
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'templates')
+    @router.route('templates')
     def template_management_handler(message):
         chat_id = message.chat.id
         
         if message.text == '📋 Просмотреть шаблоны':
-            # Загружаем шаблоны
-            templates_config = load_config(os.path.join('config', 'templates.json'))
-            
-            if templates_config and 'templates' in templates_config and templates_config['templates']:
-                templates = templates_config['templates']
-                
-                # Сохраняем список шаблонов во временные данные
-                template_data[chat_id] = {'templates': templates}
+            # Проверяем наличие шаблонов
+            if get_template_repository().count():
+                # Сбрасываем временные данные предыдущего выбора
+                template_data[chat_id] = {}
                 
                 set_user_state(chat_id, 'templates_list')
                 bot.send_message(
                     chat_id, 
-                    f"Доступные шаблоны ({len(templates)}):\nВыберите шаблон для просмотра деталей:",
-                    reply_markup=get_template_list_keyboard(templates)
+                    "Выберите шаблон для просмотра деталей:",
+                    reply_markup=get_back_keyboard()
                 )
+                send_template_page(bot, chat_id)
             else:
                 bot.send_message(
                     chat_id, 
@@ -88,7 +90,7 @@ def register_template_handlers(bot):
             )
     
     # Обработчик списка шаблонов
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'templates_list')
+    @router.route('templates_list')
     def template_list_handler(message):
         chat_id = message.chat.id
         
@@ -101,33 +103,46 @@ def register_template_handlers(bot):
             )
             return
         
-        # Проверяем, выбран ли шаблон из списка
-        if chat_id not in template_data or 'templates' not in template_data[chat_id]:
-            bot.send_message(
-                chat_id, 
-                "❌ Ошибка: список шаблонов не найден. Пожалуйста, вернитесь в раздел управления шаблонами.",
-                reply_markup=get_template_management_keyboard()
-            )
-            set_user_state(chat_id, 'templates')
-            return
-        
-        # Ищем выбранный шаблон по имени
-        selected_template = None
-        for template in template_data[chat_id]['templates']:
-            if template['name'] == message.text:
-                selected_template = template
-                break
+        # Ищем шаблон по названию, если его ввели вручную
+        selected_template = get_template_repository().find_by_name(message.text)
         
         if not selected_template:
             bot.send_message(
                 chat_id, 
                 "❌ Шаблон не найден. Пожалуйста, выберите шаблон из списка.",
-                reply_markup=get_template_list_keyboard(template_data[chat_id]['templates'])
+                reply_markup=get_back_keyboard()
             )
+            send_template_page(bot, chat_id)
             return
         
+        open_template(chat_id, selected_template)
+    
+    # Обработчик inline-кнопок постраничного списка шаблонов
+    @bot.callback_query_handler(func=lambda call: call.message is not None
+                                and get_user_state(call.message.chat.id) == 'templates_list')
+    def template_list_callback_handler(call):
+        chat_id = call.message.chat.id
+        
+        if call.data.startswith('template_page_'):
+            # Переход на другую страницу: сообщение со списком редактируется на месте
+            page = call.data[len('template_page_'):]
+            bot.answer_callback_query(call.id)
+            send_template_page(bot, chat_id, int(page) if page.isdigit() else 1, call.message.message_id)
+            
+        elif call.data.startswith('template_select_'):
+            selected_template = get_template_repository().get(call.data[len('template_select_'):])
+            if selected_template:
+                bot.answer_callback_query(call.id)
+                open_template(chat_id, selected_template)
+            else:
+                bot.answer_callback_query(call.id, "❌ Шаблон не найден")
+                
+        else:
+            bot.answer_callback_query(call.id)
+    
+    def open_template(chat_id, selected_template):
         # Сохраняем выбранный шаблон
-        template_data[chat_id]['selected_template'] = selected_template
+        template_data.setdefault(chat_id, {})['selected_template'] = selected_template
         
         set_user_state(chat_id, 'templates_actions')
         bot.send_message(
@@ -138,7 +153,7 @@ def register_template_handlers(bot):
         )
     
     # Обработчик действий с шаблоном
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'templates_actions')
+    @router.route('templates_actions')
     def template_actions_handler(message):
         chat_id = message.chat.id
         
@@ -163,7 +178,7 @@ def register_template_handlers(bot):
             if selected_template.get('hasFile', False) and selected_template.get('filePath'):
                 file_path = selected_template['filePath']
                 file_exists = os.path.exists(file_path)
-                file_name = os.path.basename(file_path)
+                file_name = template_file_name(selected_template)
                 file_status = "✅ Доступен" if file_exists else "❌ Недоступен"
                 
                 template_info += f"📎 *Прикрепленный файл:*\n"
@@ -202,13 +217,14 @@ def register_template_handlers(bot):
             
         elif message.text == '🔙 Назад':
             # Возвращаемся к списку шаблонов
-            if chat_id in template_data and 'templates' in template_data[chat_id]:
+            if get_template_repository().count():
                 set_user_state(chat_id, 'templates_list')
                 bot.send_message(
                     chat_id, 
                     "Выберите шаблон:",
-                    reply_markup=get_template_list_keyboard(template_data[chat_id]['templates'])
+                    reply_markup=get_back_keyboard()
                 )
+                send_template_page(bot, chat_id)
             else:
                 set_user_state(chat_id, 'templates')
                 bot.send_message(
@@ -225,7 +241,7 @@ def register_template_handlers(bot):
             )
     
     # Обработчик подтверждения удаления шаблона
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'templates_delete_confirm')
+    @router.route('templates_delete_confirm')
     def template_delete_confirm_handler(message):
         chat_id = message.chat.id
         
@@ -242,26 +258,12 @@ def register_template_handlers(bot):
             
             selected_template = template_data[chat_id]['selected_template']
             
-            # Загружаем все шаблоны
-            templates_path = os.path.join('config', 'templates.json')
-            templates_config = load_config(templates_path)
-            
-            if not templates_config or 'templates' not in templates_config:
-                bot.send_message(
-                    chat_id, 
-                    "❌ Ошибка при загрузке шаблонов.",
-                    reply_markup=get_template_management_keyboard()
-                )
-                set_user_state(chat_id, 'templates')
-                return
-            
             # Удаляем выбранный шаблон
-            templates_config['templates'] = [t for t in templates_config['templates'] if t['id'] != selected_template['id']]
-            
-            # Сохраняем обновленный список шаблонов
-            success = save_config(templates_path, templates_config)
+            deleted_template = get_template_repository().delete(selected_template['id'])
             
-            if success:
+            if deleted_template:
+                # Файл шаблона удаляется из хранилища, если он больше нигде не используется
+                release_template_file(deleted_template)
                 bot.send_message(
                     chat_id, 
                     f"✅ Шаблон *{selected_template['name']}* успешно удален.",
@@ -304,7 +306,7 @@ def register_template_handlers(bot):
             )
     
     # Обработчик меню редактирования шаблона
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'templates_edit')
+    @router.route('templates_edit')
     def template_edit_handler(message):
         chat_id = message.chat.id
         
@@ -367,7 +369,7 @@ def register_template_handlers(bot):
             )
     
     # Обработчик редактирования названия шаблона
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'templates_edit_name')
+    @router.route('templates_edit_name')
     def template_edit_name_handler(message):
         chat_id = message.chat.id
         
@@ -405,31 +407,11 @@ def register_template_handlers(bot):
         selected_template = template_data[chat_id]['selected_template']
         new_name = message.text
         
-        # Загружаем все шаблоны
-        templates_path = os.path.join('config', 'templates.json')
-        templates_config = load_config(templates_path)
-        
-        if not templates_config or 'templates' not in templates_config:
-            bot.send_message(
-                chat_id, 
-                "❌ Ошибка при загрузке шаблонов.",
-                reply_markup=get_template_management_keyboard()
-            )
-            set_user_state(chat_id, 'templates')
-            return
-        
         # Обновляем название выбранного шаблона
-        for template in templates_config['templates']:
-            if template['id'] == selected_template['id']:
-                template['name'] = new_name
-                # Обновляем также в локальной копии
-                selected_template['name'] = new_name
-                break
-        
-        # Сохраняем обновленный список шаблонов
-        success = save_config(templates_path, templates_config)
-        
+        success = get_template_repository().update(selected_template['id'], name=new_name)
         if success:
+            # Обновляем также в локальной копии
+            selected_template.update(name=new_name)
             bot.send_message(
                 chat_id, 
                 f"✅ Название шаблона успешно изменено на *{new_name}*.",
@@ -446,7 +428,7 @@ def register_template_handlers(bot):
             set_user_state(chat_id, 'templates_edit')
     
     # Обработчик редактирования текста шаблона
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'templates_edit_text')
+    @router.route('templates_edit_text')
     def template_edit_text_handler(message):
         chat_id = message.chat.id
         
@@ -484,31 +466,11 @@ def register_template_handlers(bot):
         selected_template = template_data[chat_id]['selected_template']
         new_text = message.text
         
-        # Загружаем все шаблоны
-        templates_path = os.path.join('config', 'templates.json')
-        templates_config = load_config(templates_path)
-        
-        if not templates_config or 'templates' not in templates_config:
-            bot.send_message(
-                chat_id, 
-                "❌ Ошибка при загрузке шаблонов.",
-                reply_markup=get_template_management_keyboard()
-            )
-            set_user_state(chat_id, 'templates')
-            return
-        
         # Обновляем текст выбранного шаблона
-        for template in templates_config['templates']:
-            if template['id'] == selected_template['id']:
-                template['text'] = new_text
-                # Обновляем также в локальной копии
-                selected_template['text'] = new_text
-                break
-        
-        # Сохраняем обновленный список шаблонов
-        success = save_config(templates_path, templates_config)
-        
+        success = get_template_repository().update(selected_template['id'], text=new_text)
         if success:
+            # Обновляем также в локальной копии
+            selected_template.update(text=new_text)
             bot.send_message(
                 chat_id, 
                 "✅ Текст шаблона успешно обновлен.",
@@ -524,7 +486,7 @@ def register_template_handlers(bot):
             set_user_state(chat_id, 'templates_edit')
     
     # Обработчик управления файлом шаблона
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'templates_edit_file')
+    @router.route('templates_edit_file')
     def template_edit_file_handler(message):
         chat_id = message.chat.id
         
@@ -564,11 +526,11 @@ def register_template_handlers(bot):
                     elif file_ext in ['.mp3', '.ogg', '.wav']:
                         bot.send_audio(chat_id, file)
                     else:
-                        bot.send_document(chat_id, file)
+                        bot.send_document(chat_id, file, visible_file_name=template_file_name(selected_template))
                 
                 bot.send_message(
                     chat_id, 
-                    f"📄 Файл: {os.path.basename(file_path)}",
+                    f"📄 Файл: {template_file_name(selected_template)}",
                     reply_markup=get_file_management_keyboard(has_file)
                 )
             except Exception as e:
@@ -620,7 +582,7 @@ def register_template_handlers(bot):
             )
                          
     # Обработчик подтверждения удаления файла
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'templates_delete_file_confirm')
+    @router.route('templates_delete_file_confirm')
     def template_delete_file_confirm_handler(message):
         chat_id = message.chat.id
         
@@ -635,34 +597,13 @@ def register_template_handlers(bot):
                 set_user_state(chat_id, 'templates')
                 return
             
-            # Загружаем все шаблоны
-            templates_path = os.path.join('config', 'templates.json')
-            templates_config = load_config(templates_path)
-            
-            if not templates_config or 'templates' not in templates_config:
-                bot.send_message(
-                    chat_id, 
-                    "❌ Ошибка при загрузке шаблонов.",
-                    reply_markup=get_template_management_keyboard()
-                )
-                set_user_state(chat_id, 'templates')
-                return
-            
             # Обновляем данные шаблона (удаляем ссылку на файл)
             selected_template = template_data[chat_id]['selected_template']
-            for template in templates_config['templates']:
-                if template['id'] == selected_template['id']:
-                    template['hasFile'] = False
-                    template['filePath'] = None
-                    # Обновляем также в локальной копии
-                    selected_template['hasFile'] = False
-                    selected_template['filePath'] = None
-                    break
-            
-            # Сохраняем обновленный список шаблонов
-            success = save_config(templates_path, templates_config)
-            
+            success = get_template_repository().update(selected_template['id'], hasFile=False, filePath=None, fileHash=None)
             if success:
+                release_template_file(selected_template)
+                # Обновляем также в локальной копии
+                selected_template.update(hasFile=False, filePath=None, fileHash=None)
                 bot.send_message(
                     chat_id, 
                     "✅ Файл успешно удален из шаблона.",
@@ -702,9 +643,41 @@ def register_template_handlers(bot):
                 reply_markup=get_confirmation_keyboard()
             )
     
+    def receive_file_in_background(chat_id, file_id, file_name, on_saved, return_state):
+        # Скачивание файла выполняется в фоне, пока пользователь в состоянии 'templates_processing'
+        set_user_state(chat_id, 'templates_processing')
+        progress = ProgressMessage(bot, chat_id, "⏳ Загружаем файл...")
+        run_in_background(download_template_file, file_id, file_name, progress, on_saved, return_state)
+    
+    def download_template_file(file_id, file_name, progress, on_saved, return_state):
+        chat_id = progress.chat_id
+        try:
+            # Файл сохраняется в хранилище по хэшу содержимого: одинаковые файлы хранятся один раз
+            saved = save_telegram_media(
+                bot, file_id, file_name,
+                on_progress=lambda size, total: progress.update(format_download_progress(size, total))
+            )
+        except Exception as e:
+            progress.done(f"❌ Ошибка при загрузке файла: {str(e)}")
+            if get_user_state(chat_id) == 'templates_processing':
+                set_user_state(chat_id, return_state)
+            return
+        
+        # Пока файл загружался, пользователь мог выйти из раздела
+        if get_user_state(chat_id) != 'templates_processing':
+            progress.done("Загрузка файла отменена.")
+            return
+        
+        progress.done(f"✅ Файл загружен: {file_name}")
+        on_saved(saved['path'], saved['sha256'])
+    
+    # Обработчик сообщений, пока файл загружается
+    @router.route('templates_processing', content_types=['text', 'document', 'photo', 'video', 'audio'])
+    def template_processing_handler(message):
+        bot.send_message(message.chat.id, "⏳ Файл еще загружается, подождите. Для выхода в главное меню отправьте /menu.")
+    
     # Обработчик загрузки файла при добавлении к шаблону
-    @bot.message_handler(content_types=['document', 'photo', 'video', 'audio'],
-                        func=lambda message: get_user_state(message.chat.id) == 'templates_add_file')
+    @router.route('templates_add_file', content_types=['document', 'photo', 'video', 'audio'])
     def template_add_file_handler(message):
         chat_id = message.chat.id
         
@@ -719,80 +692,35 @@ def register_template_handlers(bot):
             return
         
         # Определяем тип медиа и получаем file_id
-        if message.content_type == 'document':
-            file_id = message.document.file_id
-            file_name = message.document.file_name
-            file_type = 'document'
-        elif message.content_type == 'photo':
-            file_id = message.photo[-1].file_id  # Берем фото максимального размера
-            file_name = f"photo_{file_id}.jpg"
-            file_type = 'photo'
-        elif message.content_type == 'video':
-            file_id = message.video.file_id
-            file_name = message.video.file_name if message.video.file_name else f"video_{file_id}.mp4"
-            file_type = 'video'
-        elif message.content_type == 'audio':
-            file_id = message.audio.file_id
-            file_name = message.audio.file_name if message.audio.file_name else f"audio_{file_id}.mp3"
-            file_type = 'audio'
-        
-        # Скачиваем файл
-        file_info = bot.get_file(file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
-        
-        # Создаем папку files, если её нет
-        os.makedirs('files', exist_ok=True)
-        
-        # Сохраняем файл
-        file_path = os.path.join('files', file_name)
-        with open(file_path, 'wb') as file:
-            file.write(downloaded_file)
-        
-        # Загружаем все шаблоны
-        templates_path = os.path.join('config', 'templates.json')
-        templates_config = load_config(templates_path)
+        file_id, file_name, file_type = get_message_file(message)
         
-        if not templates_config or 'templates' not in templates_config:
-            bot.send_message(
-                chat_id, 
-                "❌ Ошибка при загрузке шаблонов.",
-                reply_markup=get_template_management_keyboard()
-            )
-            set_user_state(chat_id, 'templates')
-            return
-        
-        # Обновляем данные шаблона (добавляем ссылку на файл)
-        selected_template = template_data[chat_id]['selected_template']
-        for template in templates_config['templates']:
-            if template['id'] == selected_template['id']:
-                template['hasFile'] = True
-                template['filePath'] = file_path
+        # Файл загружается в фоне; остальное выполняется после загрузки
+        def on_saved(file_path, file_hash):
+            # Обновляем данные шаблона (добавляем ссылку на файл)
+            selected_template = template_data[chat_id]['selected_template']
+            success = get_template_repository().update(selected_template['id'], hasFile=True, filePath=file_path, fileHash=file_hash)
+            if success:
+                get_media_store().add_ref(file_hash, template_file_ref(selected_template['id']))
                 # Обновляем также в локальной копии
-                selected_template['hasFile'] = True
-                selected_template['filePath'] = file_path
-                break
-        
-        # Сохраняем обновленный список шаблонов
-        success = save_config(templates_path, templates_config)
+                selected_template.update(hasFile=True, filePath=file_path, fileHash=file_hash)
+                bot.send_message(
+                    chat_id, 
+                    f"✅ Файл успешно добавлен к шаблону: {file_name}",
+                    reply_markup=get_file_management_keyboard(True)
+                )
+                set_user_state(chat_id, 'templates_edit_file')
+            else:
+                bot.send_message(
+                    chat_id, 
+                    "❌ Ошибка при добавлении файла к шаблону.",
+                    reply_markup=get_file_management_keyboard(False)
+                )
+                set_user_state(chat_id, 'templates_edit_file')
         
-        if success:
-            bot.send_message(
-                chat_id, 
-                f"✅ Файл успешно добавлен к шаблону: {file_name}",
-                reply_markup=get_file_management_keyboard(True)
-            )
-            set_user_state(chat_id, 'templates_edit_file')
-        else:
-            bot.send_message(
-                chat_id, 
-                "❌ Ошибка при добавлении файла к шаблону.",
-                reply_markup=get_file_management_keyboard(False)
-            )
-            set_user_state(chat_id, 'templates_edit_file')
+        receive_file_in_background(chat_id, file_id, file_name, on_saved, 'templates_add_file')
     
     # Обработчик загрузки файла при замене существующего
-    @bot.message_handler(content_types=['document', 'photo', 'video', 'audio'],
-                        func=lambda message: get_user_state(message.chat.id) == 'templates_replace_file')
+    @router.route('templates_replace_file', content_types=['document', 'photo', 'video', 'audio'])
     def template_replace_file_handler(message):
         chat_id = message.chat.id
         
@@ -807,79 +735,37 @@ def register_template_handlers(bot):
             return
         
         # Определяем тип медиа и получаем file_id
-        if message.content_type == 'document':
-            file_id = message.document.file_id
-            file_name = message.document.file_name
-            file_type = 'document'
-        elif message.content_type == 'photo':
-            file_id = message.photo[-1].file_id  # Берем фото максимального размера
-            file_name = f"photo_{file_id}.jpg"
-            file_type = 'photo'
-        elif message.content_type == 'video':
-            file_id = message.video.file_id
-            file_name = message.video.file_name if message.video.file_name else f"video_{file_id}.mp4"
-            file_type = 'video'
-        elif message.content_type == 'audio':
-            file_id = message.audio.file_id
-            file_name = message.audio.file_name if message.audio.file_name else f"audio_{file_id}.mp3"
-            file_type = 'audio'
-        
-        # Скачиваем файл
-        file_info = bot.get_file(file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
-        
-        # Создаем папку files, если её нет
-        os.makedirs('files', exist_ok=True)
+        file_id, file_name, file_type = get_message_file(message)
         
-        # Сохраняем файл
-        file_path = os.path.join('files', file_name)
-        with open(file_path, 'wb') as file:
-            file.write(downloaded_file)
-        
-        # Загружаем все шаблоны
-        templates_path = os.path.join('config', 'templates.json')
-        templates_config = load_config(templates_path)
-        
-        if not templates_config or 'templates' not in templates_config:
-            bot.send_message(
-                chat_id, 
-                "❌ Ошибка при загрузке шаблонов.",
-                reply_markup=get_template_management_keyboard()
-            )
-            set_user_state(chat_id, 'templates')
-            return
-        
-        # Обновляем данные шаблона (меняем путь к файлу)
-        selected_template = template_data[chat_id]['selected_template']
-        for template in templates_config['templates']:
-            if template['id'] == selected_template['id']:
-                template['filePath'] = file_path
+        # Файл загружается в фоне; остальное выполняется после загрузки
+        def on_saved(file_path, file_hash):
+            # Обновляем данные шаблона (меняем путь к файлу)
+            selected_template = template_data[chat_id]['selected_template']
+            success = get_template_repository().update(selected_template['id'], filePath=file_path, fileHash=file_hash)
+            if success:
+                get_media_store().add_ref(file_hash, template_file_ref(selected_template['id']))
+                if selected_template.get('fileHash') != file_hash:
+                    release_template_file(selected_template)
                 # Обновляем также в локальной копии
-                selected_template['filePath'] = file_path
-                break
-        
-        # Сохраняем обновленный список шаблонов
-        success = save_config(templates_path, templates_config)
+                selected_template.update(filePath=file_path, fileHash=file_hash)
+                bot.send_message(
+                    chat_id, 
+                    f"✅ Файл успешно заменен на: {file_name}",
+                    reply_markup=get_file_management_keyboard(True)
+                )
+                set_user_state(chat_id, 'templates_edit_file')
+            else:
+                bot.send_message(
+                    chat_id, 
+                    "❌ Ошибка при замене файла.",
+                    reply_markup=get_file_management_keyboard(True)
+                )
+                set_user_state(chat_id, 'templates_edit_file')
         
-        if success:
-            bot.send_message(
-                chat_id, 
-                f"✅ Файл успешно заменен на: {file_name}",
-                reply_markup=get_file_management_keyboard(True)
-            )
-            set_user_state(chat_id, 'templates_edit_file')
-        else:
-            bot.send_message(
-                chat_id, 
-                "❌ Ошибка при замене файла.",
-                reply_markup=get_file_management_keyboard(True)
-            )
-            set_user_state(chat_id, 'templates_edit_file')
-
+        receive_file_in_background(chat_id, file_id, file_name, on_saved, 'templates_replace_file')
+    
     # Обработчик отмены загрузки файла
-    @bot.message_handler(func=lambda message: message.text == '❌ Отменить' and
-                         (get_user_state(message.chat.id) == 'templates_add_file' or
-                          get_user_state(message.chat.id) == 'templates_replace_file'))
+    @router.route('templates_add_file', 'templates_replace_file', text='❌ Отменить')
     def cancel_file_upload_handler(message):
         chat_id = message.chat.id
         
@@ -904,7 +790,7 @@ def register_template_handlers(bot):
     # Обработчики для создания нового шаблона
     
     # Обработчик ввода имени нового шаблона
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'templates_create_name')
+    @router.route('templates_create_name')
     def template_create_name_handler(message):
         chat_id = message.chat.id
         
@@ -933,12 +819,14 @@ def register_template_handlers(bot):
         set_user_state(chat_id, 'templates_create_text')
         bot.send_message(
             chat_id, 
-            "Введите текст шаблона:",
+            "Введите текст шаблона.\n\n"
+            "🧩 Значения из столбцов файла с номерами подставляются по названию столбца "
+            "в фигурных скобках, например: Здравствуйте, {имя}!",
             reply_markup=get_cancel_keyboard()
         )
     
     # Обработчик ввода текста нового шаблона
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'templates_create_text')
+    @router.route('templates_create_text')
     def template_create_text_handler(message):
         chat_id = message.chat.id
         
@@ -976,7 +864,7 @@ def register_template_handlers(bot):
         )
     
     # Обработчик запроса на добавление файла к новому шаблону
-    @bot.message_handler(func=lambda message: get_user_state(message.chat.id) == 'templates_create_file_query')
+    @router.route('templates_create_file_query')
     def template_create_file_query_handler(message):
         chat_id = message.chat.id
         
@@ -1000,65 +888,104 @@ def register_template_handlers(bot):
             )
     
     # Обработчик загрузки файла для нового шаблона
-    @bot.message_handler(content_types=['document', 'photo', 'video', 'audio'],
-                        func=lambda message: get_user_state(message.chat.id) == 'templates_create_add_file')
+    @router.route('templates_create_add_file', content_types=['document', 'photo', 'video', 'audio'])
     def template_create_add_file_handler(message):
         chat_id = message.chat.id
         
         # Определяем тип медиа и получаем file_id
-        if message.content_type == 'document':
-            file_id = message.document.file_id
-            file_name = message.document.file_name
-            file_type = 'document'
-        elif message.content_type == 'photo':
-            file_id = message.photo[-1].file_id  # Берем фото максимального размера
-            file_name = f"photo_{file_id}.jpg"
-            file_type = 'photo'
-        elif message.content_type == 'video':
-            file_id = message.video.file_id
-            file_name = message.video.file_name if message.video.file_name else f"video_{file_id}.mp4"
-            file_type = 'video'
-        elif message.content_type == 'audio':
-            file_id = message.audio.file_id
-            file_name = message.audio.file_name if message.audio.file_name else f"audio_{file_id}.mp3"
-            file_type = 'audio'
+        file_id, file_name, file_type = get_message_file(message)
         
-        # Скачиваем файл
-        file_info = bot.get_file(file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
+        # Файл загружается в фоне; остальное выполняется после загрузки
+        def on_saved(file_path, file_hash):
+            # Сохраняем путь к файлу
+            if chat_id not in template_data or 'new_template' not in template_data[chat_id]:
+                bot.send_message(
+                    chat_id, 
+                    "❌ Ошибка: данные о создаваемом шаблоне не найдены.",
+                    reply_markup=get_template_management_keyboard()
+                )
+                set_user_state(chat_id, 'templates')
+                return
         
-        # Создаем папку files, если её нет
-        os.makedirs('files', exist_ok=True)
+            template_data[chat_id]['new_template']['filePath'] = file_path
+            template_data[chat_id]['new_template']['fileHash'] = file_hash
         
-        # Сохраняем файл
-        file_path = os.path.join('files', file_name)
-        with open(file_path, 'wb') as file:
-            file.write(downloaded_file)
+            # Создаем новый шаблон с файлом
+            create_new_template(bot, chat_id, True)
         
-        # Сохраняем путь к файлу
-        if chat_id not in template_data or 'new_template' not in template_data[chat_id]:
-            bot.send_message(
-                chat_id, 
-                "❌ Ошибка: данные о создаваемом шаблоне не найдены.",
-                reply_markup=get_template_management_keyboard()
-            )
-            set_user_state(chat_id, 'templates')
-            return
-        
-        template_data[chat_id]['new_template']['filePath'] = file_path
-        
-        # Создаем новый шаблон с файлом
-        create_new_template(bot, chat_id, True)
+        receive_file_in_background(chat_id, file_id, file_name, on_saved, 'templates_create_add_file')
     
     # Обработчик отмены создания шаблона с файлом
-    @bot.message_handler(func=lambda message: message.text == '❌ Отменить' and
-                         get_user_state(message.chat.id) == 'templates_create_add_file')
+    @router.route('templates_create_add_file', text='❌ Отменить')
     def cancel_template_create_file_handler(message):
         chat_id = message.chat.id
         
         # Создаем шаблон без файла
         create_new_template(bot, chat_id, False)
 
+def template_file_ref(template_id):
+    """
+    Возвращает ссылку шаблона на файл в хранилище медиафайлов.
+    """
+    return f"template:{template_id}"
+
+def template_file_name(template):
+    """
+    Возвращает исходное имя файла шаблона. Файлы хранятся под хэшем содержимого,
+    поэтому имя берется из индекса хранилища медиафайлов; для файлов, сохраненных
+    до появления хранилища, - из пути.
+    
+    Аргументы:
+        template (dict): Данные шаблона.
+    
+    Возвращает:
+        str: Имя файла.
+    """
+    entry = get_media_store().get(template['fileHash']) if template.get('fileHash') else None
+    if entry and entry.get('name'):
+        return entry['name']
+    return os.path.basename(template.get('filePath') or '')
+
+def release_template_file(template):
+    """
+    Снимает ссылку шаблона на его файл в хранилище медиафайлов. Файлы шаблонов,
+    сохраненные до появления хранилища (без fileHash), не затрагиваются.
+    
+    Аргументы:
+        template (dict): Данные шаблона.
+    """
+    if template.get('fileHash'):
+        get_media_store().release(template['fileHash'], template_file_ref(template['id']))
+
+def send_template_page(bot, chat_id, page=1, message_id=None):
+    """
+    Показывает страницу списка шаблонов с inline-кнопками выбора и навигации.
+    Загружается только запрошенная страница, поэтому размер сообщения не
+    зависит от общего количества шаблонов.
+    
+    Аргументы:
+        bot (telebot.TeleBot): Экземпляр бота Telegram.
+        chat_id (int): ID чата пользователя.
+        page (int, optional): Номер страницы.
+        message_id (int, optional): ID сообщения со списком; если указан, сообщение
+                                    редактируется на месте вместо отправки нового.
+    """
+    templates = get_template_repository()
+    page_templates, page, total_pages = templates.page(page)
+    text = f"📋 Доступные шаблоны ({templates.count()}), страница {page}/{total_pages}:"
+    keyboard = get_template_pagination_keyboard(page, total_pages, page_templates)
+    
+    if message_id is None:
+        bot.send_message(chat_id, text, reply_markup=keyboard)
+        return
+    
+    try:
+        bot.edit_message_text(text, chat_id, message_id, reply_markup=keyboard)
+    except ApiTelegramException as e:
+        # Повторное нажатие на ту же страницу не меняет сообщение
+        if 'message is not modified' not in str(e):
+            raise
+
 def create_new_template(bot, chat_id, with_file=False):
     """
     Создает новый шаблон и сохраняет его в конфигурации.
@@ -1092,31 +1019,18 @@ def create_new_template(bot, chat_id, with_file=False):
         set_user_state(chat_id, 'templates')
         return
     
-    # Загружаем существующие шаблоны
-    templates_path = os.path.join('config', 'templates.json')
-    templates_config = load_config(templates_path)
-    
-    if not templates_config:
-        templates_config = {'templates': []}
-    elif 'templates' not in templates_config:
-        templates_config['templates'] = []
-    
     # Создаем новый шаблон
-    template = {
-        'id': str(uuid.uuid4()),
-        'name': new_template['name'],
-        'text': new_template['text'],
-        'hasFile': with_file,
-        'filePath': new_template.get('filePath') if with_file else None
-    }
-    
-    # Добавляем шаблон в список
-    templates_config['templates'].append(template)
-    
-    # Сохраняем обновленный список шаблонов
-    success = save_config(templates_path, templates_config)
+    template = get_template_repository().create(
+        new_template['name'],
+        new_template['text'],
+        file_path=new_template.get('filePath') if with_file else None,
+        file_hash=new_template.get('fileHash') if with_file else None
+    )
+    success = template is not None
     
     if success:
+        if template['fileHash']:
+            get_media_store().add_ref(template['fileHash'], template_file_ref(template['id']))
         bot.send_message(
             chat_id, 
             f"✅ Шаблон *{new_template['name']}* успешно создан.",
@@ -0,0 +1,438 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+# Путь к базе данных заданий рассылки
+JOBS_DB_PATH = os.path.join('data', 'jobs.db')
+
+# Количество результатов, после которого прогресс фиксируется в базе
+CHECKPOINT_BATCH_SIZE = 20
+
+# Статусы заданий; JOB_CREATING - получатели еще записываются, такое задание
+# не возобновляется, а удаляется при запуске (см. delete_incomplete_jobs)
+JOB_CREATING = 'creating'
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_PAUSED = 'paused'
+JOB_DONE = 'done'
+
+# Статусы получателей
+RECIPIENT_PENDING = 'pending'
+RECIPIENT_SENT = 'sent'
+RECIPIENT_FAILED = 'failed'
+
+# Статусы доставки сообщений (по уведомлениям Green API) и их порядок:
+# уведомления могут прийти не по порядку, более ранний статус не заменяет более поздний
+DELIVERY_SENT = 'sent'
+DELIVERY_DELIVERED = 'delivered'
+DELIVERY_READ = 'read'
+DELIVERY_FAILED = 'failed'
+DELIVERY_RANKS = {DELIVERY_SENT: 1, DELIVERY_DELIVERED: 2, DELIVERY_READ: 3, DELIVERY_FAILED: 4}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    message TEXT NOT NULL,
+    media TEXT,
+    total INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+
+CREATE TABLE IF NOT EXISTS recipients (
+    job_id INTEGER NOT NULL,
+    phone INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    id_message TEXT,
+    fields TEXT,
+    PRIMARY KEY (job_id, phone)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_recipients_status ON recipients(job_id, status);
+
+CREATE TABLE IF NOT EXISTS deliveries (
+    id_message TEXT PRIMARY KEY,
+    job_id INTEGER,
+    phone INTEGER,
+    status TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_deliveries_job ON deliveries(job_id, status);
+"""
+
+class JobStore:
+    """
+    Хранилище заданий рассылки в SQLite. Для каждого получателя хранится статус,
+    поэтому прерванную рассылку можно продолжить, не отправляя сообщения повторно.
+    """
+
+    def __init__(self, db_path=JOBS_DB_PATH):
+        """
+        Аргументы:
+            db_path (str, optional): Путь к файлу базы данных.
+        """
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        # Базы, созданные до появления персонализации, дополняются столбцом fields
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(recipients)")}
+        if 'fields' not in columns:
+            self._conn.execute("ALTER TABLE recipients ADD COLUMN fields TEXT")
+            self._conn.commit()
+
+    def create_job(self, chat_id, message, media, phone_numbers, batch_size=1000):
+        """
+        Создает задание и записывает получателей порциями. Пока получатели
+        записываются, задание находится в статусе JOB_CREATING и не считается
+        незавершенным; статус JOB_PENDING оно получает после записи всех
+        получателей. Если чтение получателей прервалось ошибкой, задание удаляется.
+
+        Аргументы:
+            chat_id (int): ID чата пользователя, запустившего рассылку.
+            message (str): Текст сообщения.
+            media (dict или None): Медиафайл рассылки.
+            phone_numbers (iterable): Номера телефонов или пары (номер, значения полей
+                                      для подстановки в текст); могут читаться лениво.
+            batch_size (int, optional): Размер порции при записи получателей.
+
+        Возвращает:
+            int: ID задания.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (chat_id, status, message, media, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (chat_id, JOB_CREATING, message, json.dumps(media) if media else None, now, now)
+            )
+            job_id = cursor.lastrowid
+            self._conn.commit()
+
+        total = 0
+        batch = []
+        try:
+            for phone in phone_numbers:
+                fields = None
+                if isinstance(phone, tuple):
+                    phone, fields = phone
+                batch.append((job_id, int(phone), json.dumps(fields, ensure_ascii=False) if fields else None))
+                if len(batch) >= batch_size:
+                    total += self._insert_recipients(batch)
+                    batch = []
+            if batch:
+                total += self._insert_recipients(batch)
+        except BaseException:
+            self._delete_job(job_id)
+            raise
+
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = ?, total = ?, updated_at = ? WHERE id = ?",
+                               (JOB_PENDING, total, time.time(), job_id))
+            self._conn.commit()
+        return job_id
+
+    def _delete_job(self, job_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM recipients WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.commit()
+
+    def delete_incomplete_jobs(self):
+        """
+        Удаляет задания, запись получателей которых прервал перезапуск или сбой
+        бота (статус JOB_CREATING): рассылка по неполному списку не запускается.
+
+        Возвращает:
+            int: Количество удаленных заданий.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT id FROM jobs WHERE status = ?", (JOB_CREATING,)).fetchall()
+        for row in rows:
+            self._delete_job(row['id'])
+        return len(rows)
+
+    def _insert_recipients(self, batch):
+        with self._lock:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO recipients (job_id, phone, fields) VALUES (?, ?, ?)", batch
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def get_job(self, job_id):
+        """
+        Возвращает задание по ID.
+
+        Возвращает:
+            dict или None: Данные задания или None, если задание не найдено.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['media'] = json.loads(job['media']) if job['media'] else None
+        return job
+
+    def set_status(self, job_id, status):
+        """
+        Меняет статус задания.
+        """
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                               (status, time.time(), job_id))
+            self._conn.commit()
+
+    def unfinished_jobs(self):
+        """
+        Возвращает ID заданий, которые были прерваны (перезапуск бота, сбой)
+        или приостановлены из-за недоступности инстансов.
+
+        Возвращает:
+            list: ID незавершенных заданий.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?, ?) ORDER BY id",
+                (JOB_PENDING, JOB_RUNNING, JOB_PAUSED)
+            ).fetchall()
+        return [row['id'] for row in rows]
+
+    def iter_pending(self, job_id, batch_size=500, with_fields=False):
+        """
+        Лениво перебирает получателей, которым сообщение еще не отправлялось.
+
+        Аргументы:
+            job_id (int): ID задания.
+            batch_size (int, optional): Сколько номеров читается одним запросом.
+            with_fields (bool, optional): Возвращать вместе с номером значения полей для подстановки.
+
+        Возвращает:
+            generator: Номера телефонов в виде строк или пары (номер, словарь значений полей).
+        """
+        return self.iter_recipients(job_id, RECIPIENT_PENDING, batch_size, with_fields)
+
+    def iter_recipients(self, job_id, status, batch_size=500, with_fields=False):
+        """
+        Лениво перебирает получателей задания в заданном статусе.
+
+        Аргументы:
+            job_id (int): ID задания.
+            status (str): Статус получателей ('pending', 'sent' или 'failed').
+            batch_size (int, optional): Сколько номеров читается одним запросом.
+            with_fields (bool, optional): Возвращать вместе с номером значения полей для подстановки.
+
+        Возвращает:
+            generator: Номера телефонов в виде строк или пары (номер, словарь значений полей).
+        """
+        last_phone = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT phone, fields FROM recipients WHERE job_id = ? AND status = ? AND phone > ? "
+                    "ORDER BY phone LIMIT ?",
+                    (job_id, status, last_phone, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                if with_fields:
+                    yield str(row['phone']), json.loads(row['fields']) if row['fields'] else {}
+                else:
+                    yield str(row['phone'])
+            last_phone = rows[-1]['phone']
+
+    def save_results(self, job_id, results):
+        """
+        Фиксирует результаты отправки одной транзакцией (контрольная точка).
+
+        Аргументы:
+            job_id (int): ID задания.
+            results (list): Кортежи (телефон, статус, idMessage).
+        """
+        if not results:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE recipients SET status = ?, id_message = ? WHERE job_id = ? AND phone = ?",
+                [(status, id_message, job_id, int(phone)) for phone, status, id_message in results]
+            )
+            # Уведомление о доставке может прийти раньше контрольной точки: тогда
+            # запись уже есть, и ей только назначается задание
+            self._conn.executemany(
+                "INSERT INTO deliveries (id_message, job_id, phone, status, rank, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id_message) DO UPDATE SET job_id = excluded.job_id, phone = excluded.phone",
+                [(id_message, job_id, int(phone), DELIVERY_SENT, DELIVERY_RANKS[DELIVERY_SENT], now)
+                 for phone, status, id_message in results if id_message]
+            )
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+            self._conn.commit()
+
+    def job_stats(self, job_id):
+        """
+        Подсчитывает получателей задания по статусам.
+
+        Возвращает:
+            dict: Количество получателей в статусах 'pending', 'sent' и 'failed'.
+        """
+        stats = {RECIPIENT_PENDING: 0, RECIPIENT_SENT: 0, RECIPIENT_FAILED: 0}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS count FROM recipients WHERE job_id = ? GROUP BY status",
+                (job_id,)
+            ).fetchall()
+        for row in rows:
+            stats[row['status']] = row['count']
+        return stats
+
+    def record_deliveries(self, statuses):
+        """
+        Записывает статусы доставки сообщений одной транзакцией. Статус
+        заменяется только более поздним (см. DELIVERY_RANKS).
+
+        Аргументы:
+            statuses (list): Пары (idMessage, статус доставки).
+        """
+        if not statuses:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO deliveries (id_message, status, rank, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id_message) DO UPDATE SET status = excluded.status, rank = excluded.rank, "
+                "updated_at = excluded.updated_at WHERE excluded.rank > deliveries.rank",
+                [(id_message, status, DELIVERY_RANKS[status], now) for id_message, status in statuses]
+            )
+            self._conn.commit()
+
+    def delivery_stats(self, job_id):
+        """
+        Подсчитывает отправленные сообщения задания по статусам доставки.
+
+        Возвращает:
+            dict: Количество сообщений в статусах 'sent', 'delivered', 'read' и 'failed'.
+        """
+        stats = dict.fromkeys(DELIVERY_RANKS, 0)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS count FROM deliveries WHERE job_id = ? GROUP BY status",
+                (job_id,)
+            ).fetchall()
+        for row in rows:
+            stats[row['status']] = row['count']
+        return stats
+
+    def recent_jobs(self, chat_id, limit=5):
+        """
+        Возвращает последние задания пользователя.
+
+        Аргументы:
+            chat_id (int): ID чата пользователя.
+            limit (int, optional): Количество заданий.
+
+        Возвращает:
+            list: Словари с данными заданий, от новых к старым.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE chat_id = ? ORDER BY id DESC LIMIT ?", (chat_id, limit)
+            ).fetchall()
+        return [self.get_job(row['id']) for row in rows]
+
+class JobCheckpoint:
+    """
+    Накопитель результатов отправки: записывает их в базу порциями,
+    чтобы не делать транзакцию на каждое сообщение.
+
+    Порции записывает отдельный поток, поэтому add() можно вызывать из цикла
+    событий рассылки: он не ждет фиксации транзакции SQLite и не задерживает
+    остальные запросы.
+    """
+
+    def __init__(self, store, job_id, batch_size=CHECKPOINT_BATCH_SIZE):
+        self.store = store
+        self.job_id = job_id
+        self.batch_size = batch_size
+        self._results = []
+        self._queue = queue.Queue()
+        self._writer = None
+        self._error = None
+        # Результаты порций, которые не удалось записать в базу
+        self.unsaved = []
+
+    def add(self, phone, delivered, id_message=None):
+        """
+        Добавляет результат отправки и при заполнении порции передает ее на запись.
+        """
+        status = RECIPIENT_SENT if delivered else RECIPIENT_FAILED
+        self._results.append((phone, status, id_message))
+        if len(self._results) >= self.batch_size:
+            self._submit()
+
+    def _submit(self):
+        results, self._results = self._results, []
+        if not results:
+            return
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_batches, daemon=True)
+            self._writer.start()
+        self._queue.put(results)
+
+    def _write_batches(self):
+        while True:
+            results = self._queue.get()
+            if results is None:
+                return
+            try:
+                self.store.save_results(self.job_id, results)
+            except Exception as e:
+                # Ошибка передается вызывающему в flush(); следующие порции все равно записываются
+                self.unsaved.extend(results)
+                if self._error is None:
+                    self._error = e
+
+    def flush(self):
+        """
+        Записывает накопленные результаты в базу и ждет завершения записи
+        всех порций.
+
+        Исключения:
+            Exception: Первая ошибка записи порции в базу.
+        """
+        self._submit()
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_job_store():
+    """
+    Возвращает общее хранилище заданий, открывая базу при первом обращении.
+
+    Возвращает:
+        JobStore: Хранилище заданий.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore()
+        return _store
@@ -1,5 +1,9 @@
-from telebot.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+from telebot.types import ReplyKeyboardMarkup, KeyboardButton
 
+from keyboards.pagination import get_template_page_keyboard as get_pagination_keyboard
+from keyboards.registry import static_keyboard
+
+@static_keyboard
 def get_message_type_keyboard():
     """
     Клавиатура для выбора типа сообщения при создании рассылки.
@@ -16,6 +20,7 @@ def get_message_type_keyboard():
     )
     return keyboard
 
+@static_keyboard
 def get_confirm_keyboard():
     """
     Клавиатура для подтверждения или отмены рассылки.
@@ -30,27 +35,20 @@ def get_confirm_keyboard():
     )
     return keyboard
 
-def get_template_selection_keyboard(templates):
+@static_keyboard
+def get_template_selection_keyboard():
     """
-    Создает клавиатуру с доступными шаблонами для рассылки.
+    Клавиатура на время выбора шаблона для рассылки. Сами шаблоны выбираются
+    inline-кнопками постраничного списка (см. get_pagination_keyboard).
     
-    Аргументы:
-        templates (list): Список словарей с информацией о шаблонах.
-        
     Возвращает:
-        ReplyKeyboardMarkup: Клавиатура с кнопками доступных шаблонов и кнопкой "Назад".
+        ReplyKeyboardMarkup: Клавиатура с кнопкой "Назад".
     """
-    keyboard = ReplyKeyboardMarkup(resize_keyboard=True, row_width=1)
-    
-    # Добавляем кнопку для каждого шаблона
-    for template in templates:
-        keyboard.add(KeyboardButton(template['name']))
-    
-    # Добавляем кнопку "Назад"
+    keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
     keyboard.add(KeyboardButton('🔙 Назад'))
-    
     return keyboard
 
+@static_keyboard
 def get_back_to_broadcast_keyboard():
     """
     Клавиатура с единственной кнопкой для возврата к созданию рассылки.
@@ -62,6 +60,7 @@ def get_back_to_broadcast_keyboard():
     keyboard.add(KeyboardButton('📢 Создать рассылку'))
     return keyboard
 
+@static_keyboard
 def get_cancel_keyboard():
     """
     Клавиатура с кнопкой отмены операции.
@@ -72,30 +71,3 @@ def get_cancel_keyboard():
     keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
     keyboard.add(KeyboardButton('❌ Отменить'))
     return keyboard
-
-def get_pagination_keyboard(current_page, total_pages, template_count):
-    """
-    Создает inline-клавиатуру для пагинации при большом количестве шаблонов.
-    
-    Аргументы:
-        current_page (int): Текущая страница.
-        total_pages (int): Общее количество страниц.
-        template_count (int): Общее количество шаблонов.
-        
-    Возвращает:
-        InlineKeyboardMarkup: Inline-клавиатура с кнопками пагинации.
-    """
-    keyboard = InlineKeyboardMarkup(row_width=3)
-    
-    buttons = []
-    
-    if current_page > 1:
-        buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"template_page_{current_page-1}"))
-    
-    buttons.append(InlineKeyboardButton(f"{current_page}/{total_pages}", callback_data="current_page"))
-    
-    if current_page < total_pages:
-        buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"template_page_{current_page+1}"))
-    
-    keyboard.add(*buttons)
-    return keyboard
\ No newline at end of file
@@ -1,5 +1,8 @@
 from telebot.types import ReplyKeyboardMarkup, KeyboardButton
 
+from keyboards.registry import static_keyboard
+
+@static_keyboard
 def get_main_menu_keyboard():
     """
     Создает клавиатуру главного меню бота.
@@ -15,6 +18,7 @@ def get_main_menu_keyboard():
     )
     return keyboard
 
+@static_keyboard
 def get_settings_menu_keyboard():
     """
     Создает клавиатуру для меню настроек.
@@ -30,6 +34,7 @@ def get_settings_menu_keyboard():
     )
     return keyboard
 
+@static_keyboard
 def get_back_to_main_menu_keyboard():
     """
     Создает клавиатуру с единственной кнопкой для возврата в главное меню.
@@ -41,6 +46,7 @@ def get_back_to_main_menu_keyboard():
     keyboard.add(KeyboardButton('🔙 Назад'))
     return keyboard
 
+@static_keyboard
 def get_profile_edit_keyboard():
     """
     Создает клавиатуру для раздела профиля.
@@ -55,6 +61,7 @@ def get_profile_edit_keyboard():
     )
     return keyboard
 
+@static_keyboard
 def get_confirmation_keyboard():
     """
     Создает клавиатуру для подтверждения действий в меню настроек.
@@ -69,6 +76,7 @@ def get_confirmation_keyboard():
     )
     return keyboard
 
+@static_keyboard
 def get_cancel_keyboard():
     """
     Создает клавиатуру с единственной кнопкой для отмены текущей операции.
@@ -0,0 +1,46 @@
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from keyboards.registry import cached_keyboard
+
+def template_page_key(current_page, total_pages, templates=()):
+    """
+    Ключ кэша страницы шаблонов: клавиатура строится заново только при
+    изменении номера страницы, числа страниц, ID или названий шаблонов.
+    """
+    return current_page, total_pages, tuple((template['id'], template['name']) for template in templates)
+
+@cached_keyboard(template_page_key)
+def get_template_page_keyboard(current_page, total_pages, templates=()):
+    """
+    Создает inline-клавиатуру страницы шаблонов: кнопка на каждый шаблон
+    страницы и кнопки навигации по страницам. Используется и в списке
+    шаблонов, и при выборе шаблона для рассылки.
+    
+    Аргументы:
+        current_page (int): Номер текущей страницы.
+        total_pages (int): Общее количество страниц.
+        templates (list, optional): Шаблоны текущей страницы.
+        
+    Возвращает:
+        InlineKeyboardMarkup: Inline-клавиатура со списком шаблонов и кнопками навигации.
+    """
+    keyboard = InlineKeyboardMarkup(row_width=3)
+    
+    for template in templates:
+        keyboard.row(InlineKeyboardButton(template['name'], callback_data=f"template_select_{template['id']}"))
+    
+    if total_pages <= 1:
+        return keyboard
+    
+    buttons = []
+    
+    if current_page > 1:
+        buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"template_page_{current_page-1}"))
+    
+    buttons.append(InlineKeyboardButton(f"{current_page}/{total_pages}", callback_data="current_page"))
+    
+    if current_page < total_pages:
+        buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"template_page_{current_page+1}"))
+    
+    keyboard.add(*buttons)
+    return keyboard
@@ -0,0 +1,107 @@
+import functools
+import threading
+from collections import OrderedDict
+
+from telebot.types import JsonSerializable
+
+# Сколько клавиатур с изменяемым содержимым (страницы шаблонов) хранится в кэше
+DYNAMIC_KEYBOARDS_CACHE_SIZE = 256
+
+class FrozenMarkup(JsonSerializable):
+    """
+    Готовая неизменяемая клавиатура. JSON строится один раз при создании и
+    отдается telebot как есть, поэтому при каждой отправке сообщения
+    клавиатура не собирается и не сериализуется заново.
+    """
+
+    __slots__ = ('_json',)
+
+    def __init__(self, markup):
+        """
+        Аргументы:
+            markup (ReplyKeyboardMarkup или InlineKeyboardMarkup): Исходная клавиатура.
+        """
+        object.__setattr__(self, '_json', markup.to_json())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FrozenMarkup нельзя изменить")
+
+    def to_json(self):
+        return self._json
+
+_static_factories = []
+
+def static_keyboard(factory):
+    """
+    Декоратор для фабрик клавиатур, содержимое которых не меняется за время
+    работы бота. Клавиатура строится один раз для каждого набора аргументов
+    (например, has_file=True/False) и дальше возвращается из кэша.
+
+    Аргументы:
+        factory (callable): Функция, создающая клавиатуру.
+
+    Возвращает:
+        callable: Функция с тем же именем, возвращающая FrozenMarkup.
+    """
+    @functools.wraps(factory)
+    @functools.lru_cache(maxsize=None)
+    def wrapper(*args):
+        return FrozenMarkup(factory(*args))
+
+    _static_factories.append(wrapper)
+    return wrapper
+
+def cached_keyboard(key):
+    """
+    Декоратор для фабрик клавиатур, которые зависят от данных (например,
+    страница списка шаблонов). Клавиатура кэшируется по ключу от аргументов:
+    пока данные не изменились, повторный вызов возвращает готовую клавиатуру,
+    а при изменении данных меняется ключ и клавиатура строится заново.
+    Кэш ограничен DYNAMIC_KEYBOARDS_CACHE_SIZE записями.
+
+    Аргументы:
+        key (callable): Функция с теми же аргументами, что и фабрика,
+                        возвращающая хэшируемый ключ.
+
+    Возвращает:
+        callable: Декоратор.
+    """
+    def decorator(factory):
+        cache = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(factory)
+        def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs)
+            with lock:
+                if cache_key in cache:
+                    cache.move_to_end(cache_key)
+                    return cache[cache_key]
+            markup = FrozenMarkup(factory(*args, **kwargs))
+            with lock:
+                cache[cache_key] = markup
+                if len(cache) > DYNAMIC_KEYBOARDS_CACHE_SIZE:
+                    cache.popitem(last=False)
+            return markup
+
+        return wrapper
+
+    return decorator
+
+def build_static_keyboards():
+    """
+    Заранее строит все статические клавиатуры без аргументов, чтобы первые
+    сообщения пользователей не тратили время на их сборку.
+
+    Возвращает:
+        int: Количество построенных клавиатур.
+    """
+    # Импорт модулей клавиатур регистрирует их фабрики
+    from keyboards import broadcast_keyboards, main_menu_keyboard, settings_keyboards, template_keyboards
+
+    built = 0
+    for factory in _static_factories:
+        if factory.__wrapped__.__code__.co_argcount == 0:
+            factory()
+            built += 1
+    return built
@@ -1,5 +1,8 @@
 from telebot.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 
+from keyboards.registry import static_keyboard
+
+@static_keyboard
 def get_settings_menu_keyboard():
     """
     Создает клавиатуру для меню настроек.
@@ -15,6 +18,7 @@ def get_settings_menu_keyboard():
     )
     return keyboard
 
+@static_keyboard
 def get_profile_menu_keyboard():
     """
     Создает клавиатуру для раздела управления профилем.
@@ -30,6 +34,7 @@ def get_profile_menu_keyboard():
     )
     return keyboard
 
+@static_keyboard
 def get_profile_edit_keyboard():
     """
     Создает клавиатуру для редактирования параметров профиля.
@@ -48,12 +53,14 @@ def get_profile_edit_keyboard():
     )
     return keyboard
 
+@static_keyboard
 def get_interval_keyboard():
     """
     Создает клавиатуру для установки интервала между сообщениями.
     
     Возвращает:
-        ReplyKeyboardMarkup: Клавиатура с предустановленными значениями интервала.
+        ReplyKeyboardMarkup: Клавиатура с предустановленными значениями интервала
+                             и кнопкой настройки размера пачки.
     """
     keyboard = ReplyKeyboardMarkup(resize_keyboard=True, row_width=3)
     # Добавляем кнопки с предустановленными значениями интервала
@@ -67,9 +74,29 @@ def get_interval_keyboard():
         KeyboardButton('30'),
         KeyboardButton('60')
     )
+    keyboard.add(KeyboardButton('📦 Размер пачки'))
+    keyboard.add(KeyboardButton('🔙 Назад'))
+    return keyboard
+
+@static_keyboard
+def get_burst_keyboard():
+    """
+    Создает клавиатуру для установки размера пачки (сколько сообщений можно отправить подряд).
+    
+    Возвращает:
+        ReplyKeyboardMarkup: Клавиатура с предустановленными значениями размера пачки.
+    """
+    keyboard = ReplyKeyboardMarkup(resize_keyboard=True, row_width=4)
+    keyboard.add(
+        KeyboardButton('1'),
+        KeyboardButton('3'),
+        KeyboardButton('5'),
+        KeyboardButton('10')
+    )
     keyboard.add(KeyboardButton('🔙 Назад'))
     return keyboard
 
+@static_keyboard
 def get_confirmation_keyboard():
     """
     Создает клавиатуру для подтверждения изменений в настройках.
@@ -84,6 +111,7 @@ def get_confirmation_keyboard():
     )
     return keyboard
 
+@static_keyboard
 def get_back_keyboard():
     """
     Создает клавиатуру с единственной кнопкой для возврата к предыдущему меню.
@@ -95,6 +123,7 @@ def get_back_keyboard():
     keyboard.add(KeyboardButton('🔙 Назад'))
     return keyboard
 
+@static_keyboard
 def get_cancel_keyboard():
     """
     Создает клавиатуру с единственной кнопкой для отмены текущей операции.
@@ -106,6 +135,7 @@ def get_cancel_keyboard():
     keyboard.add(KeyboardButton('❌ Отменить'))
     return keyboard
 
+@static_keyboard
 def get_connection_test_result_keyboard(success):
     """
     Создает клавиатуру, отображающую результат проверки соединения.
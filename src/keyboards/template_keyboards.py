@@ -1,5 +1,9 @@
-from telebot.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+from telebot.types import ReplyKeyboardMarkup, KeyboardButton
 
+from keyboards.pagination import get_template_page_keyboard as get_template_pagination_keyboard
+from keyboards.registry import static_keyboard
+
+@static_keyboard
 def get_template_management_keyboard():
     """
     Создает основную клавиатуру раздела управления шаблонами.
@@ -15,24 +19,7 @@ def get_template_management_keyboard():
     )
     return keyboard
 
-def get_template_list_keyboard(templates):
-    """
-    Создает клавиатуру со списком доступных шаблонов.
-    
-    Аргументы:
-        templates (list): Список словарей с данными шаблонов.
-        
-    Возвращает:
-        ReplyKeyboardMarkup: Клавиатура со списком шаблонов и кнопкой "Назад".
-    """
-    keyboard = ReplyKeyboardMarkup(resize_keyboard=True, row_width=1)
-    
-    for template in templates:
-        keyboard.add(KeyboardButton(template['name']))
-    
-    keyboard.add(KeyboardButton('🔙 Назад'))
-    return keyboard
-
+@static_keyboard
 def get_template_actions_keyboard():
     """
     Создает клавиатуру действий для выбранного шаблона.
@@ -49,6 +36,7 @@ def get_template_actions_keyboard():
     )
     return keyboard
 
+@static_keyboard
 def get_template_edit_keyboard():
     """
     Создает клавиатуру для редактирования параметров шаблона.
@@ -65,6 +53,7 @@ def get_template_edit_keyboard():
     )
     return keyboard
 
+@static_keyboard
 def get_file_management_keyboard(has_file):
     """
     Создает клавиатуру для управления файлом шаблона.
@@ -89,6 +78,7 @@ def get_file_management_keyboard(has_file):
     keyboard.add(KeyboardButton('🔙 Назад'))
     return keyboard
 
+@static_keyboard
 def get_confirmation_keyboard():
     """
     Создает клавиатуру для подтверждения действий с шаблоном.
@@ -103,6 +93,7 @@ def get_confirmation_keyboard():
     )
     return keyboard
 
+@static_keyboard
 def get_back_keyboard():
     """
     Создает клавиатуру с кнопкой для возврата к предыдущему меню.
@@ -114,6 +105,7 @@ def get_back_keyboard():
     keyboard.add(KeyboardButton('🔙 Назад'))
     return keyboard
 
+@static_keyboard
 def get_cancel_keyboard():
     """
     Создает клавиатуру с кнопкой для отмены текущего действия.
@@ -124,29 +116,3 @@ def get_cancel_keyboard():
     keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
     keyboard.add(KeyboardButton('❌ Отменить'))
     return keyboard
-
-def get_template_pagination_keyboard(current_page, total_pages):
-    """
-    Создает inline-клавиатуру для навигации по страницам списка шаблонов.
-    
-    Аргументы:
-        current_page (int): Номер текущей страницы.
-        total_pages (int): Общее количество страниц.
-        
-    Возвращает:
-        InlineKeyboardMarkup: Inline-клавиатура с кнопками навигации.
-    """
-    keyboard = InlineKeyboardMarkup(row_width=3)
-    
-    buttons = []
-    
-    if current_page > 1:
-        buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"template_page_{current_page-1}"))
-    
-    buttons.append(InlineKeyboardButton(f"{current_page}/{total_pages}", callback_data="current_page"))
-    
-    if current_page < total_pages:
-        buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"template_page_{current_page+1}"))
-    
-    keyboard.add(*buttons)
-    return keyboard
\ No newline at end of file
@@ -1,16 +1,60 @@
 import os
+import threading
+import time
 import telebot
 import logging
 from telebot import types
 
 # Импорт обработчиков
 from handlers.main_menu_handlers import register_main_menu_handlers, get_user_state, set_user_state
-from handlers.broadcast_handlers import register_broadcast_handlers
+from handlers.broadcast_handlers import register_broadcast_handlers, resume_unfinished_jobs
 from handlers.template_handlers import register_template_handlers
 from handlers.settings_handlers import register_settings_handlers
+from state_router import StateRouter
+from webhook import WebhookServer
+from dispatcher import ChatDispatcher
+from media_store import start_garbage_collection, stop_garbage_collection
+from keyboards.registry import build_static_keyboards
+from state_store import configure_state_stores, create_state_backend
+from notifications import start_delivery_tracking, stop_notification_pollers
 
 # Импорт функций для работы с конфигурацией
-from utils import load_config, save_config
+from utils import load_config, save_config, get_bot_settings, BOT_CONFIG_PATH, DEFAULT_BOT_SETTINGS
+
+# Пауза перед перезапуском после ошибки (секунды); удваивается при повторных ошибках
+RESTART_DELAY = 5
+MAX_RESTART_DELAY = 300
+
+def run_polling(bot, bot_settings):
+    """
+    Получает обновления через long polling: запрос к Telegram висит до появления
+    обновлений (до pollingTimeout секунд), поэтому между сообщениями бот не нагружает процессор.
+    """
+    bot.remove_webhook()
+    timeout = int(bot_settings['pollingTimeout'])
+    bot.polling(none_stop=True, interval=0, timeout=timeout, long_polling_timeout=timeout)
+
+def run_webhook(bot, bot_settings, dispatcher=None):
+    """
+    Получает обновления через webhook: Telegram сам отправляет их на локальный HTTP-сервер.
+    Если webhookUrl не задан, webhook в Telegram не регистрируется - так можно проверить
+    бота, отправляя сохраненные обновления на сервер вручную.
+    """
+    server = WebhookServer(
+        bot,
+        host=bot_settings['webhookHost'],
+        port=int(bot_settings['webhookPort']),
+        path=bot_settings['webhookPath'],
+        secret_token=bot_settings['secretToken'],
+        queue_size=int(bot_settings['queueSize']),
+        metrics=dispatcher.metrics if dispatcher else None
+    )
+    if bot_settings['webhookUrl']:
+        bot.remove_webhook()
+        bot.set_webhook(url=bot_settings['webhookUrl'], secret_token=bot_settings['secretToken'] or None)
+    host, port = server.address[:2]
+    logging.info(f"Webhook-сервер слушает {host}:{port}{bot_settings['webhookPath']}")
+    server.serve_forever()
 
 def main():
     # Настройка логирования
@@ -22,6 +66,7 @@ def main():
     # Создание необходимых директорий, если их нет
     os.makedirs('config', exist_ok=True)
     os.makedirs('files', exist_ok=True)
+    os.makedirs('data', exist_ok=True)
     
     # Инициализация конфигурационных файлов, если их нет
     if not os.path.exists(os.path.join('config', 'profile.json')):
@@ -42,26 +87,78 @@ def main():
         initial_templates = {"templates": []}
         save_config(os.path.join('config', 'templates.json'), initial_templates)
     
+    if not os.path.exists(BOT_CONFIG_PATH):
+        save_config(BOT_CONFIG_PATH, DEFAULT_BOT_SETTINGS)
+    
     # Создаем экземпляр бота
     TOKEN = 'YOUR_BOT_TOKEN'
-    bot = telebot.TeleBot(TOKEN)
+    # Обработчики выполняются в пуле потоков ChatDispatcher, а не во встроенном пуле telebot
+    bot = telebot.TeleBot(TOKEN, threaded=False)
+    
+    # Регистрация обработчиков: команды регистрируются в боте напрямую,
+    # обработчики состояний - в маршрутизаторе, который подключается последним
+    router = StateRouter(get_user_state)
+    register_main_menu_handlers(bot, router)
+    register_broadcast_handlers(bot, router)
+    register_template_handlers(bot, router)
+    register_settings_handlers(bot, router)
+    router.register(bot)
     
-    # Регистрация обработчиков
-    register_main_menu_handlers(bot)
-    register_broadcast_handlers(bot)
-    register_template_handlers(bot)
-    register_settings_handlers(bot)
+    # Статические клавиатуры строятся и сериализуются один раз при запуске
+    build_static_keyboards()
+    
+    # Состояния диалогов: в памяти с ограничением по времени и количеству,
+    # с сохранением в SQLite или Redis, чтобы диалоги переживали перезапуск
+    bot_settings = get_bot_settings()
+    configure_state_stores(create_state_backend(bot_settings),
+                           ttl=float(bot_settings['stateTtl']),
+                           max_entries=int(bot_settings['stateMaxEntries']))
+    
+    # Пул потоков: обновления одного чата обрабатываются по порядку, разных чатов - параллельно
+    dispatcher = ChatDispatcher.attach(bot, workers=int(bot_settings['workers']),
+                                       queue_size=int(bot_settings['queueSize']))
+    
+    # Медиафайлы, на которые не ссылается ни один шаблон или рассылка, удаляются
+    # при запуске и затем периодически, когда истекает срок их защиты
+    start_garbage_collection()
+    
+    # Продолжаем рассылки, прерванные предыдущим запуском
+    resume_unfinished_jobs(bot)
+    
+    # Статусы доставки сообщений забираются из уведомлений Green API в фоне;
+    # проверка инстансов не задерживает запуск бота
+    threading.Thread(target=start_delivery_tracking, daemon=True).start()
     
     logging.info("Бот успешно запущен и готов к работе")
     
-    # Запуск бота в режиме бесконечного опроса
-    try:
-        bot.polling(none_stop=True, interval=0)
-    except Exception as e:
-        logging.error(f"Произошла ошибка: {str(e)}")
-        # Пытаемся перезапустить бота при ошибке
-        bot.stop_polling()
-        main()
+    # Получение обновлений; при ошибке перезапускаем только прием обновлений,
+    # обработчики повторно не регистрируются
+    restart_delay = RESTART_DELAY
+    while True:
+        bot_settings = get_bot_settings()
+        started = time.monotonic()
+        try:
+            if bot_settings['mode'] == 'webhook':
+                run_webhook(bot, bot_settings, dispatcher)
+            else:
+                run_polling(bot, bot_settings)
+            break
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            logging.error(f"Произошла ошибка: {str(e)}")
+            bot.stop_polling()
+        
+        # После долгой стабильной работы начинаем отсчет паузы заново
+        if time.monotonic() - started > MAX_RESTART_DELAY:
+            restart_delay = RESTART_DELAY
+        logging.info(f"Перезапуск через {restart_delay} с")
+        time.sleep(restart_delay)
+        restart_delay = min(restart_delay * 2, MAX_RESTART_DELAY)
+    
+    # Останавливаем получение уведомлений Green API, дописывая накопленные статусы
+    stop_notification_pollers()
+    stop_garbage_collection()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
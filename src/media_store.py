@@ -0,0 +1,259 @@
+import logging
+import os
+import threading
+import time
+import uuid
+
+from downloads import download_telegram_file
+from utils import load_config, save_config
+
+# Папка с медиафайлами и индекс хранилища
+MEDIA_DIR = 'files'
+MEDIA_INDEX_PATH = os.path.join(MEDIA_DIR, 'index.json')
+# Сколько секунд новый файл без ссылок защищен от удаления: пользователь
+# мог загрузить его для рассылки, которую еще не подтвердил
+UPLOAD_GRACE_PERIOD = 24 * 60 * 60
+# Как часто удаляются файлы без ссылок, срок защиты которых истек (секунды)
+GARBAGE_COLLECTION_INTERVAL = 60 * 60
+
+class MediaStore:
+    """
+    Хранилище медиафайлов с адресацией по содержимому.
+
+    Файл хранится один раз под именем <sha256><расширение>, сколько бы раз его
+    ни загружали и под какими бы именами. Индекс (files/index.json) по хэшу
+    хранит путь, исходное имя, размер и список ссылок - ID шаблонов и заданий
+    рассылки, которые используют файл. Когда последняя ссылка снимается,
+    файл удаляется.
+    """
+
+    def __init__(self, media_dir=MEDIA_DIR, index_path=MEDIA_INDEX_PATH):
+        """
+        Аргументы:
+            media_dir (str, optional): Папка для файлов.
+            index_path (str, optional): Путь к JSON файлу индекса.
+        """
+        self.media_dir = media_dir
+        self.index_path = index_path
+        os.makedirs(media_dir, exist_ok=True)
+        # Индекс держится в памяти (поиск по хэшу - обращение к словарю)
+        # и сохраняется на диск при каждом изменении
+        self._lock = threading.RLock()
+        index = load_config(index_path) if os.path.exists(index_path) else None
+        self._blobs = (index or {}).get('blobs', {})
+
+    def _update(self, update_func):
+        with self._lock:
+            update_func(self._blobs)
+            return save_config(self.index_path, {'blobs': self._blobs})
+
+    def upload_path(self, file_name):
+        """
+        Возвращает уникальный временный путь для загрузки файла перед put().
+
+        Аргументы:
+            file_name (str): Исходное имя файла.
+
+        Возвращает:
+            str: Путь к временному файлу в папке хранилища.
+        """
+        return os.path.join(self.media_dir, f"upload_{uuid.uuid4().hex}{os.path.splitext(file_name)[1].lower()}")
+
+    def put(self, temp_path, sha256, file_name, size=None, ref=None):
+        """
+        Помещает загруженный файл в хранилище. Если файл с таким содержимым уже
+        есть, временный файл удаляется и возвращается путь к существующему.
+
+        Аргументы:
+            temp_path (str): Путь к загруженному файлу (будет перемещен или удален).
+            sha256 (str): SHA-256 содержимого в hex.
+            file_name (str): Исходное имя файла (показывается получателям).
+            size (int, optional): Размер файла в байтах.
+            ref (str, optional): Ссылка, которую сразу добавить к файлу.
+
+        Возвращает:
+            str: Путь к файлу в хранилище.
+        """
+        blob_path = os.path.join(self.media_dir, f"{sha256}{os.path.splitext(file_name)[1].lower()}")
+
+        def apply(blobs):
+            entry = blobs.get(sha256)
+            if entry and os.path.exists(entry['path']):
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, blob_path)
+                entry = blobs[sha256] = {
+                    'path': blob_path,
+                    'name': file_name,
+                    'size': size if size is not None else os.path.getsize(blob_path),
+                    'refs': []
+                }
+            entry['graceUntil'] = time.time() + UPLOAD_GRACE_PERIOD
+            if ref and ref not in entry['refs']:
+                entry['refs'].append(ref)
+            result['path'] = entry['path']
+
+        result = {}
+        if not self._update(apply):
+            raise OSError(f"Не удалось обновить индекс медиафайлов: {self.index_path}")
+        return result['path']
+
+    def get(self, sha256):
+        """
+        Возвращает сведения о файле по хэшу.
+
+        Возвращает:
+            dict или None: Путь ('path'), исходное имя ('name'), размер ('size') и ссылки ('refs')
+                           или None, если файла нет.
+        """
+        with self._lock:
+            entry = self._blobs.get(sha256)
+            return dict(entry, refs=list(entry['refs'])) if entry else None
+
+    def add_ref(self, sha256, ref):
+        """
+        Добавляет ссылку на файл.
+
+        Аргументы:
+            sha256 (str): Хэш файла.
+            ref (str): Ссылка (например, 'template:<id>' или 'job:<id>').
+
+        Возвращает:
+            bool: True, если файл есть в хранилище и ссылка сохранена.
+        """
+        def apply(blobs):
+            entry = blobs.get(sha256)
+            if entry:
+                if ref not in entry['refs']:
+                    entry['refs'].append(ref)
+                found[0] = True
+
+        found = [False]
+        return self._update(apply) and found[0]
+
+    def release(self, sha256, ref):
+        """
+        Снимает ссылку на файл; файл без ссылок удаляется, если не прошел
+        срок защиты новой загрузки (тогда его удалит collect_garbage).
+
+        Аргументы:
+            sha256 (str): Хэш файла.
+            ref (str): Снимаемая ссылка.
+        """
+        def apply(blobs):
+            entry = blobs.get(sha256)
+            if not entry:
+                return
+            if ref in entry['refs']:
+                entry['refs'].remove(ref)
+            if not entry['refs'] and entry.get('graceUntil', 0) <= time.time():
+                self._remove_blob(blobs, sha256)
+
+        self._update(apply)
+
+    def collect_garbage(self):
+        """
+        Удаляет файлы, на которые не осталось ссылок и срок защиты которых истек,
+        а также брошенные временные файлы загрузок.
+
+        Возвращает:
+            int: Количество удаленных файлов.
+        """
+        now = time.time()
+
+        def apply(blobs):
+            for sha256 in [sha256 for sha256, entry in blobs.items()
+                           if not entry['refs'] and entry.get('graceUntil', 0) <= now]:
+                self._remove_blob(blobs, sha256)
+                removed[0] += 1
+
+        removed = [0]
+        self._update(apply)
+        for name in os.listdir(self.media_dir):
+            path = os.path.join(self.media_dir, name)
+            if name.startswith('upload_') and now - os.path.getmtime(path) > UPLOAD_GRACE_PERIOD:
+                os.remove(path)
+                removed[0] += 1
+        return removed[0]
+
+    @staticmethod
+    def _remove_blob(blobs, sha256):
+        entry = blobs.pop(sha256)
+        if os.path.exists(entry['path']):
+            os.remove(entry['path'])
+
+def save_telegram_media(bot, file_id, file_name, on_progress=None):
+    """
+    Скачивает файл из Telegram и помещает его в общее хранилище медиафайлов.
+
+    Аргументы:
+        bot (telebot.TeleBot): Экземпляр бота Telegram.
+        file_id (str): ID файла в Telegram.
+        file_name (str): Исходное имя файла.
+        on_progress (callable, optional): Ход загрузки, как в download_telegram_file.
+
+    Возвращает:
+        dict: Путь в хранилище ('path'), размер ('size') и SHA-256 ('sha256').
+    """
+    media_store = get_media_store()
+    saved = download_telegram_file(bot, file_id, media_store.upload_path(file_name), on_progress=on_progress)
+    saved['path'] = media_store.put(saved['path'], saved['sha256'], file_name, size=saved['size'])
+    return saved
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_media_store():
+    """
+    Возвращает общее хранилище медиафайлов.
+
+    Возвращает:
+        MediaStore: Хранилище медиафайлов.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MediaStore()
+        return _store
+
+_collector_stopped = threading.Event()
+_collector_thread = None
+
+def _collect_garbage_loop(interval):
+    while True:
+        try:
+            removed = get_media_store().collect_garbage()
+            if removed:
+                logging.info(f"Удалено неиспользуемых медиафайлов: {removed}")
+        except Exception as e:
+            logging.error(f"Ошибка очистки хранилища медиафайлов: {str(e)}")
+        if _collector_stopped.wait(interval):
+            return
+
+def start_garbage_collection(interval=GARBAGE_COLLECTION_INTERVAL):
+    """
+    Запускает фоновую очистку хранилища: файлы без ссылок удаляются сразу и
+    затем раз в interval секунд. Файлы, ссылка на которые снята в течение срока
+    защиты новой загрузки, release не удаляет - их удаляет эта очистка.
+
+    Аргументы:
+        interval (float, optional): Пауза между очистками в секундах.
+    """
+    global _collector_thread
+    with _store_lock:
+        if _collector_thread is not None and _collector_thread.is_alive():
+            return
+        _collector_stopped.clear()
+        _collector_thread = threading.Thread(target=_collect_garbage_loop, args=(interval,), daemon=True)
+        _collector_thread.start()
+
+def stop_garbage_collection():
+    """
+    Останавливает фоновую очистку хранилища.
+    """
+    global _collector_thread
+    _collector_stopped.set()
+    with _store_lock:
+        thread, _collector_thread = _collector_thread, None
+    if thread is not None:
+        thread.join()
@@ -0,0 +1,244 @@
+import logging
+import threading
+import time
+
+from api import get_client_for_profile, InstanceFatalError, DEFAULT_RECEIVE_TIMEOUT
+from broadcast_engine import preflight_check
+from job_store import (
+    get_job_store,
+    RECIPIENT_PENDING,
+    RECIPIENT_FAILED,
+    DELIVERY_SENT,
+    DELIVERY_DELIVERED,
+    DELIVERY_READ,
+    DELIVERY_FAILED
+)
+from utils import get_bot_settings, get_profile_config, get_instance_profiles
+
+# Сколько уведомлений накапливается перед записью в базу одной транзакцией
+NOTIFICATIONS_BATCH_SIZE = 100
+# Как долго статусы могут накапливаться до записи в базу (секунды)
+NOTIFICATIONS_BATCH_TIME = 2.0
+# Пауза после ошибки получения уведомлений (секунды)
+NOTIFICATIONS_ERROR_DELAY = 30
+# Пауза, если уведомлений не было (сам запрос уже ждет до receiveTimeout секунд)
+NOTIFICATIONS_IDLE_DELAY = 1
+
+# Статусы исходящих сообщений Green API (уведомление outgoingMessageStatus)
+# и соответствующие им статусы доставки
+GREEN_API_DELIVERY_STATUSES = {
+    'sent': DELIVERY_SENT,
+    'delivered': DELIVERY_DELIVERED,
+    'read': DELIVERY_READ,
+    'played': DELIVERY_READ,
+    'failed': DELIVERY_FAILED,
+    'noAccount': DELIVERY_FAILED,
+    'notInGroup': DELIVERY_FAILED,
+    'yellowCard': DELIVERY_FAILED
+}
+
+def parse_delivery_status(body):
+    """
+    Извлекает статус доставки из тела уведомления Green API.
+
+    Аргументы:
+        body (dict): Тело уведомления (поле "body" ответа receiveNotification).
+
+    Возвращает:
+        tuple или None: (idMessage, статус доставки) или None, если это не
+                        статус сообщения, отправленного через API.
+    """
+    if not isinstance(body, dict) or body.get('typeWebhook') != 'outgoingMessageStatus':
+        return None
+    # Сообщения, отправленные с телефона, к рассылкам не относятся
+    if body.get('sendByApi') is False:
+        return None
+    status = GREEN_API_DELIVERY_STATUSES.get(body.get('status'))
+    if status is None or not body.get('idMessage'):
+        return None
+    return body['idMessage'], status
+
+class NotificationPoller:
+    """
+    Получает уведомления инстанса Green API (receiveNotification) и записывает
+    статусы доставки отправленных сообщений в хранилище заданий.
+
+    Green API отдает уведомления по одному, и следующее доступно только после
+    удаления предыдущего (deleteNotification), поэтому уведомления удаляются
+    сразу после получения, а статусы накапливаются и записываются в базу
+    порциями. Пропустить уведомление, не удалив его, нельзя, поэтому
+    уведомления других типов (входящие сообщения и т.п.) тоже удаляются из
+    очереди - получение статусов включается явно (см. start_delivery_tracking).
+    """
+
+    def __init__(self, client, store, batch_size=NOTIFICATIONS_BATCH_SIZE,
+                 receive_timeout=DEFAULT_RECEIVE_TIMEOUT):
+        """
+        Аргументы:
+            client (GreenAPIClient): Клиент инстанса.
+            store (JobStore): Хранилище заданий.
+            batch_size (int, optional): Наибольшее количество статусов в одной записи в базу.
+            receive_timeout (int, optional): Время ожидания уведомления в секундах.
+        """
+        self.client = client
+        self.store = store
+        self.batch_size = batch_size
+        self.receive_timeout = receive_timeout
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def poll_once(self):
+        """
+        Забирает уведомления, пока очередь не опустеет, не наберется
+        batch_size статусов или не пройдет NOTIFICATIONS_BATCH_TIME секунд,
+        и записывает статусы в базу.
+
+        Возвращает:
+            int: Количество полученных уведомлений.
+
+        Исключения:
+            InstanceFatalError: Неверный ID инстанса или токен.
+        """
+        statuses = []
+        received = 0
+        deadline = time.monotonic() + NOTIFICATIONS_BATCH_TIME
+        try:
+            while (len(statuses) < self.batch_size and time.monotonic() < deadline
+                   and not self._stopped.is_set()):
+                notification = self.client.receive_notification(self.receive_timeout)
+                if not notification:
+                    break
+                received += 1
+                status = parse_delivery_status(notification.get('body'))
+                if status:
+                    statuses.append(status)
+                if self.client.delete_notification(notification['receiptId']) is None:
+                    # Неудаленное уведомление придет снова, повторная запись статуса безопасна
+                    break
+        finally:
+            self.store.record_deliveries(statuses)
+        return received
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                received = self.poll_once()
+            except InstanceFatalError as e:
+                logging.error(f"Уведомления инстанса {self.client.id_instance} недоступны: {str(e)}")
+                received = None
+            except Exception as e:
+                logging.error(f"Ошибка получения уведомлений инстанса {self.client.id_instance}: {str(e)}")
+                received = None
+            if received is None:
+                self._stopped.wait(NOTIFICATIONS_ERROR_DELAY)
+            elif not received:
+                self._stopped.wait(NOTIFICATIONS_IDLE_DELAY)
+
+    def start(self):
+        """
+        Запускает получение уведомлений в фоновом потоке.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Останавливает получение уведомлений (после завершения текущего запроса).
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+# Запущенные получатели уведомлений по инстансам (ключ - idInstance)
+_pollers = {}
+_pollers_lock = threading.Lock()
+
+def start_notification_pollers(profiles):
+    """
+    Запускает получение уведомлений для инстансов, для которых оно еще не запущено.
+
+    Аргументы:
+        profiles (list): Профили инстансов (см. get_instance_profiles).
+
+    Возвращает:
+        int: Количество запущенных получателей.
+    """
+    started = 0
+    with _pollers_lock:
+        for profile in profiles:
+            instance_id = profile.get('idInstance')
+            if not instance_id or instance_id in _pollers:
+                continue
+            poller = NotificationPoller(get_client_for_profile(profile), get_job_store())
+            poller.start()
+            _pollers[instance_id] = poller
+            started += 1
+    return started
+
+def stop_notification_pollers():
+    """
+    Останавливает все получатели уведомлений; накопленные статусы записываются в базу.
+    """
+    with _pollers_lock:
+        pollers = list(_pollers.values())
+        _pollers.clear()
+    for poller in pollers:
+        poller.stop()
+
+def start_delivery_tracking(profiles=None):
+    """
+    Запускает получение статусов доставки, если оно включено в config/bot.json
+    (ключ "deliveryTracking", по умолчанию выключено). Получатель забирает из
+    очереди инстанса все уведомления, в том числе входящие сообщения, поэтому
+    включать его можно, только если очередь уведомлений больше никто не читает.
+    Без списка профилей используются инстансы из config/profile.json,
+    прошедшие проверку состояния.
+
+    Аргументы:
+        profiles (list, optional): Профили готовых к работе инстансов.
+
+    Возвращает:
+        int: Количество запущенных получателей уведомлений.
+    """
+    if not get_bot_settings()['deliveryTracking']:
+        return 0
+    if profiles is None:
+        profile_config = get_profile_config()
+        if not profile_config:
+            return 0
+        profiles, _ = preflight_check(get_instance_profiles(profile_config))
+    started = start_notification_pollers(profiles)
+    if started:
+        logging.warning(f"Получение статусов доставки запущено для инстансов: {started}. "
+                        f"Все уведомления Green API этих инстансов (включая входящие сообщения) "
+                        f"удаляются из очереди после получения")
+    return started
+
+def format_delivery_report(job, job_stats, delivery_stats):
+    """
+    Формирует текст статистики доставки задания рассылки.
+
+    Аргументы:
+        job (dict): Данные задания.
+        job_stats (dict): Счетчики получателей (JobStore.job_stats).
+        delivery_stats (dict): Счетчики статусов доставки (JobStore.delivery_stats).
+
+    Возвращает:
+        str: Текст отчета.
+    """
+    accepted = sum(delivery_stats.values())
+    delivered = delivery_stats[DELIVERY_DELIVERED] + delivery_stats[DELIVERY_READ]
+    percent = lambda count: f" ({round(count / accepted * 100)}%)" if accepted else ""
+    return (
+        f"📊 Рассылка #{job['id']} от {time.strftime('%d.%m.%Y %H:%M', time.localtime(job['created_at']))} "
+        f"({job['status']})\n"
+        f"📱 Получателей: {job['total']}, ожидают отправки: {job_stats[RECIPIENT_PENDING]}\n"
+        f"📤 Принято Green API: {accepted}, ошибок отправки: {job_stats[RECIPIENT_FAILED]}\n"
+        f"📬 Доставлено: {delivered}{percent(delivered)}\n"
+        f"👀 Прочитано: {delivery_stats[DELIVERY_READ]}{percent(delivery_stats[DELIVERY_READ])}\n"
+        f"❌ Не доставлено: {delivery_stats[DELIVERY_FAILED]}{percent(delivery_stats[DELIVERY_FAILED])}"
+    )
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+
+class TokenBucket:
+    """
+    Ограничитель скорости по алгоритму token bucket.
+
+    Токены пополняются со скоростью rate в секунду (допускаются дробные значения),
+    но не больше burst. Каждая отправка забирает один токен; если токенов нет,
+    отправка резервирует будущий токен и ждет ровно до его появления.
+    Потокобезопасен, поэтому один бюджет можно делить между потоками и циклами asyncio.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        """
+        Аргументы:
+            rate (float): Скорость пополнения, токенов в секунду.
+            burst (int, optional): Максимальное количество токенов (размер пачки). По умолчанию 1.
+            clock (callable, optional): Источник времени в секундах (для тестов).
+        """
+        self._lock = threading.Lock()
+        self._clock = clock
+        self.configure(rate, burst)
+        self._tokens = float(self.burst)
+        self._updated = clock()
+
+    def configure(self, rate, burst=1):
+        """
+        Меняет скорость и размер пачки без сброса накопленных токенов.
+
+        Аргументы:
+            rate (float): Скорость пополнения, токенов в секунду.
+            burst (int, optional): Максимальное количество токенов.
+        """
+        if rate <= 0:
+            raise ValueError("rate должен быть больше нуля")
+        with self._lock:
+            self.rate = float(rate)
+            self.burst = max(1, int(burst))
+            if hasattr(self, '_tokens'):
+                self._tokens = min(self._tokens, self.burst)
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def reserve(self, tokens=1):
+        """
+        Забирает токены (при нехватке - в долг) и возвращает время ожидания.
+
+        Аргументы:
+            tokens (int, optional): Количество токенов. По умолчанию 1.
+
+        Возвращает:
+            float: Сколько секунд нужно подождать перед отправкой (0, если токены есть).
+        """
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def try_acquire(self, tokens=1):
+        """
+        Забирает токены без ожидания.
+
+        Возвращает:
+            bool: True, если токенов хватило, False в противном случае.
+        """
+        with self._lock:
+            self._refill(self._clock())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """
+        Блокирует поток до появления токенов.
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens=1):
+        """
+        Ожидает появления токенов, не блокируя цикл событий.
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+# Бюджеты отправки по инстансам (ключ - idInstance)
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(instance_id, rate, burst=1):
+    """
+    Возвращает общий ограничитель скорости для инстанса. Все рассылки через один
+    инстанс делят один бюджет; при изменении настроек бюджет перенастраивается.
+
+    Аргументы:
+        instance_id (str): ID инстанса Green API.
+        rate (float): Скорость, сообщений в секунду.
+        burst (int, optional): Размер пачки.
+
+    Возвращает:
+        TokenBucket: Ограничитель скорости инстанса.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(instance_id)
+        if limiter is None:
+            limiter = TokenBucket(rate, burst)
+            _limiters[instance_id] = limiter
+        elif limiter.rate != rate or limiter.burst != burst:
+            limiter.configure(rate, burst)
+        return limiter
@@ -0,0 +1,84 @@
+class StateRouter:
+    """
+    Маршрутизатор сообщений по состоянию пользователя.
+
+    Вместо того чтобы регистрировать в telebot отдельный обработчик с фильтром
+    на каждое состояние (telebot проверяет их по очереди, пока один не подойдет),
+    обработчики хранятся в таблице "состояние -> обработчики", а в боте
+    регистрируется один общий обработчик. Поиск обработчика - одно обращение
+    к словарю, поэтому его стоимость не растет с числом состояний.
+
+    Внутри одного состояния обработчики проверяются в порядке регистрации,
+    как и в telebot: более ранний обработчик с подходящими типом и текстом
+    сообщения имеет приоритет.
+    """
+
+    def __init__(self, get_state):
+        """
+        Аргументы:
+            get_state (callable): Функция, возвращающая состояние пользователя по ID чата.
+        """
+        self._get_state = get_state
+        self._routes = {}
+
+    def route(self, *states, content_types=None, text=None):
+        """
+        Декоратор, привязывающий обработчик к одному или нескольким состояниям.
+
+        Аргументы:
+            *states (str): Состояния, в которых вызывается обработчик.
+            content_types (list, optional): Типы сообщений. По умолчанию только ['text'].
+            text (str, optional): Если задан, обработчик вызывается только для сообщения с этим текстом.
+
+        Возвращает:
+            callable: Декоратор, возвращающий обработчик без изменений.
+        """
+        content_types = frozenset(content_types or ['text'])
+
+        def decorator(handler):
+            for state in states:
+                self._routes.setdefault(state, []).append((content_types, text, handler))
+            return handler
+        return decorator
+
+    def resolve(self, message):
+        """
+        Находит обработчик сообщения по текущему состоянию пользователя.
+
+        Аргументы:
+            message (telebot.types.Message): Входящее сообщение.
+
+        Возвращает:
+            callable или None: Обработчик или None, если для сообщения обработчика нет.
+        """
+        routes = self._routes.get(self._get_state(message.chat.id))
+        if not routes:
+            return None
+        for content_types, text, handler in routes:
+            if message.content_type in content_types and (text is None or message.text == text):
+                return handler
+        return None
+
+    def dispatch(self, message):
+        """
+        Передает сообщение найденному обработчику.
+        """
+        handler = self.resolve(message)
+        if handler:
+            handler(message)
+
+    def register(self, bot):
+        """
+        Регистрирует маршрутизатор в боте одним обработчиком сообщений.
+        Вызывается после регистрации всех маршрутов; обработчики, зарегистрированные
+        в боте раньше (например, команды), сохраняют приоритет.
+
+        Аргументы:
+            bot (telebot.TeleBot): Экземпляр бота Telegram.
+        """
+        content_types = sorted({content_type
+                                for routes in self._routes.values()
+                                for content_types, _, _ in routes
+                                for content_type in content_types})
+        bot.message_handler(content_types=content_types,
+                            func=lambda message: self.resolve(message) is not None)(self.dispatch)
@@ -0,0 +1,380 @@
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Путь к базе данных состояний диалогов
+STATE_DB_PATH = os.path.join('data', 'state.db')
+# Через сколько секунд бездействия данные диалога удаляются
+STATE_TTL = 24 * 60 * 60
+# Сколько записей одного хранилища держится в памяти
+STATE_MAX_ENTRIES = 10000
+# Как часто измененные записи сохраняются в постоянное хранилище (секунды)
+STATE_FLUSH_INTERVAL = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_state_updated_at ON state(updated_at);
+"""
+
+class SQLiteStateBackend:
+    """
+    Постоянное хранилище состояний диалогов в SQLite. Значения хранятся
+    в JSON, устаревшие записи удаляются методом expire().
+    """
+
+    def __init__(self, db_path=STATE_DB_PATH):
+        """
+        Аргументы:
+            db_path (str, optional): Путь к файлу базы данных.
+        """
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def load(self, namespace, key, ttl):
+        """
+        Возвращает сохраненное значение в JSON или None, если его нет или оно устарело.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ? AND updated_at >= ?",
+                (namespace, key, time.time() - ttl)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_many(self, namespace, items, ttl):
+        """
+        Сохраняет значения.
+
+        Аргументы:
+            namespace (str): Имя хранилища.
+            items (list): Пары (ключ, значение в JSON).
+            ttl (float): Время жизни записей в секундах.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO state (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                [(namespace, key, value, now) for key, value in items]
+            )
+
+    def delete(self, namespace, key):
+        """
+        Удаляет значение.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def expire(self, ttl):
+        """
+        Удаляет записи, которые не менялись дольше ttl секунд.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM state WHERE updated_at < ?", (time.time() - ttl,))
+
+class RedisStateBackend:
+    """
+    Хранилище состояний диалогов в Redis или совместимом сервере. Используются
+    только команды GET, SET с EX и DELETE, поэтому вместо redis.Redis можно
+    передать любой клиент с такими методами (например, локальную замену для
+    отладки). Устаревшие записи удаляет сам сервер по EX.
+    """
+
+    def __init__(self, client, prefix='telegram_bot:state:'):
+        """
+        Аргументы:
+            client: Клиент Redis (redis.Redis или совместимый объект).
+            prefix (str, optional): Префикс ключей.
+        """
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url):
+        """
+        Подключается к серверу Redis по адресу вида redis://host:6379/0.
+        Требует установленного пакета redis.
+        """
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def _key(self, namespace, key):
+        return f"{self.prefix}{namespace}:{key}"
+
+    def load(self, namespace, key, ttl):
+        value = self.client.get(self._key(namespace, key))
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return value
+
+    def save_many(self, namespace, items, ttl):
+        for key, value in items:
+            self.client.set(self._key(namespace, key), value, ex=max(1, int(ttl)))
+
+    def delete(self, namespace, key):
+        self.client.delete(self._key(namespace, key))
+
+    def expire(self, ttl):
+        pass
+
+class StateStore:
+    """
+    Хранилище данных диалогов пользователей (состояние, введенные на шагах
+    данные) с интерфейсом словаря.
+
+    Записи держатся в памяти как живые объекты, поэтому вложенные словари
+    можно менять на месте, как в обычном dict. Память ограничена: записи,
+    к которым не обращались дольше ttl секунд, удаляются, а при превышении
+    max_entries вытесняются самые давние (LRU). Если подключено постоянное
+    хранилище (SQLite или Redis), записи, к которым обращались, сохраняются
+    в него фоновым потоком раз в STATE_FLUSH_INTERVAL секунд, а при
+    обращении к отсутствующей в памяти записи она загружается из него - так
+    диалоги переживают перезапуск бота.
+    """
+
+    def __init__(self, name, ttl=STATE_TTL, max_entries=STATE_MAX_ENTRIES):
+        """
+        Аргументы:
+            name (str): Имя хранилища (пространство ключей в постоянном хранилище).
+            ttl (float, optional): Время жизни записи без обращений в секундах.
+            max_entries (int, optional): Максимальное количество записей в памяти.
+        """
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = None
+        self._lock = threading.RLock()
+        # ключ -> [значение, время последнего обращения]
+        self._entries = OrderedDict()
+        # Ключи, к которым обращались с прошлого сохранения
+        self._touched = set()
+        # Последний сохраненный JSON и время записи по ключу: неизмененные записи
+        # повторно не пишутся, пока не пройдет половина ttl
+        self._saved = {}
+        _stores.append(self)
+
+    def _touch(self, key, entry):
+        entry[1] = time.monotonic()
+        self._entries.move_to_end(key)
+        if self.backend is not None:
+            self._touched.add(key)
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            if time.monotonic() - entry[1] <= self.ttl:
+                self._touch(key, entry)
+                return entry
+            self._drop(key)
+        if self.backend is None:
+            return None
+        try:
+            value = self.backend.load(self.name, str(key), self.ttl)
+        except Exception as e:
+            logging.error(f"Ошибка чтения состояния {self.name}[{key}]: {str(e)}")
+            return None
+        if value is None:
+            return None
+        self._saved[key] = (value, time.monotonic())
+        return self._insert(key, json.loads(value))
+
+    def _insert(self, key, value):
+        entry = self._entries[key] = [value, time.monotonic()]
+        self._touch(key, entry)
+        while len(self._entries) > self.max_entries:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            # Вытесняемая запись сохраняется, чтобы ее можно было загрузить позже
+            if evicted_key in self._touched:
+                self._touched.discard(evicted_key)
+                self._save([(evicted_key, evicted[0])])
+            self._saved.pop(evicted_key, None)
+        return entry
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        self._touched.discard(key)
+        self._saved.pop(key, None)
+
+    def __getitem__(self, key):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                raise KeyError(key)
+            return entry[0]
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._lookup(key)
+            return entry[0] if entry is not None else default
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup(key) is not None
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._insert(key, value)
+            else:
+                entry[0] = value
+                self._touch(key, entry)
+
+    def setdefault(self, key, default=None):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                entry = self._insert(key, default)
+            return entry[0]
+
+    def __delitem__(self, key):
+        with self._lock:
+            if self._lookup(key) is None:
+                raise KeyError(key)
+            self._remove(key)
+
+    def pop(self, key, *default):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                if default:
+                    return default[0]
+                raise KeyError(key)
+            self._remove(key)
+            return entry[0]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _remove(self, key):
+        self._drop(key)
+        if self.backend is not None:
+            try:
+                self.backend.delete(self.name, str(key))
+            except Exception as e:
+                logging.error(f"Ошибка удаления состояния {self.name}[{key}]: {str(e)}")
+
+    def _save(self, items):
+        changed = []
+        for key, value in items:
+            try:
+                serialized = json.dumps(value, ensure_ascii=False)
+            except RuntimeError:
+                # Значение изменили из другого потока во время сериализации - повторим позже
+                self._touched.add(key)
+                continue
+            except (TypeError, ValueError) as e:
+                logging.warning(f"Состояние {self.name}[{key}] не сохранено: {str(e)}")
+                continue
+            saved = self._saved.get(key)
+            if saved is None or saved[0] != serialized or time.monotonic() - saved[1] > self.ttl / 2:
+                changed.append((key, serialized))
+        if not changed:
+            return
+        try:
+            self.backend.save_many(self.name, [(str(key), serialized) for key, serialized in changed], self.ttl)
+        except Exception as e:
+            logging.error(f"Ошибка сохранения состояний {self.name}: {str(e)}")
+            return
+        now = time.monotonic()
+        for key, serialized in changed:
+            self._saved[key] = (serialized, now)
+
+    def flush(self):
+        """
+        Удаляет устаревшие записи из памяти и сохраняет в постоянное хранилище
+        записи, к которым обращались с прошлого сохранения.
+        """
+        with self._lock:
+            now = time.monotonic()
+            # Записи упорядочены по времени обращения: устаревшие - в начале
+            while self._entries:
+                key, entry = next(iter(self._entries.items()))
+                if now - entry[1] <= self.ttl:
+                    break
+                self._drop(key)
+            if self.backend is None or not self._touched:
+                return
+            touched, self._touched = self._touched, set()
+            self._save([(key, self._entries[key][0]) for key in touched if key in self._entries])
+
+_stores = []
+_flusher = None
+_flusher_lock = threading.Lock()
+
+def create_state_backend(settings):
+    """
+    Создает постоянное хранилище состояний по настройкам бота.
+
+    Аргументы:
+        settings (dict): Настройки из get_bot_settings(): 'stateStore' ('memory',
+                         'sqlite' или 'redis'), 'stateDbPath', 'redisUrl'.
+
+    Возвращает:
+        SQLiteStateBackend, RedisStateBackend или None для хранения только в памяти.
+    """
+    kind = settings.get('stateStore', 'memory')
+    if kind == 'sqlite':
+        return SQLiteStateBackend(settings.get('stateDbPath') or STATE_DB_PATH)
+    if kind == 'redis':
+        return RedisStateBackend.from_url(settings['redisUrl'])
+    if kind != 'memory':
+        logging.warning(f"Неизвестный тип хранилища состояний '{kind}', используется память")
+    return None
+
+def flush_state_stores():
+    """
+    Сохраняет изменения всех хранилищ состояний.
+    """
+    for store in _stores:
+        store.flush()
+
+def _flush_loop(backend, ttl):
+    last_expire = time.monotonic()
+    while True:
+        time.sleep(STATE_FLUSH_INTERVAL)
+        flush_state_stores()
+        if backend is not None and time.monotonic() - last_expire > 60:
+            last_expire = time.monotonic()
+            try:
+                backend.expire(ttl)
+            except Exception as e:
+                logging.error(f"Ошибка очистки устаревших состояний: {str(e)}")
+
+def configure_state_stores(backend=None, ttl=STATE_TTL, max_entries=STATE_MAX_ENTRIES):
+    """
+    Подключает постоянное хранилище ко всем хранилищам состояний и запускает
+    фоновый поток, который сохраняет изменения и удаляет устаревшие записи.
+
+    Аргументы:
+        backend (optional): SQLiteStateBackend, RedisStateBackend или None (только память).
+        ttl (float, optional): Время жизни записи без обращений в секундах.
+        max_entries (int, optional): Максимальное количество записей одного хранилища в памяти.
+    """
+    global _flusher
+    for store in _stores:
+        with store._lock:
+            store.backend = backend
+            store.ttl = ttl
+            store.max_entries = max_entries
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, args=(backend, ttl), daemon=True)
+            _flusher.start()
+            atexit.register(flush_state_stores)
@@ -0,0 +1,175 @@
+import hashlib
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+# Путь к базе данных индекса исключений
+SUPPRESSION_DB_PATH = os.path.join('data', 'suppression.db')
+
+# Сколько номеров проверяется одним запросом к базе
+FILTER_BATCH_SIZE = 500
+
+# Кампания 0 - глобальный список: номера из него не получают никаких рассылок
+GLOBAL_CAMPAIGN = 0
+
+# Причины исключения номера
+REASON_OPTOUT = 'optout'
+REASON_SENT = 'sent'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS suppressed (
+    campaign INTEGER NOT NULL,
+    phone INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (campaign, phone)
+) WITHOUT ROWID;
+"""
+
+def campaign_key(message, media=None):
+    """
+    Вычисляет ключ кампании по содержимому рассылки: рассылки с одинаковым
+    текстом и медиафайлом считаются одной кампанией.
+
+    Аргументы:
+        message (str): Текст сообщения.
+        media (dict или None): Медиафайл рассылки (используется его хэш).
+
+    Возвращает:
+        int: Положительный ключ кампании (не совпадает с GLOBAL_CAMPAIGN).
+    """
+    digest = hashlib.sha1()
+    digest.update((message or '').encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(((media or {}).get('hash') or '').encode('utf-8'))
+    # 60 бит хэша помещаются в INTEGER SQLite
+    return int(digest.hexdigest()[:15], 16) or 1
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+class SuppressionIndex:
+    """
+    Постоянный индекс исключенных номеров в SQLite. Номера хранятся как целые
+    числа (нормализованный вид 7XXXXXXXXXX) в наборах по кампаниям: глобальный
+    набор (GLOBAL_CAMPAIGN) - номера, отказавшиеся от всех рассылок, наборы
+    кампаний - номера, отказавшиеся от конкретной рассылки или уже получившие ее.
+    """
+
+    def __init__(self, db_path=SUPPRESSION_DB_PATH):
+        """
+        Аргументы:
+            db_path (str, optional): Путь к файлу базы данных.
+        """
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def add(self, phone_numbers, campaign=GLOBAL_CAMPAIGN, reason=REASON_OPTOUT, batch_size=FILTER_BATCH_SIZE):
+        """
+        Добавляет номера в набор исключений кампании.
+
+        Аргументы:
+            phone_numbers (iterable): Нормализованные номера (строки или числа, могут читаться лениво).
+            campaign (int, optional): Ключ кампании; по умолчанию глобальный набор.
+            reason (str, optional): Причина исключения (REASON_OPTOUT или REASON_SENT).
+            batch_size (int, optional): Размер порции при записи.
+
+        Возвращает:
+            int: Количество добавленных номеров (без уже исключенных).
+        """
+        added = 0
+        now = time.time()
+        for batch in _batches(phone_numbers, batch_size):
+            with self._lock, self._conn:
+                cursor = self._conn.executemany(
+                    "INSERT OR IGNORE INTO suppressed (campaign, phone, reason, created_at) VALUES (?, ?, ?, ?)",
+                    [(campaign, int(phone), reason, now) for phone in batch]
+                )
+                added += cursor.rowcount
+        return added
+
+    def remove(self, phone_numbers, campaign=GLOBAL_CAMPAIGN):
+        """
+        Удаляет номера из набора исключений кампании.
+
+        Возвращает:
+            int: Количество удаленных номеров.
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.executemany(
+                "DELETE FROM suppressed WHERE campaign = ? AND phone = ?",
+                [(campaign, int(phone)) for phone in phone_numbers]
+            )
+            return cursor.rowcount
+
+    def filter(self, phone_numbers, campaign=None, stats=None, batch_size=FILTER_BATCH_SIZE):
+        """
+        Лениво отбрасывает исключенные номера: из глобального набора и, если
+        задана кампания, из ее набора. Номера проверяются порциями - один
+        запрос к базе на batch_size номеров.
+
+        Аргументы:
+            phone_numbers (iterable): Нормализованные номера в виде строк или
+                                      пары (номер, данные получателя).
+            campaign (int, optional): Ключ кампании.
+            stats (dict, optional): Если передан, в него записывается счетчик 'suppressed'.
+            batch_size (int, optional): Размер порции.
+
+        Возвращает:
+            generator: Номера (или пары), которым можно отправлять сообщения.
+        """
+        if stats is None:
+            stats = {}
+        stats['suppressed'] = 0
+        campaigns = [GLOBAL_CAMPAIGN] if campaign is None else [GLOBAL_CAMPAIGN, campaign]
+        for batch in _batches(phone_numbers, batch_size):
+            keys = [int(item[0] if isinstance(item, tuple) else item) for item in batch]
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT phone FROM suppressed WHERE campaign IN ({','.join('?' * len(campaigns))}) "
+                    f"AND phone IN ({','.join('?' * len(keys))})",
+                    campaigns + keys
+                ).fetchall()
+            blocked = {row[0] for row in rows}
+            for item, key in zip(batch, keys):
+                if key in blocked:
+                    stats['suppressed'] += 1
+                else:
+                    yield item
+
+    def count(self, campaign=GLOBAL_CAMPAIGN):
+        """
+        Возвращает количество номеров в наборе исключений кампании.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM suppressed WHERE campaign = ?", (campaign,)
+            ).fetchone()[0]
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_suppression_index():
+    """
+    Возвращает общий индекс исключений, открывая базу при первом обращении.
+
+    Возвращает:
+        SuppressionIndex: Индекс исключений.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SuppressionIndex()
+        return _index
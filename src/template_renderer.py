@@ -0,0 +1,114 @@
+import functools
+import re
+
+# Подстановка {поле}: заменяется, только если в файле с номерами есть такой столбец
+PLACEHOLDER_RE = re.compile(r'\{(\w+)\}')
+
+# Сколько скомпилированных текстов хранится в кэше
+RENDERERS_CACHE_SIZE = 128
+
+def normalize_field_name(name):
+    """
+    Приводит название поля (заголовок столбца или имя в подстановке) к виду,
+    в котором они сравниваются: без пробелов по краям, в нижнем регистре,
+    пробелы внутри заменены на "_" ("Имя клиента" -> "имя_клиента").
+
+    Аргументы:
+        name: Название поля.
+
+    Возвращает:
+        str: Нормализованное название.
+    """
+    return re.sub(r'\s+', '_', str(name).strip()).lower()
+
+def find_placeholders(text):
+    """
+    Возвращает названия всех подстановок вида {name} в тексте, независимо
+    от того, есть ли такие столбцы в файле с номерами.
+
+    Аргументы:
+        text (str): Текст сообщения.
+
+    Возвращает:
+        tuple: Нормализованные названия в порядке первого появления.
+    """
+    return tuple(dict.fromkeys(normalize_field_name(name) for name in PLACEHOLDER_RE.findall(text or '')))
+
+def _escape_format(text):
+    return text.replace('{', '{{').replace('}', '}}')
+
+class TemplateRenderer:
+    """
+    Скомпилированный текст сообщения с подстановками вида {name}.
+
+    Текст разбирается один раз: подстановки заменяются позиционными полями
+    строки формата, поэтому подстановка значений для очередного получателя -
+    это один вызов str.format без повторного разбора текста. Заменяются
+    только подстановки, названия которых совпадают со столбцами файла;
+    остальной текст, включая другие фигурные скобки, отправляется как есть.
+    """
+
+    __slots__ = ('text', 'fields', '_format')
+
+    def __init__(self, text, columns=()):
+        """
+        Аргументы:
+            text (str): Текст сообщения.
+            columns (iterable, optional): Нормализованные названия столбцов файла с номерами.
+        """
+        known = set(columns)
+        parts = []
+        fields = []
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(text):
+            name = normalize_field_name(match.group(1))
+            if name not in known:
+                continue
+            parts.append(_escape_format(text[position:match.start()]))
+            parts.append('{}')
+            fields.append(name)
+            position = match.end()
+        parts.append(_escape_format(text[position:]))
+
+        self.text = text
+        # Поля в порядке появления в тексте (с повторами)
+        self.fields = tuple(fields)
+        self._format = ''.join(parts)
+
+    @property
+    def field_names(self):
+        """
+        Уникальные названия полей в порядке первого появления в тексте.
+        """
+        return tuple(dict.fromkeys(self.fields))
+
+    def render(self, values=None):
+        """
+        Подставляет значения полей в текст.
+
+        Аргументы:
+            values (dict, optional): Значения полей по нормализованным названиям.
+
+        Возвращает:
+            str: Готовый текст сообщения.
+        """
+        if not self.fields:
+            return self.text
+        get = (values or {}).get
+        return self._format.format(*[get(name, '') for name in self.fields])
+
+@functools.lru_cache(maxsize=RENDERERS_CACHE_SIZE)
+def compile_template(text, columns=()):
+    """
+    Возвращает скомпилированный текст сообщения. Один и тот же текст
+    с одними и теми же столбцами компилируется один раз.
+
+    Аргументы:
+        text (str): Текст сообщения.
+        columns (tuple, optional): Нормализованные названия столбцов файла с номерами.
+                                   Без столбцов текст отправляется без изменений.
+
+    Возвращает:
+        TemplateRenderer: Скомпилированный текст.
+    """
+    return TemplateRenderer(text or '', columns)
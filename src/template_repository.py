@@ -0,0 +1,217 @@
+import itertools
+import os
+import threading
+import uuid
+
+from utils import load_config, save_config, TEMPLATES_CONFIG_PATH
+
+# Количество шаблонов на одной странице списка
+TEMPLATES_PAGE_SIZE = 8
+
+class TemplateRepository:
+    """
+    Хранилище шаблонов сообщений поверх config/templates.json.
+
+    Шаблоны держатся в памяти в словаре по ID (в порядке создания) с
+    дополнительным индексом по названию, поэтому поиск, изменение и удаление
+    одного шаблона не перебирают весь список. Каждое изменение сохраняется
+    в файл атомарно. Если файл изменили вручную, при следующем обращении
+    шаблоны перечитываются.
+    """
+
+    def __init__(self, config_path=TEMPLATES_CONFIG_PATH):
+        """
+        Аргументы:
+            config_path (str, optional): Путь к JSON файлу шаблонов.
+        """
+        self.config_path = config_path
+        self._lock = threading.RLock()
+        self._signature = None
+        self._by_id = {}
+        self._by_name = {}
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.config_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _ensure_loaded(self):
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        templates_config = load_config(self.config_path) if signature else None
+        self._by_id = {}
+        self._by_name = {}
+        for template in (templates_config or {}).get('templates') or []:
+            self._add_to_index(template)
+        self._signature = signature
+
+    def _add_to_index(self, template):
+        self._by_id[template['id']] = template
+        self._by_name.setdefault(template['name'], []).append(template['id'])
+
+    def _remove_name(self, name, template_id):
+        ids = self._by_name.get(name)
+        if ids and template_id in ids:
+            ids.remove(template_id)
+            if not ids:
+                del self._by_name[name]
+
+    def _save(self):
+        success = save_config(self.config_path, {'templates': list(self._by_id.values())})
+        # При ошибке записи изменения в памяти отбрасываются: при следующем
+        # обращении шаблоны перечитываются из файла
+        self._signature = self._file_signature() if success else False
+        return success
+
+    def list(self):
+        """
+        Возвращает все шаблоны в порядке создания.
+
+        Возвращает:
+            list: Копии словарей с данными шаблонов.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return [dict(template) for template in self._by_id.values()]
+
+    def count(self):
+        """
+        Возвращает количество шаблонов.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._by_id)
+
+    def page(self, page, page_size=TEMPLATES_PAGE_SIZE):
+        """
+        Возвращает одну страницу списка шаблонов.
+
+        Аргументы:
+            page (int): Номер страницы (с 1); номер вне диапазона приводится к ближайшей странице.
+            page_size (int, optional): Количество шаблонов на странице.
+
+        Возвращает:
+            tuple: (копии шаблонов страницы, номер страницы, общее количество страниц).
+        """
+        with self._lock:
+            self._ensure_loaded()
+            total_pages = max(1, -(-len(self._by_id) // page_size))
+            page = min(max(1, page), total_pages)
+            start = (page - 1) * page_size
+            templates = [dict(template) for template in
+                         itertools.islice(self._by_id.values(), start, start + page_size)]
+            return templates, page, total_pages
+
+    def get(self, template_id):
+        """
+        Возвращает шаблон по ID.
+
+        Возвращает:
+            dict или None: Копия данных шаблона или None, если шаблон не найден.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            template = self._by_id.get(template_id)
+            return dict(template) if template else None
+
+    def find_by_name(self, name):
+        """
+        Возвращает шаблон по названию (первый из созданных, если названия совпадают).
+
+        Возвращает:
+            dict или None: Копия данных шаблона или None, если шаблон не найден.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            ids = self._by_name.get(name)
+            return dict(self._by_id[ids[0]]) if ids else None
+
+    def create(self, name, text, file_path=None, file_hash=None):
+        """
+        Создает шаблон.
+
+        Аргументы:
+            name (str): Название шаблона.
+            text (str): Текст шаблона.
+            file_path (str, optional): Путь к файлу шаблона.
+            file_hash (str, optional): Хэш файла в хранилище медиафайлов.
+
+        Возвращает:
+            dict или None: Созданный шаблон или None в случае ошибки сохранения.
+        """
+        template = {
+            'id': str(uuid.uuid4()),
+            'name': name,
+            'text': text,
+            'hasFile': bool(file_path),
+            'filePath': file_path,
+            'fileHash': file_hash
+        }
+        with self._lock:
+            self._ensure_loaded()
+            self._add_to_index(template)
+            if not self._save():
+                return None
+        return dict(template)
+
+    def update(self, template_id, **fields):
+        """
+        Обновляет поля шаблона.
+
+        Аргументы:
+            template_id (str): ID шаблона.
+            **fields: Новые значения полей шаблона.
+
+        Возвращает:
+            bool: True в случае успеха, False если шаблон не найден или не сохранен.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            template = self._by_id.get(template_id)
+            if template is None:
+                return False
+            previous_name = template['name']
+            template.update(fields)
+            if template['name'] != previous_name:
+                self._remove_name(previous_name, template_id)
+                self._by_name.setdefault(template['name'], []).append(template_id)
+            return self._save()
+
+    def delete(self, template_id):
+        """
+        Удаляет шаблон.
+
+        Аргументы:
+            template_id (str): ID шаблона.
+
+        Возвращает:
+            dict или None: Удаленный шаблон или None, если шаблон не найден или изменение не сохранено.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            template = self._by_id.pop(template_id, None)
+            if template is None:
+                return None
+            self._remove_name(template['name'], template_id)
+            if not self._save():
+                return None
+            return template
+
+_repository = None
+_repository_lock = threading.Lock()
+
+def get_template_repository():
+    """
+    Возвращает общее хранилище шаблонов.
+
+    Возвращает:
+        TemplateRepository: Хранилище шаблонов.
+    """
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = TemplateRepository()
+        return _repository
@@ -1,21 +1,87 @@
 import pandas as pd
+import copy
+import csv
 import json
 import os
 import re
+import tempfile
+import threading
+from openpyxl import load_workbook
+
+from template_renderer import normalize_field_name
+
+# Пути к конфигурационным файлам
+PROFILE_CONFIG_PATH = os.path.join('config', 'profile.json')
+INTERVAL_CONFIG_PATH = os.path.join('config', 'interval.json')
+TEMPLATES_CONFIG_PATH = os.path.join('config', 'templates.json')
+BOT_CONFIG_PATH = os.path.join('config', 'bot.json')
+
+# Настройки запуска бота по умолчанию (config/bot.json)
+DEFAULT_BOT_SETTINGS = {
+    'mode': 'polling',
+    'pollingTimeout': 20,
+    'webhookUrl': '',
+    'webhookHost': '0.0.0.0',
+    'webhookPort': 8443,
+    'webhookPath': '/webhook',
+    'secretToken': '',
+    'queueSize': 1000,
+    'workers': 4,
+    'stateStore': 'memory',
+    'stateDbPath': os.path.join('data', 'state.db'),
+    'redisUrl': '',
+    'stateTtl': 24 * 60 * 60,
+    'stateMaxEntries': 10000,
+    'deliveryTracking': False
+}
+
+# Кэш разобранных конфигураций: абсолютный путь -> ((mtime, размер), данные)
+_config_cache = {}
+_config_cache_lock = threading.Lock()
+# Блокировки записи по файлам: одновременно изменять файл может только один поток
+_config_write_locks = {}
+_config_write_locks_lock = threading.Lock()
+# Счетчики обращений к конфигурации: разборы файла с диска и попадания в кэш
+_config_stats = {'parses': 0, 'hits': 0}
+
+# Номера телефонов находятся во втором столбце файла
+PHONE_COLUMN = 1
+# Количество номеров, обрабатываемых за один шаг при потоковом чтении
+CHUNK_SIZE = 10000
+
+def _file_signature(config_file):
+    stat = os.stat(config_file)
+    return (stat.st_mtime_ns, stat.st_size)
 
 def load_config(config_file):
     """
     Загружает конфигурацию из JSON файла.
+    Разобранные данные кэшируются до изменения файла (по времени изменения и размеру)
+    или до записи через save_config, поэтому повторные вызовы не читают диск.
 
     Аргументы:
         config_file (str): Путь к JSON файлу конфигурации.
 
     Возвращает:
         dict или None: Словарь с конфигурацией в случае успеха, None в случае ошибки.
+                       Возвращается копия - ее можно изменять, не затрагивая кэш.
     """
+    key = os.path.abspath(config_file)
     try:
+        signature = _file_signature(config_file)
+        with _config_cache_lock:
+            cached = _config_cache.get(key)
+            if cached and cached[0] == signature:
+                _config_stats['hits'] += 1
+                return copy.deepcopy(cached[1])
+
         with open(config_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            data = json.load(f)
+
+        with _config_cache_lock:
+            _config_stats['parses'] += 1
+            _config_cache[key] = (signature, data)
+        return copy.deepcopy(data)
     except FileNotFoundError:
         print(f"Ошибка: Файл конфигурации не найден: {config_file}")
         return None
@@ -26,9 +92,21 @@ def load_config(config_file):
         print(f"Ошибка при загрузке конфигурации из {config_file}: {e}")
         return None
 
+def _get_write_lock(config_file):
+    key = os.path.abspath(config_file)
+    with _config_write_locks_lock:
+        lock = _config_write_locks.get(key)
+        if lock is None:
+            lock = threading.RLock()
+            _config_write_locks[key] = lock
+        return lock
+
 def save_config(config_file, config_data):
     """
-    Сохраняет конфигурацию в JSON файл.
+    Атомарно сохраняет конфигурацию в JSON файл и обновляет кэш.
+    Данные пишутся во временный файл в той же папке, сбрасываются на диск (fsync)
+    и только затем подменяют исходный файл, поэтому сбой во время записи
+    не оставляет файл обрезанным.
 
     Аргументы:
         config_file (str): Путь к JSON файлу конфигурации.
@@ -37,34 +115,375 @@ def save_config(config_file, config_data):
     Возвращает:
         bool: True в случае успеха, False в случае ошибки.
     """
+    key = os.path.abspath(config_file)
+    temp_path = None
     try:
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(config_data, f, ensure_ascii=False, indent=2)
+        with _get_write_lock(config_file):
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(key), prefix='.tmp_', suffix='.json')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(config_data, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, config_file)
+            temp_path = None
+            with _config_cache_lock:
+                _config_cache[key] = (_file_signature(config_file), copy.deepcopy(config_data))
         return True
     except Exception as e:
+        with _config_cache_lock:
+            _config_cache.pop(key, None)
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
         print(f"Ошибка при сохранении конфигурации в {config_file}: {e}")
         return False
 
+def update_config(config_file, update_func, default=None):
+    """
+    Изменяет конфигурацию под блокировкой файла: загрузка, изменение и сохранение
+    выполняются как одна операция, поэтому одновременные правки из разных
+    обработчиков не теряют изменения друг друга.
+
+    Аргументы:
+        config_file (str): Путь к JSON файлу конфигурации.
+        update_func (callable): Функция, изменяющая словарь конфигурации на месте.
+        default (dict, optional): Данные, с которых начать, если файл не удалось загрузить.
+                                  Если не заданы, ошибка загрузки прерывает операцию.
+
+    Возвращает:
+        bool: True в случае успеха, False в случае ошибки.
+    """
+    with _get_write_lock(config_file):
+        config_data = load_config(config_file)
+        if config_data is None:
+            if default is None:
+                return False
+            config_data = copy.deepcopy(default)
+        update_func(config_data)
+        return save_config(config_file, config_data)
+
+def get_config_stats():
+    """
+    Возвращает счетчики обращений к конфигурации.
+
+    Возвращает:
+        dict: 'parses' - сколько раз файлы читались и разбирались с диска,
+              'hits' - сколько раз данные взяты из кэша.
+    """
+    with _config_cache_lock:
+        return dict(_config_stats)
+
+def get_profile_config():
+    """
+    Возвращает профиль Green API из config/profile.json.
+
+    Возвращает:
+        dict или None: Данные профиля или None, если профиль не загружен.
+    """
+    return load_config(PROFILE_CONFIG_PATH)
+
+def get_interval_settings():
+    """
+    Возвращает настройки скорости рассылки из config/interval.json.
+
+    Возвращает:
+        tuple: (интервал в секундах (float), размер пачки (int)). При отсутствии
+               или ошибке в настройках - значения по умолчанию (5, 1).
+    """
+    interval_config = load_config(INTERVAL_CONFIG_PATH) or {}
+    interval = parse_interval(interval_config.get('interval', 5)) or 5.0
+    burst = int(interval_config.get('burst', 1)) if is_valid_burst(interval_config.get('burst', 1)) else 1
+    return interval, burst
+
+def get_bot_settings():
+    """
+    Возвращает настройки запуска бота из config/bot.json, дополненные значениями
+    по умолчанию для отсутствующих ключей.
+
+    Возвращает:
+        dict: Настройки запуска (режим 'polling' или 'webhook' и параметры режима).
+    """
+    bot_settings = dict(DEFAULT_BOT_SETTINGS)
+    bot_settings.update(load_config(BOT_CONFIG_PATH) or {})
+    return bot_settings
+
+def _cell_to_str(value):
+    """
+    Преобразует значение ячейки в строку. Целые числа, прочитанные как float
+    (например, 79001234567.0), записываются без дробной части.
+    """
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+def _iter_xlsx_rows(file_path):
+    """
+    Построчно читает лист .xlsx в режиме read-only, не загружая файл целиком в память.
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield row
+    finally:
+        workbook.close()
+
+def _iter_xls_rows(file_path):
+    """
+    Читает старый формат .xls (openpyxl его не поддерживает, поэтому через pandas).
+    """
+    df = pd.read_excel(file_path, header=None, dtype=object)
+    for row in df.itertuples(index=False, name=None):
+        yield tuple(None if pd.isna(value) else value for value in row)
+
+def _iter_csv_rows(file_path):
+    """
+    Построчно читает CSV файл. Разделитель (",", ";" или табуляция) определяется автоматически.
+    """
+    with open(file_path, 'r', encoding='utf-8-sig', newline='') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        for row in csv.reader(f, dialect):
+            yield row
+
+def _iter_rows(file_path):
+    """
+    Построчно читает файл (.xlsx, .xls или .csv) в зависимости от расширения.
+    """
+    extension = get_file_extension(file_path).lower()
+    if extension == 'csv':
+        return _iter_csv_rows(file_path)
+    if extension == 'xls':
+        return _iter_xls_rows(file_path)
+    return _iter_xlsx_rows(file_path)
+
+def _cell_to_phone(value):
+    """
+    Нормализует номер из ячейки так же, как normalize_phone_series (с отбрасыванием ".0").
+
+    Возвращает:
+        str или None: Номер в формате 7XXXXXXXXXX или None, если номер некорректен.
+    """
+    if value is None:
+        return None
+    return normalize_phone_number(re.sub(r'\.0+$', '', _cell_to_str(value)))
+
+def read_columns(file_path, column=PHONE_COLUMN):
+    """
+    Читает строку заголовков файла с номерами: названия столбцов можно
+    использовать в тексте рассылки как подстановки ({имя}, {город}).
+    Первая строка считается заголовком, если в столбце номеров у нее
+    нет корректного номера.
+
+    Аргументы:
+        file_path (str): Путь к файлу (.xlsx, .xls или .csv).
+        column (int, optional): Индекс столбца с номерами.
+
+    Возвращает:
+        dict: Нормализованные названия столбцов и их индексы (пустой, если заголовка нет).
+    """
+    first_row = next(iter(_iter_rows(file_path)), None)
+    if not first_row:
+        return {}
+    if len(first_row) > column and _cell_to_phone(first_row[column]):
+        return {}
+    columns = {}
+    for index, value in enumerate(first_row):
+        name = normalize_field_name(_cell_to_str(value)) if value is not None else ''
+        if re.fullmatch(r'\w+', name) and name not in columns:
+            columns[name] = index
+    return columns
+
+def _iter_row_chunks(file_path, column=PHONE_COLUMN, chunk_size=CHUNK_SIZE):
+    """
+    Потоково читает строки файла порциями, пропуская строки с пустой ячейкой номера.
+
+    Возвращает:
+        generator: Пары (список строк, список строковых значений ячеек с номерами).
+    """
+    rows = []
+    values = []
+    for row in _iter_rows(file_path):
+        if len(row) <= column or row[column] is None:
+            continue
+        value = _cell_to_str(row[column])
+        if not value:
+            continue
+        rows.append(row)
+        values.append(value)
+        if len(values) >= chunk_size:
+            yield rows, values
+            rows = []
+            values = []
+    if values:
+        yield rows, values
+
+def iter_phone_chunks(file_path, column=PHONE_COLUMN, chunk_size=CHUNK_SIZE):
+    """
+    Потоково читает номера телефонов из файла (.xlsx, .xls или .csv) порциями.
+    Память расходуется только на одну порцию, независимо от размера файла.
+
+    Аргументы:
+        file_path (str): Путь к файлу.
+        column (int, optional): Индекс столбца с номерами. По умолчанию второй столбец.
+        chunk_size (int, optional): Количество значений в одной порции.
+
+    Возвращает:
+        generator: Списки строковых значений ячеек (пустые ячейки пропускаются).
+    """
+    for _, values in _iter_row_chunks(file_path, column, chunk_size):
+        yield values
+
+def _normalize_phone_digits(values):
+    """
+    Нормализует порцию номеров (см. normalize_phone_series), сохраняя их позиции.
+
+    Возвращает:
+        tuple: (pandas.Series с цифрами номеров, булева маска корректных номеров).
+    """
+    series = pd.Series(values, dtype='string')
+    digits = (
+        series.str.replace(r'\.0+$', '', regex=True)
+              .str.replace(r'\D', '', regex=True)
+              .str.replace(r'^8', '7', regex=True)
+    )
+    valid_mask = (digits.str.len() == 11).fillna(False).astype(bool)
+    return digits, valid_mask
+
+def normalize_phone_series(values):
+    """
+    Векторно нормализует порцию номеров телефонов строковыми операциями pandas
+    (те же шаги, что normalize_phone_number, но сразу для всего столбца):
+    1. Отбрасывает дробную часть ".0", появляющуюся у чисел из Excel.
+    2. Удаляет все нецифровые символы.
+    3. Заменяет первую цифру '8' на '7'.
+    4. Оставляет только номера из 11 цифр.
+
+    Аргументы:
+        values (list): Значения ячеек в виде строк.
+
+    Возвращает:
+        tuple: (список нормализованных номеров, количество некорректных значений).
+    """
+    digits, valid_mask = _normalize_phone_digits(values)
+    return digits[valid_mask].tolist(), int((~valid_mask).sum())
+
+def iter_recipient_fields(file_path, columns, column=PHONE_COLUMN, stats=None):
+    """
+    Лениво перебирает получателей вместе со значениями столбцов для
+    подстановки в текст. Номера нормализуются порциями (normalize_phone_series)
+    и отбираются так же, как в iter_phone_numbers; для повторяющегося номера
+    берется первая строка.
+
+    Аргументы:
+        file_path (str): Путь к файлу (.xlsx, .xls или .csv).
+        columns (dict): Названия полей и индексы столбцов (см. read_columns).
+        column (int, optional): Индекс столбца с номерами.
+        stats (dict, optional): Если передан, в него записываются счетчики
+                                'valid', 'invalid' и 'duplicates'.
+
+    Возвращает:
+        generator: Пары (номер в формате 7XXXXXXXXXX, словарь значений полей).
+    """
+    if stats is None:
+        stats = {}
+    stats.update(valid=0, invalid=0, duplicates=0)
+
+    seen = set()
+    for rows, values in _iter_row_chunks(file_path, column):
+        digits, valid_mask = _normalize_phone_digits(values)
+        stats['invalid'] += int((~valid_mask).sum())
+        for row, phone, valid in zip(rows, digits.tolist(), valid_mask.tolist()):
+            if not valid:
+                continue
+            key = int(phone)
+            if key in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add(key)
+            stats['valid'] += 1
+            yield phone, {
+                name: _cell_to_str(row[index]) if index < len(row) and row[index] is not None else ''
+                for name, index in columns.items()
+            }
+
+def iter_phone_numbers(file_path, column=PHONE_COLUMN, stats=None):
+    """
+    Лениво перебирает нормализованные уникальные номера телефонов из файла.
+    Некорректные значения (заголовки, "nan", слишком короткие номера) отбрасываются.
+    Для исключения дубликатов хранит компактный набор целочисленных ключей,
+    а не сами строки.
+
+    Аргументы:
+        file_path (str): Путь к файлу (.xlsx, .xls или .csv).
+        column (int, optional): Индекс столбца с номерами.
+        stats (dict, optional): Если передан, в него записываются счетчики
+                                'valid', 'invalid' и 'duplicates'.
+
+    Возвращает:
+        generator: Номера телефонов в формате 7XXXXXXXXXX без повторов.
+    """
+    if stats is None:
+        stats = {}
+    stats.update(valid=0, invalid=0, duplicates=0)
+
+    seen = set()
+    for chunk in iter_phone_chunks(file_path, column):
+        phone_numbers, invalid = normalize_phone_series(chunk)
+        stats['invalid'] += invalid
+        for phone in phone_numbers:
+            key = int(phone)
+            if key in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add(key)
+            stats['valid'] += 1
+            yield phone
+
+def scan_phone_numbers(file_path, on_progress=None):
+    """
+    Проверяет файл с номерами потоковым чтением и подсчитывает корректные,
+    некорректные и повторяющиеся номера без загрузки списка в память.
+
+    Аргументы:
+        file_path (str): Путь к файлу (.xlsx, .xls или .csv).
+        on_progress (callable, optional): Вызывается со словарем счетчиков
+                                          после каждых CHUNK_SIZE корректных номеров.
+
+    Возвращает:
+        dict или None: Счетчики 'valid', 'invalid' и 'duplicates' в случае успеха,
+                       None в случае ошибки.
+    """
+    stats = {}
+    try:
+        for count, _ in enumerate(iter_phone_numbers(file_path, stats=stats), 1):
+            if on_progress and count % CHUNK_SIZE == 0:
+                on_progress(stats)
+        return stats
+    except FileNotFoundError:
+        print(f"Ошибка: Файл не найден: {file_path}")
+        return None
+    except Exception as e:
+        print(f"Ошибка при чтении файла с номерами: {e}")
+        return None
+
 def read_excel_numbers(file_path):
     """
-    Читает номера телефонов из Excel файла (.xls или .xlsx).
+    Читает номера телефонов из Excel файла (.xls или .xlsx) или CSV.
     Предполагается, что номера телефонов находятся во втором столбце.
+    Загружает весь список в память; для больших файлов используйте iter_phone_numbers.
 
     Аргументы:
-        file_path (str): Путь к Excel файлу.
+        file_path (str): Путь к файлу.
 
     Возвращает:
         list или None: Список номеров телефонов в виде строк в случае успеха,
                        None в случае ошибки или если файл не содержит номеров.
     """
     try:
-        df = pd.read_excel(file_path, header=None, engine='openpyxl')
-        if df.empty:
-            print(f"Файл Excel пуст: {file_path}")
-            return []
-
-        # Предполагаем, что номера во втором столбце. Преобразуем в строки, удаляем NaN и дубликаты
-        phone_numbers = df.iloc[:, 1].astype(str).dropna().unique().tolist()
+        phone_numbers = list(iter_phone_numbers(file_path))
 
         if not phone_numbers:
             print(f"Номера телефонов не найдены в файле: {file_path}")
@@ -78,6 +497,34 @@ def read_excel_numbers(file_path):
         print(f"Ошибка при чтении файла Excel: {e}")
         return None
 
+def get_instance_profiles(profile_config):
+    """
+    Возвращает список инстансов Green API для рассылки: основной профиль и
+    дополнительные инстансы из необязательного ключа "pool" в config/profile.json.
+    Каждый элемент "pool" - такой же профиль (name, apiUrl, mediaUrl, idInstance,
+    apiTokenInstance); не указанные в нем apiUrl, mediaUrl и параметры клиента
+    берутся из основного профиля. Неполные профили пропускаются.
+
+    Аргументы:
+        profile_config (dict): Данные профиля.
+
+    Возвращает:
+        list: Список словарей с данными инстансов.
+    """
+    main_profile = {key: value for key, value in profile_config.items() if key != 'pool'}
+    profiles = [main_profile]
+
+    for pool_profile in profile_config.get('pool') or []:
+        profile = dict(main_profile)
+        profile.update(pool_profile)
+        profile['name'] = pool_profile.get('name') or pool_profile.get('idInstance')
+        profiles.append(profile)
+
+    return [
+        profile for profile in profiles
+        if all([profile.get('apiUrl'), profile.get('idInstance'), profile.get('apiTokenInstance')])
+    ]
+
 def validate_file_path(file_path):
     """
     Проверяет, существует ли файл по указанному пути.
@@ -178,28 +625,64 @@ def create_chat_id(phone_number):
     """
     return f"{phone_number}@c.us"
 
+def parse_interval(value):
+    """
+    Разбирает значение интервала, введенное пользователем.
+    Допускаются дробные секунды ("0.5" или "0,5") и лимит в формате
+    "сообщений/секунд" (например, "30/60" - 30 сообщений в минуту, т.е. интервал 2 секунды).
+
+    Аргументы:
+        value (str, int или float): Значение для разбора.
+
+    Возвращает:
+        float или None: Интервал в секундах или None, если значение некорректно.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return None
+
+    try:
+        if isinstance(value, str) and '/' in value:
+            messages, seconds = value.split('/', 1)
+            interval = float(seconds.strip().replace(',', '.')) / float(messages.strip().replace(',', '.'))
+        else:
+            interval = float(str(value).strip().replace(',', '.'))
+    except (ValueError, ZeroDivisionError):
+        return None
+
+    if interval <= 0 or interval != interval or interval == float('inf'):
+        return None
+
+    return interval
+
 def is_valid_interval(interval):
     """
     Проверяет, является ли значение корректным интервалом для отправки сообщений.
 
     Аргументы:
-        interval: Значение для проверки, как интервал.
+        interval: Значение для проверки, как интервал (число секунд, в том числе дробное,
+                  или строка в формате "сообщений/секунд").
 
     Возвращает:
         bool: True, если интервал валиден, False в противном случае.
     """
-    if not isinstance(interval, (int, str)): # Проверяем тип данных, допускаем и строку, чтобы можно было проверить ввод пользователя
-        return False
+    return parse_interval(interval) is not None
 
-    try:
-        interval_int = int(interval) # Пытаемся преобразовать в целое число
-    except ValueError:
-        return False # Если не удалось преобразовать в целое число, значит не валидный интервал
+def is_valid_burst(burst):
+    """
+    Проверяет, является ли значение корректным размером пачки сообщений.
+
+    Аргументы:
+        burst: Значение для проверки.
 
-    if interval_int <= 0:
-        return False # Интервал должен быть больше нуля
+    Возвращает:
+        bool: True, если это целое число от 1 до 100, False в противном случае.
+    """
+    try:
+        burst_int = int(burst)
+    except (TypeError, ValueError):
+        return False
 
-    return True # Если все проверки пройдены, интервал валиден
+    return 1 <= burst_int <= 100
 
 # Вспомогательные функции можно добавлять по мере необходимости.
 # Например, функции для обработки текста, валидации данных и т.д.
\ No newline at end of file
@@ -0,0 +1,169 @@
+import hmac
+import json
+import logging
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import types
+
+# Максимальный размер тела запроса с обновлением (байт)
+MAX_UPDATE_SIZE = 1024 * 1024
+# Сколько обновлений из очереди передается боту за один раз
+UPDATES_BATCH_SIZE = 100
+
+class _WebhookRequestHandler(BaseHTTPRequestHandler):
+    """
+    Принимает обновления Telegram (POST с JSON) и кладет их в очередь сервера.
+    Отвечает сразу, не дожидаясь обработки, чтобы Telegram не ждал бота.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server.webhook
+        if self.path != server.path:
+            self._reply(404)
+            return
+        if server.secret_token and not hmac.compare_digest(
+                self.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), server.secret_token):
+            self._reply(403)
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0 or length > MAX_UPDATE_SIZE:
+            self._reply(413 if length > MAX_UPDATE_SIZE else 400)
+            return
+        body = self.rfile.read(length)
+
+        try:
+            update = types.Update.de_json(body.decode('utf-8'))
+        except Exception as e:
+            logging.warning(f"Некорректное обновление от webhook: {str(e)}")
+            self._reply(400)
+            return
+
+        try:
+            server.updates.put_nowait(update)
+        except queue.Full:
+            # Очередь заполнена - Telegram повторит доставку позже
+            self._reply(503)
+            return
+        self._reply(200)
+
+    def do_GET(self):
+        server = self.server.webhook
+        if self.path == '/health':
+            # Проверка доступности сервера
+            self._reply(200)
+        elif self.path == '/metrics' and server.metrics:
+            metrics = dict(server.metrics(), webhook_queue_depth=server.updates.qsize())
+            self._reply(200, json.dumps(metrics).encode('utf-8'))
+        else:
+            self._reply(404)
+
+    def _reply(self, status, body=b''):
+        self.send_response(status)
+        if body:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class WebhookServer:
+    """
+    HTTP-сервер для приема обновлений Telegram в режиме webhook.
+
+    Обновления принимаются потоками HTTP-сервера и складываются в ограниченную
+    очередь; отдельный поток забирает их из очереди и передает боту. Если бот
+    не успевает и очередь заполнена, сервер отвечает 503, и Telegram повторяет
+    доставку позже, поэтому память процесса не растет без ограничений.
+    """
+
+    def __init__(self, bot, host='0.0.0.0', port=8443, path='/webhook',
+                 secret_token=None, queue_size=1000, metrics=None):
+        """
+        Аргументы:
+            bot (telebot.TeleBot): Экземпляр бота Telegram.
+            host (str, optional): Адрес, на котором слушает сервер.
+            port (int, optional): Порт сервера.
+            path (str, optional): Путь, на который Telegram отправляет обновления.
+            secret_token (str, optional): Секрет из заголовка X-Telegram-Bot-Api-Secret-Token.
+                                          Если не задан, заголовок не проверяется.
+            queue_size (int, optional): Максимальное количество необработанных обновлений.
+            metrics (callable, optional): Функция, возвращающая словарь метрик для GET /metrics.
+        """
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token or None
+        self.metrics = metrics
+        self.updates = queue.Queue(maxsize=queue_size)
+        self._httpd = ThreadingHTTPServer((host, port), _WebhookRequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.webhook = self
+        self._stopped = threading.Event()
+        self._threads = []
+
+    @property
+    def address(self):
+        """
+        Возвращает адрес сервера (хост, порт); полезно, если порт был выбран системой (0).
+        """
+        return self._httpd.server_address
+
+    def _process_updates(self):
+        while not self._stopped.is_set():
+            try:
+                update = self.updates.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            # Забираем все, что уже накопилось, и передаем боту одной пачкой
+            batch = [update]
+            while len(batch) < UPDATES_BATCH_SIZE:
+                try:
+                    batch.append(self.updates.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.bot.process_new_updates(batch)
+            except Exception as e:
+                logging.error(f"Ошибка при обработке обновлений: {str(e)}")
+
+    def start(self):
+        """
+        Запускает HTTP-сервер и обработчик очереди в фоновых потоках.
+        """
+        self._stopped.clear()
+        self._threads = [
+            threading.Thread(target=self._httpd.serve_forever, daemon=True),
+            threading.Thread(target=self._process_updates, daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Останавливает прием обновлений и закрывает сокет сервера.
+        """
+        self._stopped.set()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def serve_forever(self):
+        """
+        Запускает сервер и блокирует поток до остановки (stop) или ошибки потока.
+        """
+        self.start()
+        try:
+            while not self._stopped.wait(1):
+                if not all(thread.is_alive() for thread in self._threads):
+                    raise RuntimeError("Поток webhook-сервера неожиданно завершился")
+        finally:
+            if not self._stopped.is_set():
+                self.stop()
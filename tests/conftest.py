@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# Код бота запускается из src/ и импортирует модули без префикса пакета
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    Рабочий каталог теста: config/ и data/ создаются во временной папке.
+    """
+    (tmp_path / 'config').mkdir()
+    (tmp_path / 'data').mkdir()
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,93 @@
+import itertools
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _handle(self):
+        api = self.server.api
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        # /waInstance{id}/{method}/{token}[/{arg}]
+        parts = urlparse(self.path).path.strip('/').split('/')
+        method = parts[1]
+        arg = parts[3] if len(parts) > 3 else None
+        with api.lock:
+            api.calls.append(method)
+            handler = api.handlers.get(method)
+            status, payload = handler(body, arg) if handler else (200, {})
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeGreenAPI:
+    """
+    Локальная замена Green API для тестов: очередь уведомлений
+    (receiveNotification/deleteNotification), состояние инстанса и отправка
+    сообщений. Поведение методов можно переопределить через handlers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.notifications = []
+        self.sent = []
+        self._receipts = itertools.count(1)
+        self._messages = itertools.count(1)
+        self.handlers = {
+            'getStateInstance': lambda body, arg: (200, {'stateInstance': 'authorized'}),
+            'sendMessage': self._send_message,
+            'receiveNotification': self._receive_notification,
+            'deleteNotification': self._delete_notification,
+        }
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.api = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    def profile(self, **extra):
+        return dict({'name': 'test', 'apiUrl': self.url, 'mediaUrl': self.url,
+                     'idInstance': '1', 'apiTokenInstance': 'token'}, **extra)
+
+    def push_notification(self, body):
+        with self.lock:
+            receipt_id = next(self._receipts)
+            self.notifications.append({'receiptId': receipt_id, 'body': body})
+            return receipt_id
+
+    def _send_message(self, body, arg):
+        id_message = f"MSG{next(self._messages)}"
+        self.sent.append((json.loads(body)['chatId'], id_message))
+        return 200, {'idMessage': id_message}
+
+    def _receive_notification(self, body, arg):
+        return 200, self.notifications[0] if self.notifications else None
+
+    def _delete_notification(self, body, arg):
+        receipt_id = int(arg)
+        before = len(self.notifications)
+        self.notifications = [n for n in self.notifications if n['receiptId'] != receipt_id]
+        return 200, {'result': len(self.notifications) < before}
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,39 @@
+from api import get_client, get_client_for_profile, close_client_for_profile, RetryPolicy
+
+
+def track_close(client):
+    closed = []
+    client.close = lambda: closed.append(True)
+    return closed
+
+
+def test_client_is_shared_while_options_match():
+    first = get_client('http://api', 'http://media', 'shared', 'token', pool_size=2,
+                       retry_policy=RetryPolicy(max_attempts=2))
+    second = get_client('http://api', 'http://media', 'shared', 'token', pool_size=2,
+                        retry_policy=RetryPolicy(max_attempts=2))
+    assert first is second
+
+
+def test_changed_options_replace_and_close_client():
+    old = get_client('http://api', 'http://media', 'changed', 'token', pool_size=2)
+    closed = track_close(old)
+
+    new = get_client('http://api', 'http://media', 'changed', 'token', pool_size=4)
+    assert new is not old and new.pool_size == 4
+    assert closed == [True]
+
+    newer = get_client('http://api', 'http://media', 'changed', 'new-token', pool_size=4)
+    assert newer is not new and newer.api_token_instance == 'new-token'
+
+
+def test_close_client_for_profile_evicts_client():
+    profile = {'apiUrl': 'http://api', 'mediaUrl': 'http://media',
+               'idInstance': 'evicted', 'apiTokenInstance': 'token'}
+    client = get_client_for_profile(profile)
+    closed = track_close(client)
+
+    close_client_for_profile(profile)
+
+    assert closed == [True]
+    assert get_client_for_profile(profile) is not client
@@ -0,0 +1,86 @@
+import itertools
+import json
+
+import pytest
+
+from broadcast_engine import run_broadcast
+from circuit_breaker import get_breaker, CLOSED
+
+from fake_green_api import FakeGreenAPI
+
+PHONES = [f'7900000000{i}' for i in range(6)]
+
+
+@pytest.fixture
+def green_api():
+    api = FakeGreenAPI()
+    uploads = itertools.count(1)
+    api.handlers['uploadFile'] = lambda body, arg: (200, {'urlFile': f'https://files/{next(uploads)}'})
+    api.handlers['sendFileByUpload'] = lambda body, arg: (200, {'idMessage': 'UPLOAD'})
+    yield api
+    api.close()
+
+
+@pytest.fixture
+def media(tmp_path):
+    path = tmp_path / 'photo.jpg'
+    path.write_bytes(b'jpeg')
+    return {'path': str(path), 'name': 'photo.jpg'}
+
+
+def broadcast(green_api, media, instance_id):
+    profile = green_api.profile(idInstance=instance_id, retryAttempts=1)
+    return run_broadcast([profile], PHONES, 'hi', media=media, interval=0.001, burst=10)
+
+
+def test_expired_url_is_restaged_once(green_api, media):
+    def send_file_by_url(body, arg):
+        if json.loads(body)['urlFile'] == 'https://files/1':
+            return 410, {'message': 'urlFile expired'}
+        return 200, {'idMessage': 'URL'}
+    green_api.handlers['sendFileByUrl'] = send_file_by_url
+
+    stats = broadcast(green_api, media, 'engine-restage')
+
+    assert stats.success == len(PHONES)
+    # Одна загрузка перед рассылкой и одна после отказа по ссылке, без загрузки на получателя
+    assert green_api.calls.count('uploadFile') == 2
+    assert 'sendFileByUpload' not in green_api.calls
+
+
+def test_recipient_error_does_not_reupload(green_api, media):
+    def send_file_by_url(body, arg):
+        if json.loads(body)['chatId'] == f'{PHONES[0]}@c.us':
+            return 400, {'message': 'chatId is invalid'}
+        return 200, {'idMessage': 'URL'}
+    green_api.handlers['sendFileByUrl'] = send_file_by_url
+
+    stats = broadcast(green_api, media, 'engine-recipient')
+
+    assert (stats.success, stats.failed) == (len(PHONES) - 1, 1)
+    assert green_api.calls.count('uploadFile') == 1
+    assert 'sendFileByUpload' not in green_api.calls
+
+
+def test_upload_per_recipient_when_staging_fails(green_api, media):
+    green_api.handlers['uploadFile'] = lambda body, arg: (400, {'message': 'upload failed'})
+
+    stats = broadcast(green_api, media, 'engine-upload')
+
+    assert stats.success == len(PHONES)
+    assert green_api.calls.count('sendFileByUpload') == len(PHONES)
+    assert 'sendFileByUrl' not in green_api.calls
+
+
+def test_recipient_errors_do_not_open_breaker(green_api):
+    # Ошибок неверных номеров больше, чем порог предохранителя
+    green_api.handlers['sendMessage'] = lambda body, arg: (400, {'message': 'chatId is invalid'})
+    profile = green_api.profile(idInstance='engine-bad-numbers', retryAttempts=1)
+
+    stats = run_broadcast([profile], PHONES * 2, 'hi', interval=0.001, burst=10)
+
+    assert (stats.success, stats.failed) == (0, len(PHONES) * 2)
+    assert get_breaker('engine-bad-numbers').state == CLOSED
+    # Инстанс не проверялся: цепь не размыкалась
+    assert 'getStateInstance' not in green_api.calls
+    assert green_api.calls.count('sendMessage') == len(PHONES) * 2
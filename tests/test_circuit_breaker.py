@@ -0,0 +1,78 @@
+import pytest
+
+import circuit_breaker
+from broadcast_engine import preflight_check
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN, get_breaker
+
+from fake_green_api import FakeGreenAPI
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker, 'time', clock)
+    return clock
+
+
+def test_opens_after_threshold_and_closes_after_successful_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    assert [breaker.record_failure() for _ in range(3)] == [False, False, True]
+    assert breaker.state == OPEN and not breaker.allow_request()
+    assert breaker.retry_in() == 30
+
+    clock.now += 30
+    # Пробный запрос разрешается только одному вызывающему
+    assert breaker.allow_request() and breaker.state == HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow_request()
+
+
+def test_failed_probe_reopens_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow_request()
+
+    assert breaker.record_failure()
+    assert breaker.state == OPEN and breaker.retry_in() == 10
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_preflight_check_drops_unauthorized_instances():
+    ready_api = FakeGreenAPI()
+    blocked_api = FakeGreenAPI()
+    fatal_api = FakeGreenAPI()
+    blocked_api.handlers['getStateInstance'] = lambda body, arg: (200, {'stateInstance': 'notAuthorized'})
+    fatal_api.handlers['getStateInstance'] = lambda body, arg: (401, {'message': 'Unauthorized'})
+    try:
+        profiles = [ready_api.profile(name='ready', idInstance='preflight-ready'),
+                    blocked_api.profile(name='blocked', idInstance='preflight-blocked'),
+                    fatal_api.profile(name='fatal', idInstance='preflight-fatal')]
+        ready, problems = preflight_check(profiles)
+    finally:
+        for api in (ready_api, blocked_api, fatal_api):
+            api.close()
+
+    assert [profile['name'] for profile in ready] == ['ready']
+    assert [name for name, _ in problems] == ['blocked', 'fatal']
+    assert 'notAuthorized' in problems[0][1]
+    assert get_breaker('preflight-ready').state == CLOSED
+    assert get_breaker('preflight-blocked').state == OPEN
+    assert get_breaker('preflight-fatal').state == OPEN
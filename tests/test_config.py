@@ -0,0 +1,50 @@
+import json
+import os
+import threading
+import time
+
+import utils
+from utils import load_config, save_config, update_config
+
+
+def test_concurrent_updates_lose_no_keys(workdir):
+    path = os.path.join('config', 'templates.json')
+    assert save_config(path, {})
+
+    def add_keys(thread_id):
+        for i in range(20):
+            def apply(config):
+                # Пауза между чтением и записью делает гонку вероятной без блокировки
+                time.sleep(0.0005)
+                config[f'{thread_id}-{i}'] = i
+            assert update_config(path, apply)
+
+    threads = [threading.Thread(target=add_keys, args=(thread_id,)) for thread_id in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(path, encoding='utf-8') as f:
+        assert len(json.load(f)) == 8 * 20
+    assert len(load_config(path)) == 8 * 20
+
+
+def test_failed_write_keeps_original_file(workdir, monkeypatch):
+    path = os.path.join('config', 'bot.json')
+    assert save_config(path, {'mode': 'polling'})
+
+    # Значение, которое нельзя записать в JSON: запись прерывается на середине
+    assert not save_config(path, {'mode': 'webhook', 'broken': object()})
+
+    def failing_replace(src, dst):
+        raise OSError('disk full')
+    with monkeypatch.context() as patch:
+        patch.setattr(utils.os, 'replace', failing_replace)
+        assert not update_config(path, lambda config: config.update(mode='webhook'))
+
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f) == {'mode': 'polling'}
+    assert load_config(path) == {'mode': 'polling'}
+    # Временные файлы удалены
+    assert os.listdir('config') == ['bot.json']
@@ -0,0 +1,61 @@
+import threading
+import time
+
+import telebot
+from telebot import types
+
+from dispatcher import ChatDispatcher
+
+
+def make_update(update_id, chat_id, text):
+    return types.Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': text
+        }
+    })
+
+
+def test_polling_handles_each_update_once():
+    bot = telebot.TeleBot('123:TEST', threaded=False)
+    pending = [make_update(1, 10, 'slow'), make_update(2, 10, '✅ Подтвердить'), make_update(3, 11, 'other')]
+
+    def get_updates(offset=None, **kwargs):
+        # Как Telegram: возвращаются все обновления начиная с offset
+        time.sleep(0.01)
+        return [update for update in pending if update.update_id >= (offset or 0)]
+
+    bot.get_updates = get_updates
+    # polling запрашивает данные бота для логов - без обращения к Telegram
+    bot._user = types.User(id=123, is_bot=True, first_name='test')
+
+    handled = []
+    handled_lock = threading.Lock()
+
+    @bot.message_handler(func=lambda message: True)
+    def handle(message):
+        if message.text == 'slow':
+            # Медленный обработчик держит очередь своего чата, пока polling продолжает опрос
+            time.sleep(0.3)
+        with handled_lock:
+            handled.append(message.message_id)
+
+    dispatcher = ChatDispatcher.attach(bot, workers=2)
+    threading.Timer(0.6, bot.stop_polling).start()
+    bot.polling(none_stop=True, interval=0, timeout=1)
+    dispatcher.stop()
+
+    assert sorted(handled) == [1, 2, 3]
+    assert bot.last_update_id == 3
+
+
+def test_submit_without_bot_keeps_working():
+    handled = []
+    dispatcher = ChatDispatcher(lambda updates: handled.extend(u.update_id for u in updates), workers=1)
+    dispatcher.start()
+    dispatcher.submit([make_update(5, 1, 'a'), make_update(6, 1, 'b')])
+    dispatcher.stop()
+    assert handled == [5, 6]
@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from job_store import JobStore, JobCheckpoint, JOB_CREATING, RECIPIENT_PENDING, RECIPIENT_SENT, RECIPIENT_FAILED
+
+
+class RecordingStore(JobStore):
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.writer_threads = []
+
+    def save_results(self, job_id, results):
+        self.writer_threads.append(threading.get_ident())
+        super().save_results(job_id, results)
+
+
+def test_checkpoint_writes_batches_off_the_calling_thread(workdir):
+    store = RecordingStore('data/jobs.db')
+    phones = [f'7900000000{i}' for i in range(5)]
+    job_id = store.create_job(1, 'hi', None, phones)
+    checkpoint = JobCheckpoint(store, job_id, batch_size=2)
+
+    for i, phone in enumerate(phones):
+        checkpoint.add(phone, i % 2 == 0, f'MSG{i}' if i % 2 == 0 else None)
+    checkpoint.flush()
+
+    assert store.job_stats(job_id) == {RECIPIENT_PENDING: 0, RECIPIENT_SENT: 3, RECIPIENT_FAILED: 2}
+    assert len(store.writer_threads) == 3
+    assert threading.get_ident() not in store.writer_threads
+
+
+def test_checkpoint_flush_reports_write_errors(workdir):
+    store = JobStore('data/jobs.db')
+    job_id = store.create_job(1, 'hi', None, ['79000000001'])
+    checkpoint = JobCheckpoint(store, job_id, batch_size=1)
+
+    def fail(job_id, results):
+        raise RuntimeError('disk full')
+    store.save_results = fail
+    checkpoint.add('79000000001', True, 'MSG1')
+
+    with pytest.raises(RuntimeError):
+        checkpoint.flush()
+    # Незаписанные результаты доступны вызывающему, чтобы не отправить рассылку повторно
+    assert checkpoint.unsaved == [('79000000001', RECIPIENT_SENT, 'MSG1')]
+
+
+def test_job_is_not_resumed_while_recipients_are_written(workdir):
+    store = JobStore('data/jobs.db')
+    seen = {}
+
+    def recipients():
+        yield '79000000001'
+        # Процесс мог бы завершиться здесь: задание с неполным списком не возобновляется
+        seen['unfinished'] = store.unfinished_jobs()
+        yield '79000000002'
+
+    job_id = store.create_job(1, 'hi', None, recipients(), batch_size=1)
+
+    assert seen['unfinished'] == []
+    assert store.unfinished_jobs() == [job_id]
+    assert store.get_job(job_id)['total'] == 2
+
+
+def test_incomplete_jobs_are_deleted(workdir):
+    store = JobStore('data/jobs.db')
+
+    def broken():
+        yield '79000000001'
+        raise ValueError('file is corrupted')
+
+    with pytest.raises(ValueError):
+        store.create_job(1, 'hi', None, broken(), batch_size=1)
+    assert store.recent_jobs(1) == []
+
+    # Задание, запись получателей которого прервал перезапуск, удаляется при запуске
+    job_id = store.create_job(1, 'hi', None, ['79000000001'])
+    store.set_status(job_id, JOB_CREATING)
+    assert store.unfinished_jobs() == []
+    assert store.delete_incomplete_jobs() == 1
+    assert store.get_job(job_id) is None
@@ -0,0 +1,47 @@
+import os
+import time
+
+import media_store
+from media_store import MediaStore, start_garbage_collection, stop_garbage_collection
+
+
+def put_file(store, name, content):
+    path = store.upload_path(name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return store.put(path, content.hex().ljust(64, '0'), name, ref='job:1')
+
+
+def test_blob_released_during_grace_period_is_collected_later(workdir, monkeypatch):
+    store = MediaStore('files', os.path.join('files', 'index.json'))
+    path = put_file(store, 'photo.jpg', b'jpeg')
+    sha256 = b'jpeg'.hex().ljust(64, '0')
+
+    store.release(sha256, 'job:1')
+    assert os.path.exists(path) and store.collect_garbage() == 0
+
+    now = time.time()
+    monkeypatch.setattr(media_store.time, 'time', lambda: now + media_store.UPLOAD_GRACE_PERIOD + 1)
+    assert store.collect_garbage() == 1
+    assert not os.path.exists(path) and store.get(sha256) is None
+
+
+def test_periodic_collection_reclaims_expired_blobs(workdir, monkeypatch):
+    store = MediaStore('files', os.path.join('files', 'index.json'))
+    monkeypatch.setattr(media_store, '_store', store)
+    path = put_file(store, 'doc.pdf', b'pdf')
+    store.release(b'pdf'.hex().ljust(64, '0'), 'job:1')
+
+    start_garbage_collection(interval=0.05)
+    try:
+        time.sleep(0.1)
+        assert os.path.exists(path)
+        # Срок защиты истек, пока бот работает: файл удаляет следующая очистка
+        now = time.time()
+        monkeypatch.setattr(media_store.time, 'time', lambda: now + media_store.UPLOAD_GRACE_PERIOD + 1)
+        deadline = time.monotonic() + 2
+        while os.path.exists(path) and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        stop_garbage_collection()
+    assert not os.path.exists(path)
@@ -0,0 +1,63 @@
+import pytest
+
+from api import GreenAPIClient
+from job_store import JobStore, RECIPIENT_SENT
+from notifications import NotificationPoller
+
+from fake_green_api import FakeGreenAPI
+
+
+@pytest.fixture
+def green_api():
+    api = FakeGreenAPI()
+    yield api
+    api.close()
+
+
+@pytest.fixture
+def poller(green_api, workdir):
+    client = GreenAPIClient(green_api.url, green_api.url, '1', 'token')
+    store = JobStore('data/jobs.db')
+    yield NotificationPoller(client, store, receive_timeout=5)
+    client.close()
+
+
+def status(id_message, value):
+    return {'typeWebhook': 'outgoingMessageStatus', 'idMessage': id_message,
+            'status': value, 'sendByApi': True}
+
+
+def test_statuses_are_recorded_and_notifications_deleted(green_api, poller):
+    store = poller.store
+    job_id = store.create_job(1, 'hi', None, ['79000000001', '79000000002', '79000000003'])
+    store.save_results(job_id, [('79000000001', RECIPIENT_SENT, 'A'),
+                                ('79000000002', RECIPIENT_SENT, 'B'),
+                                ('79000000003', RECIPIENT_SENT, 'C')])
+
+    # Уведомления приходят не по порядку: "read" раньше "delivered"
+    green_api.push_notification(status('A', 'read'))
+    green_api.push_notification(status('A', 'delivered'))
+    green_api.push_notification(status('B', 'delivered'))
+    green_api.push_notification(status('C', 'noAccount'))
+    green_api.push_notification({'typeWebhook': 'incomingMessageReceived'})
+
+    assert poller.poll_once() == 5
+
+    assert green_api.notifications == []
+    assert green_api.calls.count('deleteNotification') == 5
+    assert store.delivery_stats(job_id) == {'sent': 0, 'delivered': 1, 'read': 1, 'failed': 1}
+
+
+def test_status_before_checkpoint_is_attached_to_job(green_api, poller):
+    store = poller.store
+    job_id = store.create_job(1, 'hi', None, ['79000000001'])
+    green_api.push_notification(status('A', 'delivered'))
+    poller.poll_once()
+
+    store.save_results(job_id, [('79000000001', RECIPIENT_SENT, 'A')])
+    assert store.delivery_stats(job_id)['delivered'] == 1
+
+
+def test_empty_queue(green_api, poller):
+    assert poller.poll_once() == 0
+    assert green_api.calls == ['receiveNotification']
@@ -0,0 +1,95 @@
+import re
+
+import pytest
+from openpyxl import Workbook
+
+from utils import normalize_phone_number, normalize_phone_series, iter_phone_numbers
+
+# Значение ячейки и ожидаемый номер (None - значение отбрасывается)
+CASES = [
+    ('79001234567', '79001234567'),
+    ('89001234567', '79001234567'),
+    ('+7 (900) 123-45-67', '79001234567'),
+    ('8 900 123 45 67', '79001234567'),
+    ('8-900-123-45-67', '79001234567'),
+    ('+79001234567', '79001234567'),
+    (' 7.900.123.45.67 ', '79001234567'),
+    # Заменяется только первая восьмерка
+    ('88001234567', '78001234567'),
+    ('79881234588', '79881234588'),
+    ('9001234567', None),
+    ('7900123456', None),
+    ('790012345678', None),
+    ('Телефон', None),
+    ('nan', None),
+    ('', None),
+    ('8', None),
+]
+
+# Числа из Excel, прочитанные как float: дробная часть ".0" отбрасывается
+EXCEL_CASES = [
+    ('79001234567.0', '79001234567'),
+    ('89001234567.00', '79001234567'),
+    ('7900123456.0', None),
+]
+
+
+@pytest.mark.parametrize('value, expected', CASES)
+def test_scalar_rules(value, expected):
+    assert normalize_phone_number(value) == expected
+
+
+@pytest.mark.parametrize('value, expected', CASES + EXCEL_CASES)
+def test_series_matches_scalar(value, expected):
+    scalar = normalize_phone_number(re.sub(r'\.0+$', '', value))
+    assert scalar == expected
+
+    phone_numbers, invalid = normalize_phone_series([value])
+    assert phone_numbers == ([expected] if expected else [])
+    assert invalid == (0 if expected else 1)
+
+
+def test_series_keeps_order_of_whole_chunk():
+    values = [value for value, _ in CASES + EXCEL_CASES]
+    expected = [phone for phone in (normalize_phone_number(re.sub(r'\.0+$', '', value)) for value in values)
+                if phone]
+
+    phone_numbers, invalid = normalize_phone_series(values)
+
+    assert phone_numbers == expected
+    assert invalid == len(values) - len(expected)
+
+
+def test_iter_phone_numbers_from_csv(tmp_path):
+    path = tmp_path / 'numbers.csv'
+    rows = ['Имя;Телефон'] + [f'Клиент {i};{value}' for i, (value, _) in enumerate(CASES) if value.strip()]
+    path.write_text('\n'.join(rows), encoding='utf-8')
+
+    stats = {}
+    phone_numbers = list(iter_phone_numbers(str(path), stats=stats))
+
+    # Повторяющиеся после нормализации номера отбрасываются, порядок сохраняется
+    assert phone_numbers == ['79001234567', '78001234567', '79881234588']
+    assert stats['valid'] == 3
+    assert stats['duplicates'] == 6
+    # Шесть некорректных значений из таблицы и строка заголовка
+    assert stats['invalid'] == 7
+
+
+def test_iter_phone_numbers_from_xlsx_with_numeric_cells(tmp_path):
+    path = tmp_path / 'numbers.xlsx'
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Имя', 'Телефон'])
+    sheet.append(['А', 89001234567])
+    sheet.append(['Б', 79001234568.0])
+    sheet.append(['В', '+7 900 123-45-69'])
+    sheet.append(['Г', None])
+    sheet.append(['Д', 12345])
+    workbook.save(path)
+
+    stats = {}
+    phone_numbers = list(iter_phone_numbers(str(path), stats=stats))
+
+    assert phone_numbers == ['79001234567', '79001234568', '79001234569']
+    assert (stats['valid'], stats['invalid'], stats['duplicates']) == (3, 2, 0)
@@ -0,0 +1,55 @@
+import pytest
+
+from rate_limiter import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_is_available_at_once_and_capped():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=3, clock=clock)
+
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+    # За час простоя накапливается не больше burst токенов
+    clock.now += 3600
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+def test_refill_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=0.5, burst=1, clock=clock)
+    assert bucket.try_acquire()
+
+    clock.now += 1.5
+    assert not bucket.try_acquire()
+    clock.now += 0.5
+    assert bucket.try_acquire()
+
+
+def test_reserve_returns_wait_for_borrowed_tokens():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=4, burst=2, clock=clock)
+
+    # Два токена есть сразу, следующие берутся в долг по 0.25 с на токен
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.25, 0.5]
+    clock.now += 0.5
+    assert bucket.reserve() == pytest.approx(0.25)
+
+
+def test_configure_keeps_tokens_within_new_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, burst=5, clock=clock)
+    bucket.configure(rate=10, burst=2)
+
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+    clock.now += 0.1
+    assert bucket.try_acquire()
+    with pytest.raises(ValueError):
+        bucket.configure(rate=0)
@@ -0,0 +1,138 @@
+import pytest
+
+import state_store
+from state_store import StateStore, SQLiteStateBackend, RedisStateBackend
+
+
+class FakeClock:
+    """
+    Управляемые часы вместо модуля time в state_store.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeRedis:
+    """
+    Минимальная замена клиента Redis: GET, SET с EX и DELETE. Как и настоящий
+    клиент, возвращает значения в bytes.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+
+    def get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and self.clock.now >= expires_at:
+            del self.data[key]
+            return None
+        return value
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (value.encode('utf-8'), self.clock.now + ex if ex else None)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(state_store, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def make_store(monkeypatch):
+    monkeypatch.setattr(state_store, '_stores', [])
+
+    def make(name='test', backend=None, ttl=60, max_entries=100):
+        store = StateStore(name, ttl=ttl, max_entries=max_entries)
+        store.backend = backend
+        return store
+    return make
+
+
+def test_memory_entries_expire_after_ttl(clock, make_store):
+    store = make_store(ttl=60)
+    store['a'] = {'step': 1}
+    store['b'] = {'step': 2}
+
+    clock.sleep(30)
+    assert store['a'] == {'step': 1}
+    clock.sleep(40)
+
+    # "a" читали 40 секунд назад, "b" не трогали 70 секунд
+    assert 'b' not in store
+    store.flush()
+    assert len(store) == 1
+    clock.sleep(61)
+    store.flush()
+    assert len(store) == 0
+
+
+def test_memory_evicts_least_recently_used(clock, make_store):
+    store = make_store(max_entries=2)
+    store['a'] = 1
+    store['b'] = 2
+    clock.sleep(1)
+    store.get('a')
+    store['c'] = 3
+
+    assert 'b' not in store
+    assert store.get('a') == 1 and store.get('c') == 3
+
+
+def test_sqlite_backend_survives_restart_and_expires(clock, make_store, workdir):
+    backend = SQLiteStateBackend('data/state.db')
+    store = make_store(backend=backend)
+    store.setdefault(42, {})['phones'] = 3
+    store.flush()
+
+    # Новый процесс: записи загружаются из базы
+    restarted = make_store(backend=SQLiteStateBackend('data/state.db'))
+    assert restarted[42] == {'phones': 3}
+
+    del restarted[42]
+    assert make_store(backend=backend).get(42) is None
+
+    store['old'] = 'value'
+    store.flush()
+    clock.sleep(61)
+    backend.expire(60)
+    assert backend.load('test', 'old', 3600) is None
+
+
+def test_redis_backend_saves_loads_and_expires(clock, make_store):
+    client = FakeRedis(clock)
+    store = make_store(backend=RedisStateBackend(client), ttl=60)
+    store[7] = 'broadcast'
+    store.flush()
+
+    assert client.data['telegram_bot:state:test:7'][0] == b'"broadcast"'
+    assert make_store(backend=RedisStateBackend(client))[7] == 'broadcast'
+
+    clock.sleep(61)
+    assert make_store(backend=RedisStateBackend(client)).get(7) is None
+
+
+def test_evicted_entry_is_saved_and_reloaded(clock, make_store):
+    client = FakeRedis(clock)
+    store = make_store(backend=RedisStateBackend(client), max_entries=1)
+    store['a'] = {'step': 'file'}
+    store['b'] = {'step': 'text'}
+
+    # "a" вытеснена из памяти, но сохранена в Redis и загружается обратно
+    assert len(store) == 1
+    assert store['a'] == {'step': 'file'}
@@ -0,0 +1,94 @@
+import telebot
+from telebot import types
+
+import job_store
+import suppression
+from handlers.broadcast_handlers import register_broadcast_handlers
+from job_store import JobStore
+from state_router import StateRouter
+from suppression import SuppressionIndex, campaign_key, GLOBAL_CAMPAIGN, REASON_SENT
+
+PHONES = ['79000000001', '79000000002', '79000000003']
+
+
+def test_global_and_campaign_opt_out(workdir):
+    index = SuppressionIndex('data/suppression.db')
+    promo = campaign_key('Скидка 10%')
+    news = campaign_key('Новости')
+
+    assert index.add(['79000000001']) == 1
+    assert index.add(['79000000002'], promo) == 1
+    # Повторное добавление не считается
+    assert index.add(['79000000002'], promo) == 0
+
+    stats = {}
+    assert list(index.filter(PHONES, promo, stats=stats)) == ['79000000003']
+    assert stats['suppressed'] == 2
+    # Исключение из одной кампании не касается других
+    assert list(index.filter(PHONES, news)) == ['79000000002', '79000000003']
+    assert list(index.filter(PHONES)) == ['79000000002', '79000000003']
+
+    assert index.remove(['79000000001']) == 1
+    assert index.remove(['79000000002'], promo) == 1
+    assert list(index.filter(PHONES, promo)) == PHONES
+    assert (index.count(), index.count(promo)) == (0, 0)
+
+
+def test_campaign_key_depends_on_text_and_media():
+    assert campaign_key('hi') == campaign_key('hi', None)
+    assert campaign_key('hi') != campaign_key('hello')
+    assert campaign_key('hi', {'hash': 'a'}) != campaign_key('hi', {'hash': 'b'})
+    assert campaign_key('hi') != GLOBAL_CAMPAIGN
+
+
+def test_job_is_created_without_suppressed_recipients(workdir):
+    index = SuppressionIndex('data/suppression.db')
+    store = JobStore('data/jobs.db')
+    media = {'hash': 'abc', 'name': 'photo.jpg'}
+    key = campaign_key('hi', media)
+    index.add(['79000000001'])
+    index.add(['79000000002'], key, REASON_SENT)
+
+    stats = {}
+    recipients = [('79000000002', {'имя': 'Б'}), ('79000000003', {'имя': 'В'}), ('79000000001', {'имя': 'А'})]
+    job_id = store.create_job(1, 'hi', media, index.filter(recipients, key, stats=stats))
+
+    assert store.get_job(job_id)['total'] == 1
+    assert list(store.iter_pending(job_id, with_fields=True)) == [('79000000003', {'имя': 'В'})]
+    assert stats['suppressed'] == 2
+
+
+def command(bot, text, chat_id=10):
+    bot.process_new_updates([types.Update.de_json({
+        'update_id': 1,
+        'message': {'message_id': 1, 'date': 0, 'text': text,
+                    'chat': {'id': chat_id, 'type': 'private'},
+                    'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Test'},
+                    'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]}
+    })])
+
+
+def test_optout_commands_for_global_list_and_campaign(workdir, monkeypatch):
+    index = SuppressionIndex('data/suppression.db')
+    store = JobStore('data/jobs.db')
+    monkeypatch.setattr(suppression, '_index', index)
+    monkeypatch.setattr(job_store, '_store', store)
+    job_id = store.create_job(10, 'hi', None, PHONES)
+    other_job = store.create_job(20, 'hi', None, PHONES)
+
+    bot = telebot.TeleBot('123:test', threaded=False)
+    replies = []
+    monkeypatch.setattr(bot, 'send_message', lambda chat_id, text, **kwargs: replies.append(text))
+    register_broadcast_handlers(bot, StateRouter(lambda chat_id: None))
+
+    command(bot, '/optout 89000000001')
+    command(bot, f'/optout #{job_id} 79000000002, 89000000003')
+    assert index.count() == 1 and index.count(campaign_key('hi')) == 2
+
+    command(bot, f'/optin #{job_id} 79000000003')
+    assert list(index.filter(PHONES, campaign_key('hi'))) == ['79000000003']
+
+    # Чужая рассылка недоступна
+    command(bot, f'/optout #{other_job} 79000000003')
+    assert replies[-1] == f"❌ Рассылка #{other_job} не найдена."
+    assert index.count(campaign_key('hi')) == 1
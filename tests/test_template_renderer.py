@@ -0,0 +1,34 @@
+from template_renderer import compile_template, find_placeholders
+from utils import iter_recipient_fields, read_columns
+
+
+def test_plain_text_is_unchanged():
+    text = 'Скидка {10%} до 31.12, код {{PROMO}}, JSON: {"a": 1} и { одиночная скобка }'
+    assert compile_template(text).render() == text
+    assert compile_template(text, ('имя',)).render({'имя': 'Анна'}) == text
+
+
+def test_only_known_columns_are_substituted():
+    text = 'Здравствуйте, {Имя}! Ваш код {code}, скидка {{скидка}}'
+    renderer = compile_template(text, ('имя', 'скидка'))
+
+    assert renderer.field_names == ('имя', 'скидка')
+    assert renderer.render({'имя': 'Анна', 'скидка': '5%'}) == 'Здравствуйте, Анна! Ваш код {code}, скидка {5%}'
+    assert find_placeholders(text) == ('имя', 'code', 'скидка')
+
+
+def test_recipient_fields_report_invalid_and_duplicates(workdir):
+    path = workdir / 'data' / 'numbers.csv'
+    path.write_text('Имя;Телефон\n'
+                    'Анна;8 (900) 000-00-01\n'
+                    'Борис;123\n'
+                    'Вера;79000000001\n'
+                    'Галина;79000000002.0\n', encoding='utf-8')
+    columns = read_columns(str(path))
+    stats = {}
+
+    recipients = list(iter_recipient_fields(str(path), {'имя': columns['имя']}, stats=stats))
+
+    assert recipients == [('79000000001', {'имя': 'Анна'}), ('79000000002', {'имя': 'Галина'})]
+    # Строка заголовка тоже считается некорректным номером, как в iter_phone_numbers
+    assert stats == {'valid': 2, 'invalid': 2, 'duplicates': 1}
@@ -0,0 +1,77 @@
+import json
+import os
+
+from template_repository import TemplateRepository
+
+PATH = os.path.join('config', 'templates.json')
+
+
+def read_file():
+    with open(PATH, encoding='utf-8') as f:
+        return json.load(f)['templates']
+
+
+def test_indexes_follow_create_rename_and_delete(workdir):
+    repository = TemplateRepository(PATH)
+    first = repository.create('Акция', 'Скидка {имя}')
+    second = repository.create('Акция', 'Вторая акция')
+
+    # При совпадении названий находится шаблон, созданный первым
+    assert repository.find_by_name('Акция')['id'] == first['id']
+    assert repository.get(second['id'])['text'] == 'Вторая акция'
+
+    assert repository.update(first['id'], name='Новости')
+    assert repository.find_by_name('Новости')['id'] == first['id']
+    assert repository.find_by_name('Акция')['id'] == second['id']
+
+    assert repository.delete(second['id'])['id'] == second['id']
+    assert repository.find_by_name('Акция') is None
+    assert repository.get(second['id']) is None
+    assert repository.delete(second['id']) is None
+    assert not repository.update(second['id'], name='Акция')
+
+    assert [template['name'] for template in repository.list()] == ['Новости']
+    assert [template['name'] for template in read_file()] == ['Новости']
+
+
+def test_returned_templates_are_copies(workdir):
+    repository = TemplateRepository(PATH)
+    template = repository.create('Акция', 'текст')
+    template['name'] = 'Изменено'
+    repository.get(template['id'])['name'] = 'Изменено'
+
+    assert repository.find_by_name('Акция')['id'] == template['id']
+    assert repository.find_by_name('Изменено') is None
+
+
+def test_reload_after_file_is_edited(workdir):
+    repository = TemplateRepository(PATH)
+    kept = repository.create('Акция', 'текст')
+    removed = repository.create('Новости', 'текст')
+
+    # Новый экземпляр читает шаблоны из файла
+    reloaded = TemplateRepository(PATH)
+    assert [template['id'] for template in reloaded.list()] == [kept['id'], removed['id']]
+    assert reloaded.find_by_name('Новости')['id'] == removed['id']
+
+    # Файл изменили вручную: индексы перестраиваются при следующем обращении
+    templates = [dict(read_file()[0], name='Акция переименована')]
+    with open(PATH, 'w', encoding='utf-8') as f:
+        json.dump({'templates': templates}, f, ensure_ascii=False)
+
+    assert repository.count() == 1
+    assert repository.find_by_name('Акция') is None
+    assert repository.find_by_name('Акция переименована')['id'] == kept['id']
+    assert repository.get(removed['id']) is None
+
+
+def test_page_is_clamped_to_range(workdir):
+    repository = TemplateRepository(PATH)
+    for i in range(5):
+        repository.create(f'Шаблон {i}', 'текст')
+
+    templates, page, total_pages = repository.page(3, page_size=2)
+    assert (page, total_pages) == (3, 3)
+    assert [template['name'] for template in templates] == ['Шаблон 4']
+    assert repository.page(10, page_size=2)[1] == 3
+    assert repository.page(0, page_size=2)[0][0]['name'] == 'Шаблон 0'
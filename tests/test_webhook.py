@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+import telebot
+
+from dispatcher import ChatDispatcher
+from webhook import WebhookServer
+
+SECRET = 'secret'
+
+
+def recorded_update(update_id, chat_id, text):
+    # Обновление в том виде, в котором его присылает Telegram
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 1700000000,
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': 'Test'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Test'},
+            'text': text
+        }
+    }
+
+
+def post(server, update, secret=SECRET, path='/webhook'):
+    host, port = server.address[:2]
+    request = urllib.request.Request(
+        f"http://{host}:{port}{path}", data=json.dumps(update).encode('utf-8'), method='POST',
+        headers={'Content-Type': 'application/json', 'X-Telegram-Bot-Api-Secret-Token': secret}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+@pytest.fixture
+def bot():
+    return telebot.TeleBot('123:test', threaded=False)
+
+
+def start_server(bot, **options):
+    server = WebhookServer(bot, host='127.0.0.1', port=0, secret_token=SECRET, **options)
+    server.start()
+    return server
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_recorded_updates_reach_dispatcher(bot):
+    handled = []
+    bot.message_handler(func=lambda message: True)(
+        lambda message: handled.append((message.chat.id, message.text)))
+    dispatcher = ChatDispatcher.attach(bot, workers=2)
+    server = start_server(bot, metrics=dispatcher.metrics)
+    try:
+        updates = [recorded_update(1, 10, 'a'), recorded_update(2, 11, 'b'), recorded_update(3, 10, 'c')]
+        assert [post(server, update) for update in updates] == [200, 200, 200]
+        assert wait_for(lambda: len(handled) == 3)
+    finally:
+        server.stop()
+        dispatcher.stop()
+
+    # Обновления одного чата обрабатываются по порядку
+    assert [text for chat_id, text in handled if chat_id == 10] == ['a', 'c']
+    assert dispatcher.metrics()['processed'] == 3
+    assert bot.last_update_id == 3
+
+
+def test_secret_token_is_checked(bot):
+    handled = []
+    bot.process_new_updates = handled.extend
+    server = start_server(bot)
+    try:
+        assert post(server, recorded_update(1, 10, 'a'), secret='wrong') == 403
+        assert post(server, recorded_update(1, 10, 'a'), path='/other') == 404
+        assert post(server, recorded_update(2, 10, 'b')) == 200
+        assert wait_for(lambda: len(handled) == 1)
+    finally:
+        server.stop()
+    assert handled[0].update_id == 2
+
+
+def test_full_queue_is_reported_with_503(bot):
+    entered = threading.Event()
+    release = threading.Event()
+
+    def process(updates):
+        entered.set()
+        release.wait(5)
+    bot.process_new_updates = process
+    server = start_server(bot, queue_size=1)
+    try:
+        # Первое обновление занимает обработчик, второе - единственное место в очереди
+        assert post(server, recorded_update(1, 10, 'a')) == 200
+        assert entered.wait(5)
+        assert post(server, recorded_update(2, 10, 'b')) == 200
+        assert post(server, recorded_update(3, 10, 'c')) == 503
+        assert server.updates.qsize() == 1
+    finally:
+        release.set()
+        server.stop()